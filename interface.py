@@ -18,9 +18,16 @@ import sys
 import json
 import time
 import re
+import struct
 import logging
+from collections import deque
 from datetime import datetime
 
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
 # ===============================================================================
 # CONFIGURATION
 # ===============================================================================
@@ -45,6 +52,24 @@ COLORS = {
     "nord15": "#B48EAD"   # Violet
 }
 
+# Console de sortie: lignes conservées et cadence de rafraîchissement
+CONSOLE_MAX_LINES = 5000
+CONSOLE_FLUSH_MS = 50
+
+# Statuts des services: contrôle périodique sans inotify, et de secours avec
+STATUS_POLL_MS = 2000
+STATUS_SAFETY_POLL_MS = 30000
+
+# Panneau des collecteurs (topics de santé de BaseCollector)
+HEALTH_TOPIC = "maxlink/collectors/+/health"
+WIDGETS_CONFIG_DIR = "/opt/maxlink/config/widgets"
+HEALTH_HISTORY = 120          # Rapports de santé conservés par collecteur
+RATE_WINDOW = 60              # Fenêtre du débit de messages (secondes)
+HEALTH_REDRAW_MS = 1000
+COLLECTOR_STALE_SECONDS = 90  # Au-delà: collecteur considéré muet (topics du widget)
+HEALTH_INTERVAL_SECONDS = 120 # Intervalle des rapports de santé si non annoncé
+HEALTH_STALE_FACTOR = 2.5     # Rapports de santé manqués avant de déclarer muet
+
 # ===============================================================================
 # LOGGING
 # ===============================================================================
@@ -66,6 +91,10 @@ logging.basicConfig(
 
 logger = logging.getLogger("MaxLinkApp")
 
+# Orchestrateur d'installation (scripts/install)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts", "install"))
+from install_orchestrator import InstallOrchestrator
+
 # ===============================================================================
 # GESTIONNAIRE DE STATUTS
 # ===============================================================================
@@ -76,6 +105,10 @@ class StatusManager:
     def __init__(self):
         self.status_file = '/var/lib/maxlink/services_status.json'
         self._ensure_file_exists()
+        
+        # Dernier contenu lu et signature du fichier correspondante
+        self._signature = None
+        self._statuses = {}
     
     def _ensure_file_exists(self):
         """S'assure que le fichier de statuts existe"""
@@ -84,20 +117,409 @@ class StatusManager:
             with open(self.status_file, 'w') as f:
                 json.dump({}, f)
     
+    def file_signature(self):
+        """(mtime, taille, inode): change à chaque écriture ou remplacement"""
+        try:
+            stat = os.stat(self.status_file)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
     def load_statuses(self):
-        """Charge tous les statuts depuis le fichier"""
+        """Charge tous les statuts (relu seulement si le fichier a changé)"""
+        signature = self.file_signature()
+        if signature is not None and signature == self._signature:
+            return self._statuses
+        
         try:
             with open(self.status_file, 'r') as f:
-                return json.load(f)
+                self._statuses = json.load(f)
+            self._signature = signature
         except Exception as e:
+            # Fichier en cours d'écriture ou illisible: dernier état connu
             logger.error(f"Erreur lors du chargement des statuts: {e}")
-            return {}
+        return self._statuses
     
     def is_active(self, service_id):
         """Vérifie si un service est actif"""
         statuses = self.load_statuses()
         return statuses.get(service_id, {}).get('status', 'inactive') == 'active'
 
+class DirectoryNotifier:
+    """Notifications inotify d'un répertoire (Linux, via la libc)
+    
+    Le répertoire est surveillé plutôt que le fichier: les écritures
+    atomiques (os.replace) changent l'inode et perdraient la surveillance.
+    """
+    
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    EVENT_HEADER = struct.Struct('iIII')
+    
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+        
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, "inotify_add_watch")
+    
+    def read_names(self):
+        """Noms des fichiers modifiés depuis la dernière lecture"""
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                names.add(data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace'))
+                offset += length
+        return names
+    
+    def close(self):
+        os.close(self.fd)
+
+class StatusWatcher:
+    """Signale les services dont le statut a changé dans services_status.json
+    
+    inotify sur le répertoire du fichier quand il est disponible, sinon
+    contrôle périodique de (mtime, taille, inode); le JSON n'est relu que
+    si cette signature change. on_change(changed_ids, statuses).
+    """
+    
+    def __init__(self, root, status_manager, on_change, poll_ms=STATUS_POLL_MS):
+        self.root = root
+        self.status_manager = status_manager
+        self.on_change = on_change
+        self.poll_ms = poll_ms
+        self.notifier = None
+        self.statuses = {}
+        self.file_name = os.path.basename(status_manager.status_file)
+        
+        try:
+            self.notifier = DirectoryNotifier(os.path.dirname(status_manager.status_file))
+            self.root.tk.createfilehandler(self.notifier.fd, tk.READABLE, self._on_notify)
+            # Contrôle de secours espacé (événements perdus, fichier recréé)
+            self.poll_ms = STATUS_SAFETY_POLL_MS
+            logger.info("Surveillance des statuts par inotify")
+        except (OSError, AttributeError, tk.TclError) as e:
+            if self.notifier is not None:
+                self.notifier.close()
+                self.notifier = None
+            logger.info(f"inotify indisponible ({e}), contrôle périodique des statuts")
+        
+        self.root.after(self.poll_ms, self._poll)
+    
+    def _on_notify(self, fd, mask):
+        if self.file_name in self.notifier.read_names():
+            self.check()
+    
+    def _poll(self):
+        self.check()
+        self.root.after(self.poll_ms, self._poll)
+    
+    def check(self):
+        """Compare avec l'état précédent; retourne les services modifiés"""
+        statuses = self.status_manager.load_statuses()
+        if statuses is self.statuses:
+            return set()
+        
+        previous = self.statuses
+        self.statuses = statuses
+        changed = {
+            service_id for service_id in set(previous) | set(statuses)
+            if previous.get(service_id) != statuses.get(service_id)
+        }
+        if changed:
+            self.on_change(changed, statuses)
+        return changed
+    
+    def close(self):
+        if self.notifier is not None:
+            self.root.tk.deletefilehandler(self.notifier.fd)
+            self.notifier.close()
+            self.notifier = None
+
+# ===============================================================================
+# CONSOLE DE SORTIE
+# ===============================================================================
+
+class ConsoleStream:
+    """Tampon entre les threads d'installation et la console Tk
+    
+    Les threads ajoutent des lignes à un tampon circulaire (deque bornée);
+    un timer Tk les insère par lots toutes les CONSOLE_FLUSH_MS. Les lignes
+    écrasées sont comptées sous verrou au moment de l'ajout (stdout et
+    stderr écrivent depuis deux threads). La console elle-même ne garde que
+    max_lines lignes.
+    """
+    
+    def __init__(self, root, console, max_lines=CONSOLE_MAX_LINES, interval_ms=CONSOLE_FLUSH_MS):
+        self.root = root
+        self.console = console
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self.pending = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        
+        self.console.tag_config("error", foreground=COLORS["nord11"])
+        self.root.after(self.interval_ms, self.flush)
+    
+    def write(self, text, error=False):
+        """Appelable depuis n'importe quel thread"""
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append((text, "error" if error else None))
+    
+    def flush(self):
+        """Insère les lignes en attente en un seul passage (thread Tk)"""
+        try:
+            with self.lock:
+                batch = list(self.pending)
+                self.pending.clear()
+                dropped = self.dropped
+                self.dropped = 0
+            
+            if batch:
+                self._insert(batch, dropped)
+        finally:
+            self.root.after(self.interval_ms, self.flush)
+    
+    def _insert(self, batch, dropped):
+        # Défilement automatique seulement si la vue est déjà en bas
+        follow = self.console.yview()[1] >= 1.0
+        
+        self.console.config(state=tk.NORMAL)
+        if dropped > 0:
+            self.console.insert(tk.END, f"... {dropped} ligne(s) non affichée(s) ...\n", "error")
+        
+        # Regroupement des lignes consécutives de même style
+        chunk, chunk_tag = [], None
+        for text, tag in batch:
+            if tag != chunk_tag and chunk:
+                self.console.insert(tk.END, "".join(chunk), chunk_tag)
+                chunk = []
+            chunk.append(text)
+            chunk_tag = tag
+        if chunk:
+            self.console.insert(tk.END, "".join(chunk), chunk_tag)
+        
+        # Limite de lignes conservées dans le widget
+        line_count = int(self.console.index("end-1c").split(".")[0])
+        if line_count > self.max_lines:
+            self.console.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+        
+        if follow:
+            self.console.see(tk.END)
+        self.console.config(state=tk.DISABLED)
+
+# ===============================================================================
+# SURVEILLANCE DES COLLECTEURS
+# ===============================================================================
+
+class CollectorRecord:
+    """Dernières observations d'un collecteur (historique borné)"""
+    
+    def __init__(self, collector_id):
+        self.id = collector_id
+        self.last_seen = None
+        self.arrivals = deque(maxlen=1000)           # Horodatages de réception (débit)
+        self.history = deque(maxlen=HEALTH_HISTORY)  # (réception, rapport de santé)
+    
+    @property
+    def report(self):
+        return self.history[-1][1] if self.history else None
+    
+    def message_rate(self, now):
+        """Messages reçus par minute sur RATE_WINDOW"""
+        while self.arrivals and now - self.arrivals[0] > RATE_WINDOW:
+            self.arrivals.popleft()
+        return len(self.arrivals) * 60.0 / RATE_WINDOW
+
+class CollectorMonitor:
+    """Abonnement MQTT aux rapports de santé et aux topics des widgets
+    
+    Le client paho tourne dans son propre thread; le panneau Tk lit un
+    instantané sous verrou (snapshot) à cadence fixe.
+    """
+    
+    def __init__(self, variables, config_dir=WIDGETS_CONFIG_DIR):
+        self.variables = variables
+        self.lock = threading.Lock()
+        self.records = {}
+        self.config_dir = config_dir
+        self.widget_topics = self._load_widget_topics(config_dir)
+        self.connected = False
+        self.client = None
+        self.dirty = True
+    
+    def _load_widget_topics(self, config_dir):
+        """Topics publiés par widget (niveau paramétré, ex: core{n}: joker '+')"""
+        topics = []
+        try:
+            names = sorted(os.listdir(config_dir))
+        except OSError:
+            return topics
+        
+        for name in names:
+            if not name.endswith("_widget.json"):
+                continue
+            try:
+                with open(os.path.join(config_dir, name)) as f:
+                    config = json.load(f)
+                widget_id = config['widget']['id']
+                for entry in config.get('mqtt', {}).get('topics', {}).get('publish', []):
+                    levels = entry['topic'].split('/')
+                    pattern = '/'.join('+' if '{' in level else level for level in levels)
+                    topics.append((pattern, widget_id))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Configuration de widget ignorée ({name}): {e}")
+        return topics
+    
+    def start(self):
+        if mqtt is None:
+            logger.warning("Module paho-mqtt non installé - panneau des collecteurs inactif")
+            return False
+        
+        self.client = mqtt.Client(client_id=f"maxlink_admin_{os.getpid()}")
+        self.client.username_pw_set(
+            self.variables.get('MQTT_USER', 'mosquitto'),
+            self.variables.get('MQTT_PASS', 'mqtt')
+        )
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        # Broker absent avant l'installation: nouvelles tentatives espacées
+        self.client.reconnect_delay_set(min_delay=2, max_delay=60)
+        self.client.connect_async('localhost', int(self.variables.get('MQTT_PORT', '1883')), 60)
+        self.client.loop_start()
+        return True
+    
+    def stop(self):
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+    
+    def reload_widget_topics(self):
+        """Relit les configurations des widgets (installées après l'ouverture
+        du panneau) et s'abonne aux nouveaux topics si connecté"""
+        topics = self._load_widget_topics(self.config_dir)
+        with self.lock:
+            known = {pattern for pattern, _ in self.widget_topics}
+            self.widget_topics = topics
+        added = sorted({pattern for pattern, _ in topics} - known)
+        if added and self.connected and self.client is not None:
+            self.client.subscribe([(pattern, 0) for pattern in added])
+            logger.info(f"Panneau des collecteurs: {len(added)} nouveau(x) topic(s) de widget")
+        return topics
+    
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            return
+        self.connected = True
+        self.dirty = True
+        # Le broker et les widgets peuvent avoir été installés depuis l'ouverture
+        topics = self._load_widget_topics(self.config_dir)
+        with self.lock:
+            self.widget_topics = topics
+        subscriptions = [(HEALTH_TOPIC, 0)] + [(topic, 0) for topic in {topic for topic, _ in topics}]
+        client.subscribe(subscriptions)
+        logger.info(f"Panneau des collecteurs: {len(subscriptions)} abonnement(s)")
+    
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        self.dirty = True
+    
+    def _record(self, collector_id):
+        record = self.records.get(collector_id)
+        if record is None:
+            record = self.records[collector_id] = CollectorRecord(collector_id)
+        return record
+    
+    def _on_message(self, client, userdata, msg):
+        now = time.monotonic()
+        parts = msg.topic.split('/')
+        
+        with self.lock:
+            if len(parts) == 4 and parts[:2] == ['maxlink', 'collectors'] and parts[3] == 'health':
+                try:
+                    report = json.loads(msg.payload)
+                except ValueError:
+                    return
+                if isinstance(report, dict):
+                    record = self._record(parts[2])
+                    record.history.append((now, report))
+                    record.last_seen = now
+                    self.dirty = True
+                return
+            
+            for pattern, widget_id in self.widget_topics:
+                if mqtt.topic_matches_sub(pattern, msg.topic):
+                    record = self._record(widget_id)
+                    record.arrivals.append(now)
+                    record.last_seen = now
+                    self.dirty = True
+                    break
+    
+    def snapshot(self):
+        """Lignes du panneau: une par collecteur, triées par identifiant"""
+        now = time.monotonic()
+        rows = []
+        with self.lock:
+            self.dirty = False
+            for collector_id in sorted(self.records):
+                record = self.records[collector_id]
+                report = record.report or {}
+                messages = report.get('messages', {})
+                age = now - record.last_seen if record.last_seen is not None else None
+                rows.append({
+                    'id': collector_id,
+                    'alive': age is not None and age <= self._stale_seconds(record),
+                    'state': report.get('state', '-'),
+                    'rate': record.message_rate(now) if record.arrivals else self._report_rate(record),
+                    'errors': messages.get('errors'),
+                    'cpu': report.get('process', {}).get('cpu_percent'),
+                    'age': age
+                })
+        return rows
+    
+    def _stale_seconds(self, record):
+        """Silence toléré: plus de deux intervalles de santé annoncés par le
+        collecteur, COLLECTOR_STALE_SECONDS s'il n'est suivi que par ses topics"""
+        if not record.history:
+            return COLLECTOR_STALE_SECONDS
+        interval = record.report.get('health_interval_seconds', HEALTH_INTERVAL_SECONDS)
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            interval = HEALTH_INTERVAL_SECONDS
+        return max(COLLECTOR_STALE_SECONDS, HEALTH_STALE_FACTOR * interval)
+    
+    def _report_rate(self, record):
+        """Débit déduit de deux rapports de santé (widgets sans topic connu)"""
+        if len(record.history) < 2:
+            return None
+        (t0, first), (t1, last) = record.history[-2], record.history[-1]
+        try:
+            sent = last['messages']['sent'] - first['messages']['sent']
+        except (KeyError, TypeError):
+            return None
+        return sent * 60.0 / (t1 - t0) if t1 > t0 and sent >= 0 else None
+
 # ===============================================================================
 # CHARGEUR DE VARIABLES
 # ===============================================================================
@@ -128,6 +550,9 @@ class VariablesLoader:
                 line = line.strip()
                 if line and not line.startswith('#') and '=' in line:
                     match = re.match(r'^export\s+(\w+)="?([^"]*)"?$', line)
+                    if not match:
+                        # Affectations simples entre guillemets (ex: MQTT_USER="mosquitto")
+                        match = re.match(r'^(\w+)="([^"$`]*)"$', line)
                     if match:
                         key = match.group(1)
                         value = match.group(2)
@@ -201,45 +626,39 @@ class MaxLinkApp:
         self.progress_value = 0
         self.progress_max = 100
         
-        self.current_process = None
+        self.current_install = None
         self.current_thread = None
         
         self.create_interface()
         
-        # Mettre à jour immédiatement les indicateurs visuels
+        # Indicateurs redessinés uniquement quand un statut change
+        self.status_watcher = StatusWatcher(self.root, self.status_manager, self.on_statuses_changed)
         self.update_all_indicators()
-        
-        # Vérification périodique
-        self.periodic_refresh()
     
     def refresh_all_statuses(self):
         """Recharge tous les statuts et met à jour l'interface"""
         self.update_all_indicators()
         logger.debug("Rafraîchissement des indicateurs effectué")
     
-    def periodic_refresh(self):
-        """Rafraîchissement périodique simple"""
-        # Ne rafraîchir que si aucune installation en cours
-        if self.current_thread is None:
-            self.refresh_all_statuses()
-        # Répéter toutes les 2 secondes
-        self.root.after(2000, self.periodic_refresh)
-    
     def update_all_indicators(self):
-        """Met à jour tous les indicateurs visuels"""
-        current_statuses = self.status_manager.load_statuses()
-        
+        """Contrôle immédiat du fichier de statuts (sans attendre la surveillance)"""
+        self.status_watcher.check()
+    
+    def on_statuses_changed(self, changed, statuses):
+        """Met à jour les indicateurs des services modifiés"""
         for service in self.services:
-            if "indicator" in service:
-                is_active = current_statuses.get(service['id'], {}).get('status', 'inactive') == 'active'
-                current_color = COLORS["nord14"] if is_active else COLORS["nord11"]
-                
-                # Effacer et redessiner l'indicateur
-                service["indicator"].delete("all")
-                service["indicator"].create_oval(2, 2, 18, 18, fill=current_color, outline="")
-                
+            if service['id'] in changed and "indicator" in service:
+                is_active = statuses.get(service['id'], {}).get('status', 'inactive') == 'active'
+                self.set_indicator(service, is_active)
                 logger.debug(f"Indicateur mis à jour pour {service['id']}: {'vert' if is_active else 'rouge'}")
     
+    def set_indicator(self, service, is_active):
+        """Change la couleur de l'indicateur si nécessaire (sans le recréer)"""
+        color = COLORS["nord14"] if is_active else COLORS["nord11"]
+        if service.get("indicator_color") != color:
+            service["indicator"].itemconfig(service["indicator_oval"], fill=color)
+            service["indicator_color"] = color
+    
     def check_root_mode(self):
         """Vérifier si l'interface est lancée avec les privilèges root"""
         try:
@@ -300,6 +719,9 @@ class MaxLinkApp:
         right_frame = tk.Frame(main, bg=COLORS["nord1"])
         right_frame.pack(side="right", fill="both", expand=True)
         
+        # Santé des collecteurs (au-dessus de la console)
+        self.create_health_panel(right_frame)
+        
         # Console
         console_frame = tk.Frame(right_frame, bg=COLORS["nord1"], padx=20, pady=20)
         console_frame.pack(fill="both", expand=True)
@@ -341,6 +763,104 @@ class MaxLinkApp:
         
         self.console.insert(tk.END, f"Console prête - {privilege_text}\n\n")
         self.console.config(state=tk.DISABLED)
+        
+        self.console_stream = ConsoleStream(self.root, self.console)
+    
+    def create_health_panel(self, parent):
+        """Crée le panneau de santé des collecteurs (rapports MQTT)"""
+        health_frame = tk.Frame(parent, bg=COLORS["nord1"], padx=20, pady=10)
+        health_frame.pack(fill="x", side="top")
+        
+        title_frame = tk.Frame(health_frame, bg=COLORS["nord1"])
+        title_frame.pack(fill="x", pady=(0, 5))
+        
+        tk.Label(
+            title_frame,
+            text="Collecteurs",
+            font=("Arial", 18, "bold"),
+            bg=COLORS["nord1"],
+            fg=COLORS["nord6"]
+        ).pack(side="left")
+        
+        self.health_status = tk.Label(
+            title_frame,
+            text="MQTT: connexion...",
+            font=("Arial", 12, "bold"),
+            bg=COLORS["nord1"],
+            fg=COLORS["nord13"]
+        )
+        self.health_status.pack(side="right")
+        
+        self.health_table = tk.Frame(health_frame, bg=COLORS["nord1"])
+        self.health_table.pack(fill="x")
+        
+        headers = ["Collecteur", "État", "Msg/min", "Erreurs", "CPU", "Vu il y a"]
+        for column, header in enumerate(headers):
+            tk.Label(
+                self.health_table,
+                text=header,
+                font=("Arial", 11, "bold"),
+                bg=COLORS["nord1"],
+                fg=COLORS["nord8"],
+                anchor="w"
+            ).grid(row=0, column=column, sticky="w", padx=(0, 20))
+        
+        self.health_rows = {}
+        self.collector_monitor = CollectorMonitor(self.variables)
+        if self.collector_monitor.start():
+            self.root.after(HEALTH_REDRAW_MS, self.refresh_health_panel)
+        else:
+            self.health_status.config(text="paho-mqtt non installé", fg=COLORS["nord11"])
+    
+    def refresh_health_panel(self):
+        """Redessine le panneau à cadence fixe; seuls les textes modifiés sont touchés"""
+        try:
+            connected = self.collector_monitor.connected
+            self.set_label(
+                self.health_status,
+                "MQTT: connecté" if connected else "MQTT: déconnecté",
+                COLORS["nord14"] if connected else COLORS["nord11"]
+            )
+            
+            for row in self.collector_monitor.snapshot():
+                labels = self.health_rows.get(row['id'])
+                if labels is None:
+                    labels = self.create_health_row(row['id'])
+                
+                color = COLORS["nord14"] if row['alive'] else COLORS["nord11"]
+                values = [
+                    row['id'],
+                    row['state'],
+                    f"{row['rate']:.1f}" if row['rate'] is not None else "-",
+                    str(row['errors']) if row['errors'] is not None else "-",
+                    f"{row['cpu']:.1f}%" if row['cpu'] is not None else "-",
+                    f"{int(row['age'])}s" if row['age'] is not None else "-"
+                ]
+                for label, value in zip(labels, values):
+                    self.set_label(label, value, color if label is labels[0] else COLORS["nord4"])
+        finally:
+            self.root.after(HEALTH_REDRAW_MS, self.refresh_health_panel)
+    
+    def create_health_row(self, collector_id):
+        row = len(self.health_rows) + 1
+        labels = []
+        for column in range(6):
+            label = tk.Label(
+                self.health_table,
+                font=("Consolas", 11),
+                bg=COLORS["nord1"],
+                fg=COLORS["nord4"],
+                anchor="w"
+            )
+            label.grid(row=row, column=column, sticky="w", padx=(0, 20))
+            labels.append(label)
+        self.health_rows[collector_id] = labels
+        return labels
+    
+    def set_label(self, label, text, color):
+        """Met à jour un label seulement si son contenu change"""
+        if label.cget("text") != text or label.cget("fg") != color:
+            label.config(text=text, fg=color)
     
     def create_progress_bar(self, parent):
         """Crée la barre de progression"""
@@ -380,16 +900,17 @@ class MaxLinkApp:
         )
         label.pack(side="left", fill="both", expand=True)
         
-        # Indicateur de statut
+        # Indicateur de statut (lecture du fichier mise en cache par le StatusManager)
         is_active = self.status_manager.is_active(service['id'])
         status_color = COLORS["nord14"] if is_active else COLORS["nord11"]
         
         indicator = tk.Canvas(frame, width=20, height=20, bg=COLORS["nord1"], highlightthickness=0)
         indicator.pack(side="right", padx=10)
-        indicator.create_oval(2, 2, 18, 18, fill=status_color, outline="")
         
         service["frame"] = frame
         service["indicator"] = indicator
+        service["indicator_oval"] = indicator.create_oval(2, 2, 18, 18, fill=status_color, outline="")
+        service["indicator_color"] = status_color
     
     def create_action_button(self, parent):
         """Crée le bouton d'installation complète"""
@@ -501,87 +1022,54 @@ class MaxLinkApp:
         self.current_thread.start()
     
     def execute_full_install(self):
-        """Exécute l'installation complète"""
-        script_path = os.path.join(
-            self.base_path,
-            "scripts",
-            "install",
-            "full_install_install.sh"
-        )
-        
-        if not os.path.exists(script_path):
-            logger.error(f"Script non trouvé: {script_path}")
-            self.update_console(f"ERREUR: Script non trouvé: {script_path}\n", error=True)
+        """Exécute l'installation complète (une étape après l'autre, avec reprise)"""
+        try:
+            self.current_install = InstallOrchestrator(
+                self.services,
+                on_output=lambda step, line, error: self.update_console(f"[{step.id}] {line}", error),
+                on_progress=lambda percent: self.root.after(0, self.update_progress_bar, percent),
+                on_step=self.on_install_step
+            )
+        except ValueError as e:
+            logger.error(f"Plan d'installation invalide: {e}")
+            self.update_console(f"ERREUR: {e}\n", error=True)
             return
         
         try:
-            logger.info(f"Exécution du script: {script_path}")
+            steps = ", ".join(self.current_install.steps)
+            logger.info(f"Installation complète: {steps}")
             
             self.update_console(f"""
 {"="*70}
 DÉMARRAGE: Installation complète de MaxLink
-Script: {script_path}
+Étapes: {steps}
+Logs par étape: {self.current_install.log_dir}
 {"="*70}
 
 """)
             
             self.root.after(0, self.show_progress_bar)
             
-            env = os.environ.copy()
-            env['PYTHONUNBUFFERED'] = '1'
-            env['SKIP_REBOOT'] = 'true'
-            env['INTERFACE_MODE'] = 'true'  # Activer le mode interface pour logging.sh
-            
-            self.current_process = subprocess.Popen(
-                ['bash', script_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                bufsize=1,
-                env=env
-            )
-            
-            # Lire la sortie ligne par ligne
-            for line in iter(self.current_process.stdout.readline, ''):
-                if line:
-                    # Traiter les lignes de progression
-                    if line.startswith("PROGRESS:"):
-                        parts = line.strip().split(":")
-                        if len(parts) >= 3:
-                            try:
-                                progress = int(parts[1])
-                                self.root.after(0, self.update_progress_bar, progress)
-                            except ValueError:
-                                pass
-                    elif "Installation réussie" in line:
-                        # Forcer un rafraîchissement des indicateurs
-                        self.root.after(100, self.update_all_indicators)
-                    elif "REFRESH_INDICATORS" in line:
-                        # Signal explicite pour rafraîchir
-                        logger.info("Signal de rafraîchissement reçu")
-                        self.root.after(200, self.update_all_indicators)
-                        continue
-                    else:
-                        self.update_console(line)
-            
-            for line in iter(self.current_process.stderr.readline, ''):
-                if line:
-                    self.update_console(line, error=True)
-            
-            return_code = self.current_process.wait()
-            logger.info(f"Installation terminée avec code: {return_code}")
+            success = self.current_install.run()
+            logger.info(f"Installation terminée: {'succès' if success else 'échec'}")
             
             self.root.after(0, self.hide_progress_bar)
             
+            summary = "\n".join(self.current_install.summary())
             self.update_console(f"""
 {"="*70}
 TERMINÉ: Installation complète
-Code de sortie: {return_code}
+{summary}
 {"="*70}
 
 """)
             
-            if return_code == 0:
+            reboot_delay = self.current_install.reboot_delay()
+            if reboot_delay is not None:
+                self.update_console(f"Redémarrage du système dans {reboot_delay} secondes...\n")
+                self.root.after(reboot_delay * 1000, self.reboot_system)
+            
+            if success:
                 logger.info("Installation complète réussie")
                 # Rafraîchissement final
                 self.root.after(1000, self.update_all_indicators)
@@ -596,11 +1084,15 @@ Code de sortie: {return_code}
                     )
                 )
             else:
+                failed = ", ".join(
+                    step.id for step in self.current_install.steps.values() if not step.succeeded
+                )
                 self.root.after(
                     500,
                     lambda: messagebox.showerror(
                         "Erreur d'Installation",
-                        f"L'installation a échoué avec le code: {return_code}\n\n"
+                        f"L'installation a échoué pour: {failed}\n\n"
+                        "Relancez l'installation pour reprendre après la dernière étape réussie.\n"
                         "Consultez la console pour plus de détails."
                     )
                 )
@@ -609,27 +1101,23 @@ Code de sortie: {return_code}
             logger.error(f"Erreur lors de l'exécution: {str(e)}")
             self.update_console(f"ERREUR: {str(e)}\n", error=True)
             self.root.after(0, self.hide_progress_bar)
-        
-        finally:
-            self.current_process = None
+    
+    def on_install_step(self, step):
+        """Changement d'état d'une étape (thread de l'orchestrateur)"""
+        if step.finished:
+            self.root.after(100, self.update_all_indicators)
+        if step.id == 'mqtt_wgs' and step.succeeded:
+            # Configurations des widgets désormais présentes: topics du panneau
+            self.collector_monitor.reload_widget_topics()
+    
+    def reboot_system(self):
+        """Redémarrage de finalisation (comme full_install_install.sh)"""
+        logger.info("Redémarrage du système pour finalisation")
+        subprocess.run(['reboot'])
     
     def update_console(self, text, error=False):
-        """Met à jour la console avec du texte"""
-        def update():
-            self.console.config(state=tk.NORMAL)
-            
-            # Configuration des tags
-            if error:
-                self.console.tag_config("error", foreground=COLORS["nord11"])
-                self.console.insert(tk.END, text, "error")
-            else:
-                self.console.insert(tk.END, text)
-            
-            # Auto-scroll
-            self.console.see(tk.END)
-            self.console.config(state=tk.DISABLED)
-        
-        self.root.after(0, update)
+        """Ajoute du texte à la console (depuis n'importe quel thread)"""
+        self.console_stream.write(text, error)
     
     def on_closing(self):
         """Gestion de la fermeture de l'application"""
@@ -642,7 +1130,12 @@ Code de sortie: {return_code}
             if not response:
                 return
         
+            if self.current_install is not None:
+                self.current_install.cancel()
+        
         logger.info("Fermeture de l'application")
+        self.status_watcher.close()
+        self.collector_monitor.stop()
         self.root.destroy()
 
 # ===============================================================================
@@ -32,6 +32,8 @@ COMMANDES:
     list        Lister tous les paquets dans le cache
     verify      Vérifier l'intégrité du cache
     install     Installer un paquet depuis le cache
+    import      Importer les paquets d'un répertoire (clé USB)
+    export      Exporter le cache vers un répertoire (clé USB)
     help        Afficher cette aide
 
 EXEMPLES:
@@ -40,6 +42,8 @@ EXEMPLES:
     $0 clean                # Supprimer tout le cache
     $0 list                 # Lister les paquets téléchargés
     $0 install nginx        # Installer nginx depuis le cache
+    $0 export /media/usb/maxlink-cache   # Préparer une clé USB
+    $0 import /media/usb/maxlink-cache   # Pré-remplir le cache d'un autre Pi
 
 EOF
 }
@@ -227,22 +231,16 @@ verify_cache() {
     echo ""
     echo "◦ Vérification des paquets..."
     
-    # Vérifier chaque paquet .deb
-    local total_debs=0
-    local valid_debs=0
+    # Empreintes SHA-256: validation par manifeste, hachage parallèle des
+    # seuls paquets nouveaux ou modifiés, dpkg-deb --info sur chaque nouveau
+    # paquet avant son entrée au manifeste (package_cache.py)
+    local integrity_ok=true
+    python3 "$SCRIPT_DIR/package_cache.py" --cache-dir "$PACKAGE_CACHE_DIR" verify | sed 's/^/  ↦ /'
+    [ "${PIPESTATUS[0]}" -eq 0 ] || integrity_ok=false
     
-    for deb in "$PACKAGE_CACHE_DIR"/*.deb 2>/dev/null; do
-        [ ! -f "$deb" ] && continue
-        ((total_debs++))
-        
-        if dpkg-deb --info "$deb" >/dev/null 2>&1; then
-            ((valid_debs++))
-        else
-            echo "  ↦ Paquet corrompu: $(basename "$deb") ✗"
-        fi
-    done
-    
-    echo "  ↦ Paquets valides: $valid_debs/$total_debs"
+    echo ""
+    echo "◦ Paquets requis (packages.list)..."
+    python3 "$SCRIPT_DIR/package_cache.py" --cache-dir "$PACKAGE_CACHE_DIR" report
     
     echo ""
     echo "◦ Vérification de la validité temporelle..."
@@ -253,7 +251,7 @@ verify_cache() {
     fi
     
     echo ""
-    if [ $valid_debs -eq $total_debs ] && [ -f "$PACKAGE_METADATA_FILE" ] && is_cache_valid; then
+    if [ "$integrity_ok" = true ] && [ -f "$PACKAGE_METADATA_FILE" ] && is_cache_valid; then
         echo "✓ Cache intègre et valide !"
     else
         echo "⚠ Le cache nécessite une mise à jour"
@@ -291,6 +289,21 @@ install_from_cache() {
     fi
 }
 
+# Importer/exporter le cache (pré-remplissage de plusieurs Pi depuis une clé USB)
+transfer_cache() {
+    check_root "$1"
+    
+    local direction="$1"
+    local directory="$2"
+    
+    if [ -z "$directory" ]; then
+        echo "Usage: $0 $direction <répertoire>"
+        exit 1
+    fi
+    
+    python3 "$SCRIPT_DIR/package_cache.py" --cache-dir "$PACKAGE_CACHE_DIR" "$direction" "$directory"
+}
+
 # ===============================================================================
 # PROGRAMME PRINCIPAL
 # ===============================================================================
@@ -317,6 +330,9 @@ case "$COMMAND" in
     install)
         install_from_cache "$2"
         ;;
+    import|export)
+        transfer_cache "$COMMAND" "$2"
+        ;;
     help|--help|-h)
         show_help
         ;;
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+===============================================================================
+MAXLINK - CACHE DE PAQUETS ADRESSÉ PAR CONTENU
+Chaque .deb du cache est rangé une seule fois sous objects/<sha256>, le nom
+lisible (nginx_1.22.1_arm64.deb) n'étant qu'un lien physique vers l'objet:
+find/dpkg -i de packages.sh continuent de fonctionner sans modification.
+Un manifeste (taille, mtime, inode, sha256 par fichier) permet de valider un
+cache chaud en un seul passage de stat(); seuls les fichiers nouveaux ou
+modifiés sont hachés, en parallèle.
+
+Usage: python3 package_cache.py status|verify|report|import DIR|export DIR
+===============================================================================
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+COMMON_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PACKAGE_CACHE_DIR = '/var/cache/maxlink/packages'
+PACKAGE_LIST_FILE = os.path.join(COMMON_DIR, 'packages.list')
+
+MANIFEST_NAME = 'manifest.json'
+OBJECTS_DIR = 'objects'
+MANIFEST_VERSION = 1
+
+# Lecture par blocs de 1 Mo: hashlib libère le GIL pendant update(),
+# les threads de hachage s'exécutent donc réellement sur plusieurs cœurs
+HASH_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger("PackageCache")
+
+# ===============================================================================
+# HACHAGE
+# ===============================================================================
+
+def sha256_file(path):
+    """SHA-256 d'un fichier, lu par blocs"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def copy_and_hash(source, destination):
+    """Copie un fichier en calculant son SHA-256 au passage (une seule lecture)"""
+    digest = hashlib.sha256()
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        while True:
+            chunk = src.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+def deb_is_valid(path):
+    """Contrôle structurel d'un .deb (dpkg-deb --info): archive tronquée ou
+    illisible -> False, dpkg-deb indisponible -> None"""
+    try:
+        result = subprocess.run(['dpkg-deb', '--info', path],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"dpkg-deb indisponible: {e}")
+        return None
+    return result.returncode == 0
+
+def default_workers():
+    """Un thread par cœur (au moins 2 pour recouvrir les attentes disque)"""
+    return max(2, os.cpu_count() or 1)
+
+def file_signature(stat):
+    """Signature stat() d'un fichier: un changement impose un nouveau hachage"""
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+def package_name(filename):
+    """Nom du paquet d'un .deb (nginx_1.22.1-9_arm64.deb -> nginx)"""
+    return filename.split('_', 1)[0]
+
+def load_package_list(list_file=PACKAGE_LIST_FILE):
+    """Paquets requis par catégorie (format de packages.list)"""
+    categories = {}
+    try:
+        with open(list_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#') or ':' not in line:
+                    continue
+                category, packages = line.split(':', 1)
+                categories[category.strip()] = packages.split()
+    except OSError as e:
+        logger.warning(f"Liste des paquets illisible: {e}")
+    return categories
+
+def write_manifest(manifest_file, files):
+    """Écriture atomique du manifeste (fichier temporaire puis renommage)"""
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'files': files
+    }
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    temp_file = manifest_file + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temp_file, manifest_file)
+
+# ===============================================================================
+# CACHE
+# ===============================================================================
+
+class PackageCache:
+    """Cache de .deb dédupliqué par contenu et validé par manifeste"""
+
+    def __init__(self, cache_dir=PACKAGE_CACHE_DIR, workers=None):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, OBJECTS_DIR)
+        self.manifest_file = os.path.join(cache_dir, MANIFEST_NAME)
+        self.workers = workers or default_workers()
+        self.files = {}
+        self.load_manifest()
+
+    # Manifeste -------------------------------------------------------------
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_file, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.files = manifest.get('files', {})
+        except (OSError, ValueError):
+            self.files = {}
+
+    def save_manifest(self):
+        write_manifest(self.manifest_file, self.files)
+
+    # Objets ----------------------------------------------------------------
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def _link_object(self, path, sha256):
+        """Range le fichier sous son empreinte; un doublon devient un lien
+        vers l'objet existant. Retourne le nombre d'octets économisés."""
+        object_file = self.object_path(sha256)
+        if not os.path.exists(object_file):
+            os.makedirs(os.path.dirname(object_file), exist_ok=True)
+            try:
+                os.link(path, object_file)
+            except OSError:
+                # Système de fichiers sans liens physiques: copie
+                shutil.copy2(path, object_file)
+            return 0
+
+        if os.path.samefile(path, object_file):
+            return 0
+
+        size = os.path.getsize(path)
+        temp_file = path + '.link'
+        try:
+            os.link(object_file, temp_file)
+        except OSError:
+            return 0
+        os.replace(temp_file, path)
+        return size
+
+    def _record(self, filename, sha256):
+        stat = os.stat(os.path.join(self.cache_dir, filename))
+        self.files[filename] = {'sha256': sha256, 'signature': file_signature(stat)}
+
+    def deb_files(self):
+        """Noms des .deb présents à la racine du cache"""
+        try:
+            return sorted(
+                entry.name for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith('.deb')
+            )
+        except OSError:
+            return []
+
+    def _scan_parallel(self, paths):
+        """Hache une liste de fichiers sur plusieurs threads et contrôle avec
+        dpkg-deb les paquets absents du manifeste:
+        {chemin: (sha256 | None, valide | None)}"""
+        def scan(path):
+            try:
+                sha256 = sha256_file(path)
+            except OSError as e:
+                logger.warning(f"Lecture impossible: {path}: {e}")
+                return None, None
+            if os.path.basename(path) in self.files:
+                return sha256, True
+            return sha256, deb_is_valid(path)
+
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sha256') as pool:
+            return dict(zip(paths, pool.map(scan, paths)))
+
+    def _discard(self, path, report):
+        filename = os.path.basename(path)
+        logger.warning(f"Paquet corrompu retiré du cache: {filename}")
+        report['corrupt'].append(filename)
+        self.files.pop(filename, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # Vérification ----------------------------------------------------------
+
+    def verify(self, full=False):
+        """Valide le cache; retourne le rapport de vérification
+
+        Un fichier dont la signature stat() correspond au manifeste est
+        considéré sain sans relecture (full=True: tout est rehaché). Un
+        fichier connu dont le contenu a changé est supprimé (corrompu), de
+        même qu'un nouveau fichier refusé par dpkg-deb --info: seuls les
+        paquets valides entrent au manifeste. Un fichier illisible (erreur
+        d'E/S, droits) est signalé et conservé.
+        """
+        start = time.monotonic()
+        report = {
+            'files': 0, 'trusted': 0, 'hashed': 0, 'added': 0,
+            'corrupt': [], 'unreadable': [], 'unverified': [],
+            'deduplicated_bytes': 0, 'hashed_bytes': 0
+        }
+
+        to_hash = []
+        names = self.deb_files()
+        for filename in names:
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            report['files'] += 1
+            entry = self.files.get(filename)
+            if (not full and entry is not None
+                    and entry.get('signature') == file_signature(stat)
+                    and os.path.exists(self.object_path(entry['sha256']))):
+                report['trusted'] += 1
+            else:
+                to_hash.append(path)
+                report['hashed_bytes'] += stat.st_size
+
+        results = self._scan_parallel(to_hash)
+        report['hashed'] = len(results)
+
+        for path, (sha256, valid) in results.items():
+            filename = os.path.basename(path)
+            entry = self.files.get(filename)
+            if sha256 is None:
+                # Erreur de lecture, pas une preuve de corruption: fichier conservé
+                report['unreadable'].append(filename)
+                continue
+            if entry is not None and entry['sha256'] != sha256:
+                # Contenu différent de celui enregistré: fichier corrompu
+                self._discard(path, report)
+                continue
+            if valid is False:
+                # Téléchargement tronqué ou fichier qui n'est pas un .deb
+                self._discard(path, report)
+                continue
+            if valid is None:
+                # Contrôle impossible: le paquet reste hors du manifeste
+                report['unverified'].append(filename)
+                continue
+            if entry is None:
+                report['added'] += 1
+            report['deduplicated_bytes'] += self._link_object(path, sha256)
+            self._record(filename, sha256)
+
+        # Entrées du manifeste dont le fichier a disparu (nettoyage du cache)
+        present = set(names)
+        for filename in [name for name in self.files if name not in present]:
+            del self.files[filename]
+
+        report['orphans'] = self.prune_objects()
+        self.save_manifest()
+        report['duration'] = round(time.monotonic() - start, 2)
+        return report
+
+    def prune_objects(self):
+        """Supprime les objets qui ne sont plus référencés par aucun nom"""
+        referenced = {entry['sha256'] for entry in self.files.values()}
+        removed = 0
+        if not os.path.isdir(self.objects_dir):
+            return removed
+        for root, _, filenames in os.walk(self.objects_dir, topdown=False):
+            for sha256 in filenames:
+                if sha256 not in referenced:
+                    try:
+                        os.remove(os.path.join(root, sha256))
+                        removed += 1
+                    except OSError:
+                        pass
+            if root != self.objects_dir and not os.listdir(root):
+                os.rmdir(root)
+        return removed
+
+    # Import / export -------------------------------------------------------
+
+    def import_dir(self, source_dir):
+        """Importe les .deb d'un répertoire (clé USB, autre cache MaxLink)
+
+        Si la source possède un manifeste, un paquet dont l'objet est déjà
+        présent localement n'est ni copié ni relu (hit). Les autres sont
+        copiés et hachés en un seul passage, sur plusieurs threads; une
+        empreinte différente de celle du manifeste source ou une copie
+        refusée par dpkg-deb --info (clé remplie à la main, fichier tronqué)
+        est rejetée.
+        """
+        start = time.monotonic()
+        source = PackageCache(source_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        report = {'hits': 0, 'copied': 0, 'rejected': [], 'copied_bytes': 0}
+
+        to_copy = []
+        for filename in source.deb_files():
+            expected = source.files.get(filename, {}).get('sha256')
+            if expected and os.path.exists(self.object_path(expected)):
+                destination = os.path.join(self.cache_dir, filename)
+                object_file = self.object_path(expected)
+                if not (os.path.exists(destination) and os.path.samefile(destination, object_file)):
+                    os.link(object_file, destination + '.link')
+                    os.replace(destination + '.link', destination)
+                self._record(filename, expected)
+                report['hits'] += 1
+            else:
+                to_copy.append((filename, expected))
+
+        def copy_one(item):
+            filename, expected = item
+            temp_file = os.path.join(self.cache_dir, filename + '.part')
+            try:
+                sha256 = copy_and_hash(os.path.join(source_dir, filename), temp_file)
+            except OSError as e:
+                logger.warning(f"Copie impossible: {filename}: {e}")
+                return filename, expected, None
+            if expected and sha256 != expected:
+                logger.warning(f"Empreinte invalide: {filename}")
+                return filename, expected, None
+            # Comme verify: seul un paquet accepté par dpkg-deb entre au manifeste
+            if not deb_is_valid(temp_file):
+                logger.warning(f"Paquet invalide ou non vérifiable (dpkg-deb): {filename}")
+                return filename, expected, None
+            return filename, expected, sha256
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='import') as pool:
+            results = list(pool.map(copy_one, to_copy))
+
+        for filename, expected, sha256 in results:
+            temp_file = os.path.join(self.cache_dir, filename + '.part')
+            if sha256 is None:
+                # Motif déjà journalisé par copy_one
+                report['rejected'].append(filename)
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                continue
+            destination = os.path.join(self.cache_dir, filename)
+            os.replace(temp_file, destination)
+            self._link_object(destination, sha256)
+            self._record(filename, sha256)
+            report['copied'] += 1
+            report['copied_bytes'] += os.path.getsize(destination)
+
+        self.save_manifest()
+        report['duration'] = round(time.monotonic() - start, 2)
+        return report
+
+    def export_dir(self, destination_dir):
+        """Prépare une clé USB: .deb nommés + manifeste (sans liens physiques,
+        inutilisables sur FAT). Les fichiers déjà présents et de même taille
+        ne sont pas recopiés."""
+        os.makedirs(destination_dir, exist_ok=True)
+        copied = 0
+        for filename, entry in self.files.items():
+            source = os.path.join(self.cache_dir, filename)
+            destination = os.path.join(destination_dir, filename)
+            if os.path.exists(destination) and os.path.getsize(destination) == os.path.getsize(source):
+                continue
+            shutil.copyfile(source, destination + '.part')
+            os.replace(destination + '.part', destination)
+            copied += 1
+
+        # Signatures propres à ce système de fichiers: seules les empreintes sont exportées
+        write_manifest(os.path.join(destination_dir, MANIFEST_NAME), {
+            filename: {'sha256': entry['sha256'], 'signature': None}
+            for filename, entry in self.files.items()
+        })
+        return copied
+
+    # Rapport ---------------------------------------------------------------
+
+    def package_report(self, categories=None):
+        """Paquets requis présents (hits) ou absents (misses) par catégorie"""
+        available = {package_name(filename) for filename in self.files}
+        report = {}
+        for category, packages in load_package_list().items():
+            if categories and category not in categories:
+                continue
+            report[category] = {
+                'hits': [p for p in packages if p in available],
+                'misses': [p for p in packages if p not in available]
+            }
+        return report
+
+    def stats(self):
+        """Statistiques du cache (taille réelle après déduplication)"""
+        unique = {}
+        for entry in self.files.values():
+            object_file = self.object_path(entry['sha256'])
+            if entry['sha256'] not in unique and os.path.exists(object_file):
+                unique[entry['sha256']] = os.path.getsize(object_file)
+        return {
+            'files': len(self.files),
+            'objects': len(unique),
+            'size': sum(unique.values())
+        }
+
+# ===============================================================================
+# PROGRAMME PRINCIPAL
+# ===============================================================================
+
+def format_size(size):
+    for unit in ('o', 'Ko', 'Mo', 'Go'):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} To"
+
+def print_verify_report(report):
+    print(f"Fichiers: {report['files']} | validés par manifeste: {report['trusted']} | "
+          f"hachés: {report['hashed']} ({format_size(report['hashed_bytes'])})")
+    print(f"Ajoutés: {report['added']} | corrompus: {len(report['corrupt'])} | "
+          f"objets orphelins supprimés: {report['orphans']}")
+    if report['unreadable']:
+        print(f"Illisibles (conservés): {', '.join(report['unreadable'])}")
+    if report['unverified']:
+        print(f"Non contrôlés (dpkg-deb indisponible): {', '.join(report['unverified'])}")
+    if report['deduplicated_bytes']:
+        print(f"Doublons fusionnés: {format_size(report['deduplicated_bytes'])}")
+    print(f"Durée: {report['duration']}s")
+
+def print_package_report(report):
+    for category, result in report.items():
+        total = len(result['hits']) + len(result['misses'])
+        symbol = '✓' if not result['misses'] else '✗'
+        line = f"  {symbol} {category}: {len(result['hits'])}/{total}"
+        if result['misses']:
+            line += f" (manquants: {', '.join(result['misses'])})"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache de paquets MaxLink adressé par contenu")
+    parser.add_argument('--cache-dir', default=PACKAGE_CACHE_DIR, help="Répertoire du cache")
+    parser.add_argument('--workers', type=int, default=None, help="Threads de hachage/copie")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="Statistiques du cache")
+    verify_parser = subparsers.add_parser('verify', help="Valide le cache (manifeste + hachage)")
+    verify_parser.add_argument('--full', action='store_true', help="Rehache tous les fichiers")
+    report_parser = subparsers.add_parser('report', help="Paquets requis présents/absents")
+    report_parser.add_argument('categories', nargs='*', help="Catégories de packages.list")
+    import_parser = subparsers.add_parser('import', help="Importe un répertoire de .deb (clé USB)")
+    import_parser.add_argument('source', help="Répertoire source")
+    export_parser = subparsers.add_parser('export', help="Exporte le cache vers un répertoire (clé USB)")
+    export_parser.add_argument('destination', help="Répertoire destination")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+
+    cache = PackageCache(args.cache_dir, workers=args.workers)
+
+    if args.command == 'status':
+        stats = cache.stats()
+        print(f"Cache: {cache.cache_dir}")
+        print(f"Paquets: {stats['files']} | objets uniques: {stats['objects']} | "
+              f"taille: {format_size(stats['size'])}")
+        return 0
+
+    if args.command == 'verify':
+        report = cache.verify(full=args.full)
+        print_verify_report(report)
+        return 1 if report['corrupt'] or report['unreadable'] or report['unverified'] else 0
+
+    if args.command == 'report':
+        report = cache.package_report(args.categories)
+        print_package_report(report)
+        return 1 if any(result['misses'] for result in report.values()) else 0
+
+    if args.command == 'import':
+        if not os.path.isdir(args.source):
+            print(f"✗ Répertoire introuvable: {args.source}")
+            return 1
+        report = cache.import_dir(args.source)
+        print(f"Déjà en cache: {report['hits']} | copiés: {report['copied']} "
+              f"({format_size(report['copied_bytes'])}) | rejetés: {len(report['rejected'])} | "
+              f"durée: {report['duration']}s")
+        return 1 if report['rejected'] else 0
+
+    if args.command == 'export':
+        cache.verify()
+        copied = cache.export_dir(args.destination)
+        print(f"Exportés: {copied} fichier(s) vers {args.destination}")
+        return 0
+
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -184,6 +184,14 @@ with open('$PACKAGE_METADATA_FILE', 'w') as f:
     echo "  ↦ Paquets téléchargés: $downloaded_count"
     log_info "Total paquets téléchargés: $downloaded_count"
     
+    # Empreintes SHA-256 et manifeste: les vérifications suivantes ne relisent
+    # que les paquets modifiés, les doublons sont fusionnés
+    if python3 "$BASE_DIR/scripts/common/package_cache.py" --cache-dir "$PACKAGE_CACHE_DIR" verify >/dev/null 2>&1; then
+        echo "  ↦ Manifeste du cache généré ✓"
+    else
+        log_warn "Manifeste du cache non généré"
+    fi
+    
     if [ -n "$failed_packages" ]; then
         echo "  ↦ Paquets échoués:$failed_packages"
         log_warn "Paquets non téléchargés:$failed_packages"
@@ -213,17 +213,24 @@ update_service_status() {
     fi
     
     # Mettre à jour le statut via Python pour gérer le JSON proprement
+    # (verrou + remplacement atomique: fichier aussi écrit par install_orchestrator.py)
     python3 -c "
+import os
 import json
 import sys
+import fcntl
 from datetime import datetime
 
 service_id = '$service_id'
 status = '$status'
+status_file = '$SERVICES_STATUS_FILE'
+
+lock = open(status_file + '.lock', 'w')
+fcntl.flock(lock, fcntl.LOCK_EX)
 
 try:
     # Charger les données existantes
-    with open('$SERVICES_STATUS_FILE', 'r') as f:
+    with open(status_file, 'r') as f:
         data = json.load(f)
 except Exception as e:
     print(f'Erreur lecture: {e}', file=sys.stderr)
@@ -237,8 +244,9 @@ data[service_id] = {
 
 # Sauvegarder
 try:
-    with open('$SERVICES_STATUS_FILE', 'w') as f:
+    with open(status_file + '.tmp', 'w') as f:
         json.dump(data, f, indent=2)
+    os.replace(status_file + '.tmp', status_file)
     print(f'Statut {service_id} mis à jour: {status}')
 except Exception as e:
     print(f'Erreur sauvegarde: {e}', file=sys.stderr)
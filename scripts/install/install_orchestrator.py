@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+===============================================================================
+MAXLINK - ORCHESTRATEUR D'INSTALLATION COMPLÈTE
+Exécute les scripts *_install.sh un par un, dans l'ordre de leurs
+dépendances. Par rapport à full_install_install.sh, l'orchestrateur apporte
+un log par étape, le blocage des seules étapes dépendant d'un échec et la
+reprise: une nouvelle exécution saute les étapes déjà réussies.
+Les étapes ne sont pas parallélisées: toutes installent des paquets (verrou
+dpkg) et plusieurs basculent le réseau.
+Utilisé par interface.py.
+
+Usage: sudo python3 install_orchestrator.py [--force] [--reboot]
+===============================================================================
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import logging
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+
+INSTALL_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(os.path.dirname(INSTALL_DIR))
+
+sys.path.insert(0, os.path.join(BASE_DIR, 'scripts', 'common'))
+from package_cache import PackageCache, PACKAGE_CACHE_DIR
+
+SERVICES_STATUS_FILE = '/var/lib/maxlink/services_status.json'
+INSTALL_STATE_FILE = '/var/lib/maxlink/install_state.json'
+
+# Étapes d'installation par service, dans l'ordre d'exécution
+#   after: étapes qui doivent avoir réussi avant (sinon l'étape est bloquée)
+INSTALL_STEPS = {
+    'update': {
+        'script': 'update_install.sh',
+        'description': "Mise à jour système et cache",
+        'after': []
+    },
+    'ap': {
+        'script': 'ap_install.sh',
+        'description': "Point d'accès WiFi",
+        'after': ['update']
+    },
+    'nginx': {
+        'script': 'nginx_install.sh',
+        'description': "Serveur Web et Dashboard",
+        'after': ['update']
+    },
+    'mqtt': {
+        'script': 'mqtt_install.sh',
+        'description': "Broker MQTT",
+        'after': ['update']
+    },
+    'mqtt_wgs': {
+        'script': 'mqtt_wgs_install.sh',
+        'description': "Widgets MQTT",
+        'after': ['mqtt', 'nginx']
+    },
+    'php_archives': {
+        'script': 'php_archives_install.sh',
+        'description': "Système PHP",
+        'after': ['nginx']
+    },
+    'orchestrator': {
+        'script': 'orchestrator_install.sh',
+        'description': "Orchestrateur et finalisation",
+        'after': ['ap', 'nginx', 'mqtt', 'mqtt_wgs', 'php_archives']
+    }
+}
+
+# Délais de redémarrage après l'installation (comme full_install_install.sh)
+REBOOT_DELAY_SUCCESS = 30
+REBOOT_DELAY_PARTIAL = 120
+
+logger = logging.getLogger("InstallOrchestrator")
+
+# ===============================================================================
+# FICHIER DE STATUTS PARTAGÉ
+# ===============================================================================
+
+def update_services_status(service_id, status, message, status_file=SERVICES_STATUS_FILE):
+    """Met à jour services_status.json sous verrou
+
+    Même protocole que update_service_status de variables.sh: verrou
+    exclusif sur <fichier>.lock puis remplacement atomique.
+    """
+    os.makedirs(os.path.dirname(status_file), exist_ok=True)
+    with open(status_file + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(status_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+
+        data[service_id] = {
+            'status': status,
+            'last_update': datetime.now().isoformat(),
+            'message': message
+        }
+
+        temp_file = status_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_file, status_file)
+
+def load_services_status(status_file=SERVICES_STATUS_FILE):
+    try:
+        with open(status_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# ===============================================================================
+# ÉTAPES ET PLAN
+# ===============================================================================
+
+class InstallStep:
+    """Une étape du plan: un script d'installation et son état d'exécution"""
+
+    def __init__(self, service_id, name, spec):
+        self.id = service_id
+        self.name = name
+        self.script = os.path.join(INSTALL_DIR, spec['script'])
+        self.description = spec['description']
+        self.after = list(spec['after'])
+        self.status = 'pending'   # pending, running, done, skipped, failed, blocked
+        self.progress = 0
+        self.exit_code = None
+        self.duration = None
+        self.log_file = None
+        self.process = None
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'skipped', 'failed', 'blocked')
+
+    @property
+    def succeeded(self):
+        return self.status in ('done', 'skipped')
+
+def build_plan(services):
+    """Construit le DAG des étapes depuis VariablesLoader.services
+
+    Les services sans script d'installation sont ignorés; les dépendances
+    vers un service absent du plan sont considérées satisfaites.
+    """
+    steps = {}
+    for service in services:
+        spec = INSTALL_STEPS.get(service['id'])
+        if spec is None:
+            logger.warning(f"Pas d'étape d'installation pour {service['id']}, ignoré")
+            continue
+        steps[service['id']] = InstallStep(service['id'], service.get('name', service['id']), spec)
+
+    for step in steps.values():
+        step.after = [dependency for dependency in step.after if dependency in steps]
+
+    # Détection de cycle (tri topologique)
+    remaining = {step.id: set(step.after) for step in steps.values()}
+    while remaining:
+        ready = [step_id for step_id, after in remaining.items() if not after]
+        if not ready:
+            raise ValueError(f"Cycle de dépendances entre: {', '.join(sorted(remaining))}")
+        for step_id in ready:
+            del remaining[step_id]
+        for after in remaining.values():
+            after.difference_update(ready)
+
+    return steps
+
+# ===============================================================================
+# ORCHESTRATEUR
+# ===============================================================================
+
+class InstallOrchestrator:
+    """Exécute le plan, une étape à la fois, dans l'ordre des services
+
+    Callbacks (appelés depuis les threads de lecture, à redispatcher côté Tk):
+      on_output(step, line, error)  ligne de sortie d'une étape (error: stderr)
+      on_progress(percent)       progression globale 0-100
+      on_step(step)              changement d'état d'une étape
+    """
+
+    def __init__(self, services, force=False,
+                 on_output=None, on_progress=None, on_step=None,
+                 status_file=SERVICES_STATUS_FILE, state_file=INSTALL_STATE_FILE):
+        self.steps = build_plan(services)
+        self.force = force
+        self.on_output = on_output
+        self.on_progress = on_progress
+        self.on_step = on_step
+        self.status_file = status_file
+        self.state_file = state_file
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+        self.log_dir = os.path.join(
+            BASE_DIR, "logs", "install", f"full_install_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+
+    # Reprise ---------------------------------------------------------------
+
+    def _mark_completed(self):
+        """Étapes déjà actives dans services_status.json: sautées (reprise)"""
+        if self.force:
+            return
+        statuses = load_services_status(self.status_file)
+        for step in self.steps.values():
+            if statuses.get(step.id, {}).get('status') == 'active':
+                step.status = 'skipped'
+                step.progress = 100
+                self._emit(step, "Déjà installé, étape sautée ✓\n")
+
+    def _save_state(self):
+        """Historique de la dernière exécution (diagnostic de reprise)"""
+        state = {
+            'updated': datetime.now().isoformat(),
+            'log_dir': self.log_dir,
+            'steps': {
+                step.id: {
+                    'status': step.status,
+                    'exit_code': step.exit_code,
+                    'duration': step.duration,
+                    'log': step.log_file
+                }
+                for step in self.steps.values()
+            }
+        }
+        try:
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            temp_file = self.state_file + '.tmp'
+            with open(temp_file, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(temp_file, self.state_file)
+        except OSError as e:
+            logger.warning(f"État d'installation non sauvegardé: {e}")
+
+    # Cache de paquets -------------------------------------------------------
+
+    def _check_package_cache(self):
+        """Valide le cache hors ligne et signale les paquets manquants
+
+        Appelé une fois le cache rempli par l'étape update (ou au démarrage
+        si elle est sautée); les lignes sont rattachées à l'étape update.
+        """
+        step = self.steps.get('update')
+        if step is None or not os.path.isdir(PACKAGE_CACHE_DIR):
+            return
+        try:
+            cache = PackageCache(PACKAGE_CACHE_DIR)
+            report = cache.verify()
+            packages = cache.package_report()
+        except OSError as e:
+            logger.warning(f"Vérification du cache de paquets impossible: {e}")
+            return
+
+        self._emit(step, f"Cache de paquets: {report['files']} fichier(s), "
+                         f"{report['trusted']} validé(s) par manifeste, {report['hashed']} haché(s) "
+                         f"en {report['duration']}s\n")
+        if report['corrupt']:
+            self._emit(step, f"Paquets corrompus retirés: {', '.join(report['corrupt'])}\n", error=True)
+        if report['unreadable']:
+            self._emit(step, f"Paquets illisibles (conservés): {', '.join(report['unreadable'])}\n", error=True)
+        hits = sum(len(result['hits']) for result in packages.values())
+        misses = [p for result in packages.values() for p in result['misses']]
+        self._emit(step, f"Paquets requis en cache: {hits}/{hits + len(misses)}\n")
+        if misses:
+            self._emit(step, f"Absents du cache (téléchargement nécessaire): {', '.join(misses)}\n")
+
+    # Notifications ---------------------------------------------------------
+
+    def _emit(self, step, line, error=False):
+        if self.on_output:
+            self.on_output(step, line, error)
+
+    def _set_status(self, step, status):
+        with self.lock:
+            step.status = status
+        logger.info(f"Étape {step.id}: {status}")
+        if self.on_step:
+            self.on_step(step)
+        self._report_progress()
+
+    def _report_progress(self):
+        if self.on_progress and self.steps:
+            total = sum(100 if step.finished else step.progress for step in self.steps.values())
+            self.on_progress(int(total / len(self.steps)))
+
+    # Exécution d'une étape -------------------------------------------------
+
+    def _run_step(self, step):
+        """Lance le script, enregistre sa sortie dans son log et la diffuse"""
+        step.log_file = os.path.join(self.log_dir, f"{step.id}.log")
+        self._set_status(step, 'running')
+        self._emit(step, f"Démarrage: {step.description}\n")
+
+        if not os.path.exists(step.script):
+            self._emit(step, f"Script non trouvé: {step.script} ✗\n")
+            step.exit_code = 127
+            return step
+
+        env = os.environ.copy()
+        env['PYTHONUNBUFFERED'] = '1'
+        env['SKIP_REBOOT'] = 'true'
+        env['INTERFACE_MODE'] = 'true'
+        env['SERVICE_ID'] = step.id
+
+        start = time.monotonic()
+        with open(step.log_file, 'w', encoding='utf-8') as log:
+            step.process = subprocess.Popen(
+                ['bash', step.script],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                errors='replace',
+                bufsize=1,
+                env=env
+            )
+            log_lock = threading.Lock()
+
+            # stderr lu en parallèle de stdout: pas de blocage sur un tube plein
+            errors = threading.Thread(
+                target=self._read_stderr, args=(step, log, log_lock), daemon=True
+            )
+            errors.start()
+
+            for line in step.process.stdout:
+                with log_lock:
+                    log.write(line)
+                if line.startswith("PROGRESS:"):
+                    parts = line.strip().split(":")
+                    if len(parts) >= 3 and parts[1].isdigit():
+                        step.progress = min(int(parts[1]), 100)
+                        self._report_progress()
+                    continue
+                if "REFRESH_INDICATORS" in line:
+                    continue
+                self._emit(step, line)
+
+            errors.join()
+            step.exit_code = step.process.wait()
+
+        step.duration = round(time.monotonic() - start, 1)
+        step.process = None
+        return step
+
+    def _read_stderr(self, step, log, log_lock):
+        for line in step.process.stderr:
+            with log_lock:
+                log.write(line)
+            self._emit(step, line, error=True)
+
+    def _finish_step(self, step):
+        if step.exit_code == 0 and not self.cancelled.is_set():
+            update_services_status(step.id, 'active', "Installation réussie", self.status_file)
+            self._emit(step, f"{step.description} : Installation réussie ✓ ({step.duration}s)\n")
+            self._set_status(step, 'done')
+            if step.id == 'update':
+                self._check_package_cache()
+        else:
+            update_services_status(step.id, 'inactive', "Échec de l'installation", self.status_file)
+            self._emit(step, f"{step.description} : Échec de l'installation (code {step.exit_code}) ✗\n", error=True)
+            self._set_status(step, 'failed')
+        self._save_state()
+
+    def _block_dependents(self):
+        """Étapes dont une dépendance a échoué: non lancées"""
+        changed = True
+        while changed:
+            changed = False
+            for step in self.steps.values():
+                if step.status != 'pending':
+                    continue
+                failed = [d for d in step.after if self.steps[d].status in ('failed', 'blocked')]
+                if failed:
+                    self._emit(step, f"Non lancée: dépendance en échec ({', '.join(failed)})\n")
+                    update_services_status(
+                        step.id, 'inactive', f"Dépendance en échec: {', '.join(failed)}", self.status_file
+                    )
+                    self._set_status(step, 'blocked')
+                    changed = True
+
+    def _next_step(self):
+        for step in self.steps.values():
+            if step.status == 'pending' and all(self.steps[d].succeeded for d in step.after):
+                return step
+        return None
+
+    def run(self):
+        """Exécute le plan; retourne True si toutes les étapes ont réussi"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        logger.info(f"Plan d'installation: {', '.join(self.steps)}")
+        start = time.monotonic()
+
+        self._mark_completed()
+        self._report_progress()
+        if 'update' in self.steps and self.steps['update'].status == 'skipped':
+            self._check_package_cache()
+
+        while not self.cancelled.is_set():
+            self._block_dependents()
+            step = self._next_step()
+            if step is None:
+                break
+            try:
+                self._run_step(step)
+            except Exception as e:
+                logger.error(f"Erreur de l'étape {step.id}: {e}")
+                self._emit(step, f"ERREUR: {e}\n", error=True)
+                step.process = None
+                step.exit_code = step.exit_code if step.exit_code is not None else -1
+            self._finish_step(step)
+
+        self._save_state()
+        duration = time.monotonic() - start
+        failed = [step.id for step in self.steps.values() if not step.succeeded]
+        if failed:
+            logger.error(f"Installation terminée en {duration:.0f}s avec erreur(s): {', '.join(failed)}")
+        else:
+            logger.info(f"Installation terminée en {duration:.0f}s sans erreur")
+        return not failed
+
+    def cancel(self):
+        """Arrête les scripts en cours; les étapes restantes ne sont pas lancées"""
+        self.cancelled.set()
+        for step in self.steps.values():
+            process = step.process
+            if process is not None and process.poll() is None:
+                process.terminate()
+
+    def reboot_delay(self):
+        """Délai avant redémarrage (None: pas de redémarrage automatique)"""
+        if all(step.succeeded for step in self.steps.values()):
+            return REBOOT_DELAY_SUCCESS
+        orchestrator = self.steps.get('orchestrator')
+        if orchestrator is not None and orchestrator.succeeded:
+            return REBOOT_DELAY_PARTIAL
+        return None
+
+    def summary(self):
+        """Lignes de résumé par étape (statut, durée)"""
+        symbols = {'done': '✓', 'skipped': '✓', 'failed': '✗', 'blocked': '✗'}
+        lines = []
+        for step in self.steps.values():
+            duration = f" ({step.duration}s)" if step.duration is not None else ""
+            lines.append(f"  {symbols.get(step.status, '•')} {step.id}: {step.status}{duration}")
+        return lines
+
+# ===============================================================================
+# PROGRAMME PRINCIPAL
+# ===============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Installation complète MaxLink (logs par étape, reprise)")
+    parser.add_argument('--force', action='store_true', help="Réinstalle aussi les services déjà actifs")
+    parser.add_argument('--reboot', action='store_true', help="Redémarre le système à la fin")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if os.geteuid() != 0:
+        print("⚠ Ce script doit être exécuté avec des privilèges root")
+        sys.exit(1)
+
+    services = [{'id': service_id, 'name': spec['description']} for service_id, spec in INSTALL_STEPS.items()]
+    orchestrator = InstallOrchestrator(
+        services,
+        force=args.force,
+        on_output=lambda step, line, error: print(
+            f"[{step.id}] {line}", end='', flush=True, file=sys.stderr if error else sys.stdout
+        )
+    )
+    success = orchestrator.run()
+
+    print("\n".join(["", "STATUT DE L'INSTALLATION"] + orchestrator.summary()))
+    print(f"\nLogs par étape: {orchestrator.log_dir}")
+
+    delay = orchestrator.reboot_delay()
+    if args.reboot and delay is not None:
+        print(f"\n  ↦ Redémarrage du système dans {delay} secondes...")
+        time.sleep(delay)
+        subprocess.run(['reboot'])
+
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
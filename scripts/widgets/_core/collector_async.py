@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Runtime asyncio des collecteurs MaxLink
+Une seule boucle d'événements pilote plusieurs widgets: la boucle réseau
+paho est branchée sur la boucle asyncio (add_reader/add_writer) au lieu
+de son thread loop_start(), et les ticks de collecte sont des tâches
+périodiques. Callbacks MQTT et collecte s'exécutent dans le même thread:
+plus de course sur self.connected ou self.stats.
+
+Les sous-classes existantes de BaseCollector fonctionnent sans
+modification (adaptateur run_once); AsyncBaseCollector permet d'écrire
+une collecte asynchrone (sous-processus et lectures de fichiers).
+
+Exemples:
+    python3 collector_async.py servermonitoring wifistats --offload wifistats
+    python3 collector_async.py servermonitoring --config-dir /tmp/widgets
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import inspect
+import argparse
+import importlib
+import threading
+from pathlib import Path
+
+from collector_base import BaseCollector
+
+MISC_INTERVAL = 1.0          # Keepalive et timeouts paho (loop_misc)
+ERROR_PAUSE = 5.0            # Pause après une erreur de collecte (comme run())
+DISCONNECT_GRACE = 0.2       # Envoi du DISCONNECT avant la fermeture
+
+class AsyncMQTTTransport:
+    """Boucle réseau paho pilotée par la boucle asyncio
+
+    Le socket du client est surveillé par add_reader/add_writer; les
+    reconnexions suivent le backoff de BaseCollector (reconnect_delay).
+    L'ouverture TCP bloquante de client.reconnect() passe par un thread
+    pour ne pas figer les autres widgets si le broker est injoignable.
+    """
+
+    def __init__(self, collector, loop):
+        self.collector = collector
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.client = None
+        self.fd = None
+        self.connecting = False
+        self.closing = False
+        self.connected = asyncio.Event()
+        self.tasks = set()
+
+    def _in_loop(self, callback, *args):
+        """Exécute dans le thread de la boucle (publications d'un tick délégué)"""
+        if threading.get_ident() == self.loop_thread:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _spawn(self, coroutine):
+        task = self.loop.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    # Callbacks de socket paho (appelés depuis loop_read/loop_write/reconnect)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._in_loop(self._watch, sock.fileno())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._in_loop(self._forget)
+
+    def _on_register_write(self, client, userdata, sock):
+        self._in_loop(self._watch_write)
+
+    def _on_unregister_write(self, client, userdata, sock):
+        self._in_loop(self._forget_write)
+
+    def _watch(self, fd):
+        self.fd = fd
+        self.loop.add_reader(fd, self.client.loop_read)
+
+    def _watch_write(self):
+        if self.fd is not None:
+            self.loop.add_writer(self.fd, self.client.loop_write)
+
+    def _forget_write(self):
+        if self.fd is not None:
+            self.loop.remove_writer(self.fd)
+
+    def _forget(self):
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            self.loop.remove_writer(self.fd)
+            self.fd = None
+
+    # Connexion et reconnexion
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self.collector.on_connect(client, userdata, flags, rc)
+        if rc == 0:
+            self.connected.set()
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected.clear()
+        self.collector.on_disconnect(client, userdata, rc)
+        self._in_loop(self._after_failure)
+
+    def _after_failure(self):
+        """Planifie la tentative suivante si le collecteur est en backoff"""
+        if not self.closing and self.collector.connection_state == 'backoff':
+            self._spawn(self._connect(self.collector.reconnect_delay))
+
+    async def _connect(self, delay=0):
+        if delay:
+            await asyncio.sleep(delay)
+        if self.closing:
+            return
+
+        self.collector._set_connection_state('connecting')
+        self.connecting = True
+        try:
+            await asyncio.to_thread(self.client.reconnect)
+        except OSError as e:
+            self.collector.logger.debug(f"Connexion MQTT impossible: {e}")
+            self.collector.on_connect_fail(self.client, None)
+            self._after_failure()
+        finally:
+            self.connecting = False
+
+    async def _misc(self):
+        while True:
+            await asyncio.sleep(MISC_INTERVAL)
+            if not self.connecting:
+                self.client.loop_misc()
+
+    def start(self):
+        """Crée le client du collecteur et lance la première tentative"""
+        collector = self.collector
+        collector.logger.info(f"Connexion MQTT à {collector.mqtt_config['host']}:{collector.mqtt_config['port']}")
+
+        self.client = collector._create_mqtt_client()
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_register_write
+        self.client.on_socket_unregister_write = self._on_unregister_write
+        collector.mqtt_client = self.client
+
+        self.client.connect_async(collector.mqtt_config['host'], collector.mqtt_config['port'], 60)
+        self._spawn(self._connect())
+        self._spawn(self._misc())
+
+    async def wait_connected(self, timeout):
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self):
+        """Laisse partir le DISCONNECT puis libère le socket et les tâches"""
+        self.closing = True
+        if self.fd is not None:
+            await asyncio.sleep(DISCONNECT_GRACE)
+        for task in list(self.tasks):
+            task.cancel()
+        self._forget()
+
+class AsyncBaseCollector(BaseCollector):
+    """Collecteur à collecte asynchrone (collect_and_publish est une coroutine)
+
+    Lancé seul par run() ou avec d'autres widgets par AsyncCollectorRuntime.
+    """
+
+    async def run_once_async(self):
+        """Équivalent asynchrone de run_once()"""
+        if not self.begin_tick():
+            return False
+
+        sampled = self.begin_health_tick() if self.health is not None else False
+        tick_start = time.perf_counter()
+        try:
+            await self.collect_and_publish()
+            self.publish_compact_metadata()
+        finally:
+            self._tick_thread = None
+
+        self.end_tick(time.perf_counter() - tick_start, sampled)
+        return True
+
+    def periodic_jobs(self):
+        """Jobs périodiques supplémentaires: [(nom, intervalle_s, coroutine)]
+
+        Chaque job est mesuré dans l'histogramme de santé sous son nom.
+        """
+        return []
+
+    async def run_command(self, *args, timeout=10):
+        """Exécute une commande sans bloquer la boucle; retourne (code, stdout, stderr)"""
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        return process.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+
+    async def read_file(self, path, binary=False):
+        """Lit un fichier dans un thread (carte SD lente, clé USB)"""
+        mode = 'rb' if binary else 'r'
+
+        def read():
+            with open(path, mode) as f:
+                return f.read()
+
+        return await asyncio.to_thread(read)
+
+    def run(self):
+        """Lance ce collecteur seul sur sa propre boucle d'événements"""
+        runtime = AsyncCollectorRuntime()
+        runtime.add(self)
+        asyncio.run(runtime.run())
+
+class AsyncCollectorRuntime:
+    """Pilote plusieurs collecteurs sur une seule boucle d'événements
+
+    Collecteurs synchrones: run_once() est exécuté dans la boucle, ou dans
+    un thread avec offload=True s'il bloque (subprocess.run, lectures USB).
+    Dans ce cas seules les publications croisent les threads, et paho les
+    protège par ses propres verrous.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.tasks = []
+
+    def add(self, collector, offload=False):
+        self.entries.append((collector, offload))
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        self.tasks = [
+            loop.create_task(self._run_collector(collector, offload))
+            for collector, offload in self.entries
+        ]
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def _run_collector(self, collector, offload):
+        """Équivalent de BaseCollector.run() pour un collecteur"""
+        collector.logger.info("Démarrage du collecteur (runtime asyncio)")
+        transport = AsyncMQTTTransport(collector, asyncio.get_running_loop())
+        transport.start()
+
+        try:
+            # Connexion non bloquante: la collecte démarre même si le broker est absent
+            if not await transport.wait_connected(collector.initial_connect_timeout):
+                if collector.connection_state == 'failed':
+                    collector.logger.error("Impossible de se connecter au broker MQTT après toutes les tentatives")
+                    collector.cleanup()
+                    return
+                collector.logger.warning("Broker MQTT indisponible - démarrage hors connexion")
+            collector.startup.mark('connect')
+
+            collector.logger.info("Collecteur opérationnel")
+            collector.initialize()
+            collector.startup.mark('initialize')
+
+            jobs = []
+            if isinstance(collector, AsyncBaseCollector):
+                jobs = [
+                    asyncio.create_task(self._periodic_job(collector, name, interval, job))
+                    for name, interval, job in collector.periodic_jobs()
+                ]
+            try:
+                await self._collect_loop(collector, offload)
+            finally:
+                for job in jobs:
+                    job.cancel()
+
+        except asyncio.CancelledError:
+            collector.logger.info("Arrêt demandé")
+        except Exception as e:
+            collector.logger.error(f"Erreur dans la boucle principale: {e}")
+        finally:
+            collector.shutdown()
+            await transport.close()
+
+    async def _collect_loop(self, collector, offload):
+        """Ticks à cadence fixe sur l'horloge monotone de la boucle
+
+        Un tick en retard déclenche le suivant immédiatement, sans rattraper
+        les ticks manqués (comptés dans health.loop_overruns).
+        """
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+
+        while True:
+            try:
+                if isinstance(collector, AsyncBaseCollector):
+                    keep_running = await collector.run_once_async()
+                elif offload:
+                    keep_running = await asyncio.to_thread(collector.run_once)
+                else:
+                    keep_running = collector.run_once()
+                if not keep_running:
+                    return
+                next_tick = max(next_tick + collector.get_update_interval(), loop.time())
+
+            except Exception as e:
+                collector.logger.error(f"Erreur dans la boucle de collecte: {e}")
+                collector.stats['errors'] += 1
+                next_tick = loop.time() + ERROR_PAUSE
+
+            await asyncio.sleep(next_tick - loop.time())
+
+    async def _periodic_job(self, collector, name, interval, job):
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + interval
+        while True:
+            await asyncio.sleep(max(0.0, next_run - loop.time()))
+            try:
+                with collector.timed(name):
+                    await job()
+            except Exception as e:
+                collector.logger.error(f"Erreur du job {name}: {e}")
+                collector.stats['errors'] += 1
+            next_run = max(next_run + interval, loop.time())
+
+def load_collector(widget, widgets_dir, config_dir):
+    """Instancie la sous-classe de BaseCollector définie par <widget>_collector.py"""
+    sys.path.insert(0, str(Path(widgets_dir) / widget))
+    module = importlib.import_module(f"{widget}_collector")
+
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+        if issubclass(cls, BaseCollector) and cls.__module__ == module.__name__:
+            config_file = Path(config_dir) / f"{widget}_widget.json"
+            if len(inspect.signature(cls).parameters) == 0:
+                # Collecteur qui localise lui-même sa configuration (testpersist)
+                return cls()
+            return cls(str(config_file))
+
+    raise ValueError(f"Aucune sous-classe de BaseCollector dans {widget}_collector.py")
+
+def main():
+    parser = argparse.ArgumentParser(description="Plusieurs collecteurs MaxLink sur une boucle asyncio")
+    parser.add_argument('widgets', nargs='+', help="Widgets à lancer (ex: servermonitoring wifistats)")
+    parser.add_argument('--offload', nargs='*', default=[],
+                        help="Widgets dont la collecte bloque (exécutée dans un thread)")
+    parser.add_argument('--widgets-dir', default='/opt/maxlink/widgets')
+    parser.add_argument('--config-dir', default='/opt/maxlink/config/widgets')
+    args = parser.parse_args()
+
+    # Un fichier de configuration par widget, jamais celui de l'environnement
+    os.environ.pop('CONFIG_FILE', None)
+
+    runtime = AsyncCollectorRuntime()
+    for widget in args.widgets:
+        runtime.add(load_collector(widget, args.widgets_dir, args.config_dir), offload=widget in args.offload)
+    asyncio.run(runtime.run())
+
+if __name__ == "__main__":
+    main()
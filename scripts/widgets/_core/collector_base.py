@@ -8,10 +8,18 @@ import os
 import sys
 import time
 import json
+import math
+import bisect
+import struct
+import importlib
 import logging
+import threading
+from itertools import accumulate
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 from abc import ABC, abstractmethod
+from json.encoder import encode_basestring_ascii
 
 # Configuration du logging
 logging.basicConfig(
@@ -28,11 +36,1236 @@ except ImportError:
     logging.error("Module paho-mqtt non installé")
     sys.exit(1)
 
+# Horloge de référence du profil de démarrage (repli si /proc est absent)
+MODULE_LOADED = time.monotonic()
+
+# Sérialiseurs JSON rapides optionnels (format 'compact' uniquement),
+# importés à la première demande: inutiles au format legacy par défaut
+_fast_json_modules = None
+
+def fast_json_modules():
+    """Modules orjson/ujson installés, {nom: module}"""
+    global _fast_json_modules
+    if _fast_json_modules is None:
+        _fast_json_modules = {}
+        for name in ('orjson', 'ujson'):
+            try:
+                _fast_json_modules[name] = importlib.import_module(name)
+            except ImportError:
+                pass
+    return _fast_json_modules
+
+# Classes de topics de la file hors connexion (plafonds par défaut)
+DEFAULT_OUTBOX_CLASSES = {
+    'metrics': {'max_bytes': 2 * 1024 * 1024, 'max_age': 6 * 3600},
+    'data': {'max_bytes': 4 * 1024 * 1024, 'max_age': 24 * 3600}
+}
+
+class OutboxSegmentQueue:
+    """File FIFO sur disque découpée en segments, bornée en taille et en âge
+    
+    Les enregistrements sont des lignes JSON ajoutées au dernier segment.
+    Quand un plafond est dépassé, les segments les plus anciens sont
+    supprimés (politique drop-oldest). Un curseur persistant indique la
+    position de lecture dans le plus ancien segment.
+    """
+    
+    def __init__(self, directory, max_bytes, max_age, segment_bytes=256 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_bytes = segment_bytes
+        self.cursor_file = self.directory / 'cursor'
+        
+        self.directory.mkdir(parents=True, exist_ok=True)
+        
+        # Segments existants: [numéro, taille]
+        self.segments = []
+        for segment_path in sorted(self.directory.glob('*.seg')):
+            try:
+                self.segments.append([int(segment_path.stem), segment_path.stat().st_size])
+            except (ValueError, OSError):
+                continue
+        
+        self.read_offset = self._load_cursor()
+        self.dropped = 0
+    
+    def _segment_path(self, number):
+        return self.directory / f"{number:012d}.seg"
+    
+    def _load_cursor(self):
+        """Relit le curseur de lecture (numéro de segment, offset)"""
+        try:
+            number, offset = self.cursor_file.read_text().split()
+            if self.segments and int(number) == self.segments[0][0]:
+                return int(offset)
+        except (OSError, ValueError):
+            pass
+        return 0
+    
+    def _save_cursor(self):
+        try:
+            if self.segments:
+                self.cursor_file.write_text(f"{self.segments[0][0]} {self.read_offset}")
+            elif self.cursor_file.exists():
+                self.cursor_file.unlink()
+        except OSError:
+            pass
+    
+    @property
+    def pending_bytes(self):
+        return sum(size for _, size in self.segments) - self.read_offset
+    
+    def _drop_oldest(self):
+        number, _ = self.segments.pop(0)
+        try:
+            self._segment_path(number).unlink()
+        except OSError:
+            pass
+        self.read_offset = 0
+        self.dropped += 1
+    
+    def enforce_limits(self):
+        """Supprime les segments trop anciens ou en excès (drop-oldest)"""
+        expiry = time.time() - self.max_age
+        
+        while self.segments:
+            number, size = self.segments[0]
+            try:
+                expired = self._segment_path(number).stat().st_mtime < expiry
+            except OSError:
+                expired = True
+            
+            if expired or self.pending_bytes > self.max_bytes:
+                self._drop_oldest()
+            else:
+                break
+        
+        self._save_cursor()
+    
+    def put(self, record):
+        """Ajoute un enregistrement (dict sérialisable en JSON)"""
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        
+        if not self.segments or self.segments[-1][1] + len(line) > self.segment_bytes:
+            next_number = self.segments[-1][0] + 1 if self.segments else 0
+            self.segments.append([next_number, 0])
+        
+        segment = self.segments[-1]
+        with open(self._segment_path(segment[0]), 'ab') as f:
+            f.write(line)
+        segment[1] += len(line)
+        
+        if self.pending_bytes > self.max_bytes:
+            self.enforce_limits()
+    
+    def drain(self, publish, limit):
+        """Publie jusqu'à limit enregistrements; s'arrête au premier échec
+        
+        Retourne le nombre d'enregistrements publiés.
+        """
+        published = 0
+        expiry = time.time() - self.max_age
+        
+        while self.segments and published < limit:
+            number, size = self.segments[0]
+            segment_path = self._segment_path(number)
+            
+            try:
+                with open(segment_path, 'rb') as f:
+                    f.seek(self.read_offset)
+                    while published < limit:
+                        line = f.readline()
+                        if not line:
+                            break
+                        
+                        # Ligne partielle (arrêt brutal pendant l'écriture): ignorée
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            self.read_offset += len(line)
+                            continue
+                        
+                        if record.get('ts', 0) >= expiry:
+                            if not publish(record):
+                                self._save_cursor()
+                                return published
+                            published += 1
+                        
+                        self.read_offset += len(line)
+            except OSError:
+                self.read_offset = size
+            
+            # Segment entièrement relu: le supprimer (le suivant put en recrée un)
+            if self.read_offset < size:
+                break
+            
+            self.segments.pop(0)
+            try:
+                segment_path.unlink()
+            except OSError:
+                pass
+            self.read_offset = 0
+        
+        self._save_cursor()
+        return published
+
+class DiskOutbox:
+    """File de publications hors connexion, une file de segments par classe de topics
+    
+    put est aussi appelé depuis le thread réseau paho (publications faites
+    dans on_message pendant une coupure): un verrou sérialise put, drain et
+    enforce_limits sur les segments.
+    """
+    
+    def __init__(self, base_dir, classes_config=None, segment_bytes=256 * 1024):
+        classes_config = classes_config or DEFAULT_OUTBOX_CLASSES
+        self.queues = {}
+        
+        for name, limits in classes_config.items():
+            self.queues[name] = OutboxSegmentQueue(
+                Path(base_dir) / name,
+                limits.get('max_bytes', 2 * 1024 * 1024),
+                limits.get('max_age', 6 * 3600),
+                segment_bytes
+            )
+        
+        self.queued = 0
+        self.lock = threading.Lock()
+    
+    def put(self, topic_class, topic, payload, qos=1):
+        queue = self.queues.get(topic_class) or self.queues.get('data')
+        if queue is None:
+            return False
+        with self.lock:
+            queue.put({'ts': time.time(), 't': topic, 'p': payload, 'q': qos})
+            self.queued += 1
+        return True
+    
+    @property
+    def pending_bytes(self):
+        with self.lock:
+            return sum(queue.pending_bytes for queue in self.queues.values())
+    
+    @property
+    def dropped_segments(self):
+        return sum(queue.dropped for queue in self.queues.values())
+    
+    def enforce_limits(self):
+        with self.lock:
+            for queue in self.queues.values():
+                queue.enforce_limits()
+    
+    def drain(self, publish, limit):
+        """Vide les files (classe 'data' d'abord) dans la limite du budget
+        
+        publish ne doit pas rappeler put (verrou non réentrant).
+        """
+        published = 0
+        with self.lock:
+            for name in sorted(self.queues, key=lambda name: name != 'data'):
+                if published >= limit:
+                    break
+                published += self.queues[name].drain(publish, limit - published)
+        return published
+
+INFINITY = float('inf')
+
+def encode_legacy_value(value):
+    """Encode une valeur exactement comme json.dumps (scalaires sans détour)"""
+    kind = type(value)
+    if kind is float:
+        if value != value:
+            return 'NaN'
+        if value == INFINITY:
+            return 'Infinity'
+        if value == -INFINITY:
+            return '-Infinity'
+        return float.__repr__(value)
+    if kind is int:
+        return int.__repr__(value)
+    if kind is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return json.dumps(value)
+
+class PayloadSerializer:
+    """Sérialisation JSON des publications MQTT
+    
+    Format 'legacy' (défaut): octets identiques à l'ancien json.dumps, les
+    métriques sont rendues depuis des gabarits précompilés par unité.
+    Format 'compact': orjson ou ujson si installés, sans espaces; le JSON
+    décodé est identique mais pas les octets (NaN devient null avec orjson).
+    """
+    
+    BACKENDS = ('orjson', 'ujson', 'json')
+    
+    def __init__(self, payload_format='legacy', backend='auto'):
+        if payload_format not in ('legacy', 'compact'):
+            raise ValueError(f"Format de sérialisation inconnu: {payload_format}")
+        
+        self.format = payload_format
+        self.backend = self.select_backend(backend) if payload_format == 'compact' else 'json'
+        
+        if payload_format == 'legacy':
+            self.item_separator = ', '
+            self.metric = self._legacy_metric
+            self.data = self._legacy_data
+        else:
+            self.item_separator = ','
+            self.metric = self._compact_metric
+            self.data = self._compact_data
+            if self.backend == 'orjson':
+                orjson = fast_json_modules()['orjson']
+                self._fast_dumps = lambda obj: orjson.dumps(obj).decode('utf-8')
+            elif self.backend == 'ujson':
+                ujson = fast_json_modules()['ujson']
+                self._fast_dumps = lambda obj: ujson.dumps(obj, ensure_ascii=False)
+            else:
+                self._fast_dumps = self._json_compact
+        
+        # Gabarits de fin de métrique par unité, ex: ', "unit": "%"}'
+        self._metric_suffixes = {}
+    
+    @classmethod
+    def select_backend(cls, backend='auto'):
+        """Premier sérialiseur disponible (auto) ou celui demandé s'il est installé"""
+        installed = fast_json_modules()
+        available = {'orjson': 'orjson' in installed, 'ujson': 'ujson' in installed, 'json': True}
+        if backend == 'auto':
+            return next(name for name in cls.BACKENDS if available[name])
+        if backend not in available:
+            raise ValueError(f"Sérialiseur inconnu: {backend}")
+        return backend if available[backend] else 'json'
+    
+    def _json_compact(self, obj):
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+    
+    def dumps(self, obj):
+        """Sérialise un objet quelconque selon le format configuré"""
+        if self.format == 'legacy':
+            return json.dumps(obj)
+        try:
+            return self._fast_dumps(obj)
+        except (TypeError, ValueError, OverflowError):
+            # Clés non textuelles, types exotiques: repli sur la bibliothèque standard
+            return self._json_compact(obj)
+    
+    def _metric_suffix(self, unit):
+        suffix = self._metric_suffixes.get(unit)
+        if suffix is None:
+            suffix = ', "unit": ' + encode_basestring_ascii(unit) + '}' if unit else '}'
+            self._metric_suffixes[unit] = suffix
+        return suffix
+    
+    def _legacy_metric(self, timestamp, value, unit=None):
+        """{"timestamp": ..., "value": ...[, "unit": ...]} sans dictionnaire intermédiaire"""
+        if unit is not None and type(unit) is not str:
+            payload = {"timestamp": timestamp, "value": value}
+            if unit:
+                payload["unit"] = unit
+            return json.dumps(payload)
+        return '{"timestamp": "' + timestamp + '", "value": ' + encode_legacy_value(value) + self._metric_suffix(unit)
+    
+    def _compact_metric(self, timestamp, value, unit=None):
+        payload = {"timestamp": timestamp, "value": value}
+        if unit:
+            payload["unit"] = unit
+        return self.dumps(payload)
+    
+    def _splice_timestamp(self, timestamp, body, key_separator):
+        """Insère l'horodatage en tête d'un objet JSON déjà sérialisé"""
+        head = '{"timestamp"' + key_separator + '"' + timestamp + '"'
+        if body == '{}':
+            return head + '}'
+        return head + self.item_separator + body[1:]
+    
+    def _legacy_data(self, timestamp, data):
+        # Une clé 'timestamp' dans data remplace la valeur en gardant la position
+        if type(data) is not dict or 'timestamp' in data:
+            return json.dumps({"timestamp": timestamp, **data})
+        return self._splice_timestamp(timestamp, json.dumps(data), ': ')
+    
+    def _compact_data(self, timestamp, data):
+        if type(data) is not dict or 'timestamp' in data:
+            return self.dumps({"timestamp": timestamp, **data})
+        return self._splice_timestamp(timestamp, self.dumps(data), ':')
+
+# Format binaire compact des métriques: version, schéma, horodatage ms, valeur
+COMPACT_METRIC_VERSION = 1
+COMPACT_METRIC_LAYOUT = struct.Struct('!BBQd')
+
+class CompactMetricEncoder:
+    """Encodage binaire optionnel des métriques numériques (18 octets)
+    
+    L'unité n'est pas répétée dans chaque message: elle est publiée une
+    fois dans un topic de métadonnées retenu, qui annonce aussi les versions
+    disponibles pour que chaque dashboard choisisse son format.
+    """
+    
+    def __init__(self, config):
+        self.mode = config.get('mode', 'both')
+        if self.mode not in ('both', 'binary'):
+            raise ValueError(f"Mode de métriques compactes inconnu: {self.mode}")
+        
+        self.schema_id = config.get('schema_id', 1)
+        self.topic_suffix = config.get('topic_suffix', '/bin')
+        self.meta_topic = config['meta_topic']
+        
+        self.units = {}
+        self.metadata_dirty = True
+    
+    def binary_topic(self, topic):
+        return topic + self.topic_suffix
+    
+    def encode(self, timestamp_ms, value, topic, unit):
+        """Retourne le payload binaire; note l'unité pour les métadonnées"""
+        if self.units.get(topic, False) != unit:
+            self.units[topic] = unit
+            self.metadata_dirty = True
+        return COMPACT_METRIC_LAYOUT.pack(COMPACT_METRIC_VERSION, self.schema_id, timestamp_ms, value)
+    
+    @staticmethod
+    def decode(payload):
+        """Décodage de référence (dashboards, outils de diagnostic)"""
+        version, schema_id, timestamp_ms, value = COMPACT_METRIC_LAYOUT.unpack(payload)
+        return {'version': version, 'schema_id': schema_id, 'timestamp_ms': timestamp_ms, 'value': value}
+    
+    def metadata(self):
+        """Description retenue des formats disponibles et des unités"""
+        return {
+            'versions': {
+                'json': 1,
+                'binary': COMPACT_METRIC_VERSION
+            },
+            'formats': ['binary'] if self.mode == 'binary' else ['json', 'binary'],
+            'binary': {
+                'schema_id': self.schema_id,
+                'layout': COMPACT_METRIC_LAYOUT.format,
+                'fields': ['version', 'schema_id', 'timestamp_ms', 'value'],
+                'topic_suffix': self.topic_suffix
+            },
+            'units': {topic: unit for topic, unit in self.units.items()}
+        }
+
+# Bornes des histogrammes de durée (millisecondes, dernier bucket = +Inf)
+HEALTH_BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Budget de 1% du CPU du collecteur (vérifié par serialization_bench.py):
+# fraction des ticks instrumentés et période du rapport (≈50 µs par rapport)
+DEFAULT_HEALTH_SAMPLE_RATE = 0.01
+DEFAULT_HEALTH_INTERVAL = 120
+
+class DurationHistogram:
+    """Histogramme de durées à buckets fixes (cumulé depuis le démarrage)
+    
+    Sans verrou: chaque histogramme n'a qu'un thread écrivain (boucle
+    principale pour les jobs, thread réseau paho pour la latence); une
+    lecture concurrente peut seulement voir un compteur en retard d'une unité.
+    """
+    
+    __slots__ = ('counts', 'count', 'total', 'maximum', 'last_snapshot')
+    
+    def __init__(self):
+        self.counts = [0] * (len(HEALTH_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.last_snapshot = None
+    
+    def observe(self, seconds):
+        ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(HEALTH_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.maximum:
+            self.maximum = ms
+    
+    def quantiles(self, *qs):
+        """Bornes supérieures des buckets contenant chaque quantile"""
+        if not self.count:
+            return [None] * len(qs)
+        
+        # Cumul et recherche dichotomique en C plutôt qu'une boucle Python
+        cumulative = list(accumulate(self.counts))
+        last_bound = len(HEALTH_BUCKETS_MS)
+        results = []
+        for q in qs:
+            index = bisect.bisect_left(cumulative, q * self.count)
+            results.append(HEALTH_BUCKETS_MS[index] if index < last_bound else round(self.maximum, 3))
+        return results
+    
+    def snapshot(self):
+        """Résumé de l'histogramme, recalculé seulement après une observation
+        (à faible échantillonnage, la plupart ne changent pas entre deux rapports)"""
+        count = self.count
+        if self.last_snapshot is not None and self.last_snapshot['count'] == count:
+            return self.last_snapshot
+        
+        p50, p90, p99 = self.quantiles(0.5, 0.9, 0.99)
+        self.last_snapshot = {
+            'count': count,
+            'sum_ms': round(self.total, 3),
+            'max_ms': round(self.maximum, 3),
+            'p50_ms': p50,
+            'p90_ms': p90,
+            'p99_ms': p99
+        }
+        return self.last_snapshot
+
+NULL_CONTEXT = nullcontext()
+
+class JobTimer:
+    """Gestionnaire de contexte réutilisable de BaseCollector.timed"""
+    
+    __slots__ = ('histogram', 'health', 'start')
+    
+    def __init__(self, histogram, health):
+        self.histogram = histogram
+        self.health = health
+        self.start = 0.0
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(time.perf_counter() - self.start)
+        self.health.observations += 1
+        return False
+
+class CollectorHealth:
+    """Auto-instrumentation du collecteur: durées, latences, files, processus
+    
+    Le coût de l'instrumentation est mesuré (publication du rapport) ou
+    estimé (observations × coût calibré au démarrage) et rapporté au CPU
+    du processus pour vérifier qu'il reste sous 1%.
+    """
+    
+    MAX_PENDING_ACKS = 1000
+    
+    # Acquittement attendu au-delà: publication perdue, l'entrée est purgée
+    ACK_TIMEOUT = 30.0
+    
+    def __init__(self, sample_rate=DEFAULT_HEALTH_SAMPLE_RATE):
+        self.jobs = {}
+        self.job_timers = {}
+        self.publish_latency = DurationHistogram()
+        
+        from random import random
+        self._random = random
+        
+        # Échantillonnage par tick (écarts aléatoires pour ne pas se caler sur
+        # les groupes périodiques des collecteurs): durées des jobs et latences
+        # ne sont mesurées que pendant les ticks échantillonnés
+        self.sampling = False
+        self.ticks = 0
+        self.loop_overruns = 0
+        self.sample_rate = sample_rate
+        
+        # Publications QoS 1 échantillonnées en attente d'acquittement {mid: envoi}
+        self.pending_acks = {}
+        self.last_sent = 0.0
+        
+        self.observations = 0
+        self.overhead_seconds = 0.0
+        self.observation_cost = self._calibrate()
+        
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        # Descripteur conservé: relu par pread à chaque rapport, sans open/close
+        try:
+            self.statm_fd = os.open('/proc/self/statm', os.O_RDONLY)
+        except OSError:
+            self.statm_fd = None
+        self.last_cpu = time.process_time()
+        self.last_wall = time.monotonic()
+    
+    def _calibrate(self):
+        """Coût moyen d'une observation (histogramme jetable)"""
+        histogram = DurationHistogram()
+        start = time.perf_counter()
+        for _ in range(1000):
+            histogram.observe(time.perf_counter() - start)
+        return (time.perf_counter() - start) / 1000
+    
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+    
+    @sample_rate.setter
+    def sample_rate(self, rate):
+        self._sample_rate = min(1.0, max(0.0, float(rate)))
+        self.next_sample = self.ticks + self._sample_gap()
+    
+    def _sample_gap(self):
+        """Ticks jusqu'au prochain échantillon (loi géométrique de paramètre
+        sample_rate): un seul tirage par échantillon au lieu d'un par tick"""
+        rate = self._sample_rate
+        if rate >= 1.0:
+            return 1
+        if rate <= 0.0:
+            return float('inf')
+        return 1 + int(math.log(1.0 - self._random()) / math.log(1.0 - rate))
+    
+    def begin_tick(self):
+        self.ticks += 1
+        if self.ticks < self.next_sample:
+            self.sampling = False
+            return False
+        self.next_sample = self.ticks + self._sample_gap()
+        self.sampling = True
+        return True
+    
+    def job_histogram(self, name):
+        histogram = self.jobs.get(name)
+        if histogram is None:
+            histogram = self.jobs[name] = DurationHistogram()
+        return histogram
+    
+    def job_timer(self, name):
+        timer = self.job_timers.get(name)
+        if timer is None:
+            timer = self.job_timers[name] = JobTimer(self.job_histogram(name), self)
+        return timer
+    
+    def observe_job(self, name, seconds):
+        self.job_histogram(name).observe(seconds)
+        self.observations += 1
+    
+    def publish_sent(self, mid, sent_at):
+        """Enregistre l'envoi d'une publication échantillonnée"""
+        self.observations += 1
+        if len(self.pending_acks) >= self.MAX_PENDING_ACKS:
+            # Acquittements perdus (coupure): repartir d'une table vide
+            self.pending_acks.clear()
+        self.pending_acks[mid] = sent_at
+        self.last_sent = sent_at
+    
+    def publish_acked(self, mid):
+        """Thread réseau: un acquittement plus rapide que le retour de publish()
+        laisse une entrée orpheline, purgée à la coupure ou au plafond"""
+        if not self.pending_acks:
+            return
+        sent_at = self.pending_acks.pop(mid, None)
+        if sent_at is not None:
+            self.publish_latency.observe(time.perf_counter() - sent_at)
+    
+    def awaiting_acks(self):
+        """Vrai tant qu'une publication échantillonnée attend son acquittement"""
+        if not self.pending_acks:
+            return False
+        if time.perf_counter() - self.last_sent > self.ACK_TIMEOUT:
+            # Plus aucun envoi récent: les entrées restantes sont orphelines
+            self.pending_acks.clear()
+            return False
+        return True
+    
+    def connection_lost(self):
+        self.pending_acks.clear()
+    
+    def read_rss(self):
+        """Mémoire résidente courante (octets)"""
+        try:
+            if self.statm_fd is None:
+                raise OSError("statm indisponible")
+            return int(os.pread(self.statm_fd, 128, 0).split()[1]) * self.page_size
+        except (OSError, ValueError, IndexError):
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    
+    def snapshot(self, queues):
+        """Rapport de santé; met à jour le CPU sur l'intervalle écoulé"""
+        cpu = time.process_time()
+        wall = time.monotonic()
+        elapsed = wall - self.last_wall
+        cpu_percent = 100.0 * (cpu - self.last_cpu) / elapsed if elapsed > 0 else 0.0
+        self.last_cpu = cpu
+        self.last_wall = wall
+        
+        overhead = self.overhead_seconds + self.observations * self.observation_cost
+        
+        return {
+            'process': {
+                'rss_bytes': self.read_rss(),
+                'cpu_seconds': round(cpu, 3),
+                'cpu_percent': round(cpu_percent, 2)
+            },
+            'jobs': {name: histogram.snapshot() for name, histogram in self.jobs.items()},
+            'publish_latency': self.publish_latency.snapshot(),
+            'loop': {
+                'ticks': self.ticks,
+                'overruns': self.loop_overruns,
+                'sample_rate': self.sample_rate
+            },
+            'queues': queues,
+            'instrumentation': {
+                'overhead_seconds': round(overhead, 4),
+                'overhead_percent': round(100.0 * overhead / cpu, 3) if cpu > 0 else 0.0
+            }
+        }
+    
+    def prometheus_text(self, widget_id, report):
+        """Format texte Prometheus (collecteur textfile de node_exporter)"""
+        label = f'collector="{widget_id}"'
+        lines = []
+        
+        def histogram_lines(name, histogram, labels):
+            counts = list(histogram.counts)
+            total = histogram.total
+            cumulative = 0
+            for bound, count in zip(HEALTH_BUCKETS_MS + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(bound / 1000.0)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {total / 1000.0}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        
+        lines.append('# TYPE maxlink_collector_job_duration_seconds histogram')
+        for job, histogram in self.jobs.items():
+            histogram_lines('maxlink_collector_job_duration_seconds', histogram, f'{label},job="{job}"')
+        
+        lines.append('# TYPE maxlink_collector_publish_latency_seconds histogram')
+        histogram_lines('maxlink_collector_publish_latency_seconds', self.publish_latency, label)
+        
+        gauges = (
+            ('maxlink_collector_loop_overruns_total', 'counter', report['loop']['overruns']),
+            ('maxlink_collector_rss_bytes', 'gauge', report['process']['rss_bytes']),
+            ('maxlink_collector_cpu_seconds_total', 'counter', report['process']['cpu_seconds']),
+            ('maxlink_collector_outbox_bytes', 'gauge', report['queues']['outbox_bytes']),
+            ('maxlink_collector_mqtt_queue_messages', 'gauge', report['queues']['mqtt_outgoing']),
+            ('maxlink_collector_instrumentation_overhead_ratio', 'gauge',
+             report['instrumentation']['overhead_percent'] / 100.0)
+        )
+        for name, kind, value in gauges:
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name}{{{label}}} {value}')
+        
+        return '\n'.join(lines) + '\n'
+
+class StackSampler(threading.Thread):
+    """Profileur statistique: échantillonne les piles de tous les threads
+    
+    En mode CPU (par défaut), un échantillon n'est compté que si le thread a
+    consommé du CPU depuis le précédent: les threads en attente (sleep,
+    select de paho) n'apparaissent pas dans le résultat.
+    """
+    
+    def __init__(self, duration, interval, cpu_only=True):
+        super().__init__(name='maxlink-profiler', daemon=True)
+        self.duration = duration
+        self.interval = interval
+        self.cpu_only = cpu_only and hasattr(time, 'pthread_getcpuclockid')
+        self.stop_event = threading.Event()
+        self.stacks = {}
+        self.samples = 0
+        self.ticks = 0
+    
+    def _thread_cpu(self, ident):
+        try:
+            return time.clock_gettime(time.pthread_getcpuclockid(ident))
+        except (OSError, OverflowError):
+            return None
+    
+    def run(self):
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + self.duration
+        last_cpu = {}
+        thread_names = {}
+        
+        while not self.stop_event.wait(self.interval) and time.monotonic() < deadline:
+            self.ticks += 1
+            if self.ticks % 100 == 1:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                
+                if self.cpu_only:
+                    cpu = self._thread_cpu(ident)
+                    previous = last_cpu.get(ident)
+                    last_cpu[ident] = cpu
+                    if cpu is None or previous is None or cpu == previous:
+                        continue
+                
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                
+                # Format « collapsed » de flamegraph.pl: racine;...;feuille
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+    
+    def top(self, limit):
+        """Fonctions les plus échantillonnées (propre et inclusif)"""
+        own = {}
+        inclusive = {}
+        for key, count in self.stacks.items():
+            frames = key.split(';')[1:]
+            if not frames:
+                continue
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for function in set(frames):
+                inclusive[function] = inclusive.get(function, 0) + count
+        
+        total = self.samples or 1
+        ranking = sorted(inclusive, key=lambda function: (own.get(function, 0), inclusive[function]), reverse=True)
+        return [
+            {
+                'function': function,
+                'self': own.get(function, 0),
+                'self_percent': round(100.0 * own.get(function, 0) / total, 1),
+                'total': inclusive[function],
+                'total_percent': round(100.0 * inclusive[function] / total, 1)
+            }
+            for function in ranking[:limit]
+        ]
+    
+    def write(self, path):
+        with open(path, 'w') as f:
+            for key, count in sorted(self.stacks.items(), key=lambda item: item[1], reverse=True):
+                f.write(f"{key} {count}\n")
+
+class CollectorProfiler:
+    """Profilage à la demande, piloté par commande MQTT
+    
+    La commande arrive dans le thread réseau; le démarrage et la clôture se
+    font dans la boucle principale (on_tick), seul thread que cProfile peut
+    observer.
+    """
+    
+    MODES = ('sample', 'cprofile')
+    
+    def __init__(self, widget_id, config):
+        self.widget_id = widget_id
+        self.output_dir = Path(config.get('output_dir', '/var/log/maxlink/profiles'))
+        self.max_duration = config.get('max_duration', 300)
+        self.defaults = {
+            'mode': config.get('mode', 'sample'),
+            'duration': config.get('duration', 30),
+            'interval_ms': config.get('interval_ms', 10),
+            'top': config.get('top', 15),
+            'cpu_only': config.get('cpu_only', True)
+        }
+        
+        self.lock = threading.Lock()
+        self.pending = None
+        self.stop_requested = False
+        self.active = None
+    
+    def request(self, command):
+        """Thread réseau: valide une commande; retourne (accepté, message)"""
+        action = command.get('command')
+        
+        with self.lock:
+            if action == 'stop':
+                if self.active is None and self.pending is None:
+                    return False, 'aucun profilage en cours'
+                self.stop_requested = True
+                return True, 'arrêt demandé'
+            
+            if action != 'start':
+                return False, f"commande inconnue: {action}"
+            if self.active is not None or self.pending is not None:
+                return False, 'profilage déjà en cours'
+            
+            settings = dict(self.defaults)
+            settings.update({key: command[key] for key in self.defaults if key in command})
+            if settings['mode'] not in self.MODES:
+                return False, f"mode inconnu: {settings['mode']}"
+            try:
+                settings['duration'] = min(float(settings['duration']), self.max_duration)
+                settings['interval_ms'] = max(1.0, float(settings['interval_ms']))
+                settings['top'] = int(settings['top'])
+            except (TypeError, ValueError):
+                return False, 'paramètres invalides'
+            
+            self.pending = settings
+            self.stop_requested = False
+            return True, f"profilage {settings['mode']} de {settings['duration']:.0f}s programmé"
+    
+    def on_tick(self):
+        """Boucle principale: démarre ou clôture; retourne le résumé une fois terminé"""
+        if self.pending is None and self.active is None:
+            return None
+        
+        with self.lock:
+            if self.pending is not None and self.active is None:
+                self._start(self.pending)
+                self.pending = None
+                return None
+            stop_requested = self.stop_requested
+        
+        active = self.active
+        if active is None:
+            return None
+        
+        if active['mode'] == 'sample':
+            finished = not active['sampler'].is_alive()
+            if stop_requested and not finished:
+                active['sampler'].stop_event.set()
+                active['sampler'].join(1)
+                finished = True
+        else:
+            finished = stop_requested or time.monotonic() >= active['deadline']
+        
+        if not finished:
+            return None
+        
+        with self.lock:
+            self.active = None
+            self.stop_requested = False
+        return self._finish(active)
+    
+    def _start(self, settings):
+        active = dict(settings)
+        active['started'] = time.monotonic()
+        active['started_at'] = datetime.now()
+        
+        if settings['mode'] == 'sample':
+            sampler = StackSampler(settings['duration'], settings['interval_ms'] / 1000.0, settings['cpu_only'])
+            sampler.start()
+            active['sampler'] = sampler
+        else:
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+            active['profile'] = profile
+            active['deadline'] = active['started'] + settings['duration']
+        
+        self.active = active
+    
+    def _finish(self, active):
+        summary = {
+            'status': 'finished',
+            'mode': active['mode'],
+            'duration_seconds': round(time.monotonic() - active['started'], 2),
+            'file': None
+        }
+        
+        stamp = active['started_at'].strftime('%Y%m%d_%H%M%S')
+        extension = 'collapsed' if active['mode'] == 'sample' else 'pstats'
+        path = self.output_dir / f"{self.widget_id}_{stamp}.{extension}"
+        
+        if active['mode'] == 'sample':
+            sampler = active['sampler']
+            summary['samples'] = sampler.samples
+            summary['interval_ms'] = active['interval_ms']
+            summary['cpu_only'] = sampler.cpu_only
+            summary['top'] = sampler.top(active['top'])
+            writer = sampler.write
+        else:
+            import pstats
+            profile = active['profile']
+            profile.disable()
+            stats = pstats.Stats(profile)
+            ranking = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+            summary['top'] = [
+                {
+                    'function': f"{os.path.basename(filename)}:{line}:{function}",
+                    'calls': calls,
+                    'tottime_ms': round(tottime * 1000, 3),
+                    'cumtime_ms': round(cumtime * 1000, 3)
+                }
+                for (filename, line, function), (_, calls, tottime, cumtime, _) in ranking[:active['top']]
+            ]
+            writer = stats.dump_stats
+        
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            writer(str(path))
+            summary['file'] = str(path)
+        except OSError as e:
+            summary['error'] = f"écriture impossible: {e}"
+        
+        return summary
+
+def diff_config(old, new, prefix=''):
+    """Chemins pointés des valeurs modifiées, ex: ['storage.file_mapping.511']"""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return [] if old == new else [prefix]
+    
+    changes = []
+    for key in sorted(set(old) | set(new), key=str):
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if key not in old or key not in new:
+            changes.append(path)
+        elif old[key] != new[key]:
+            changes.extend(diff_config(old[key], new[key], path))
+    return changes
+
+def config_changed(changes, *sections):
+    """Vrai si une modification touche l'une des sections (préfixes pointés)"""
+    return any(
+        change == section or change.startswith(section + '.')
+        for change in changes for section in sections
+    )
+
+class ConfigWatcher:
+    """Surveillance de fichiers de configuration par signature stat()
+    
+    Un appel à os.stat par fichier toutes les `interval` secondes: la date
+    de modification, la taille et l'inode couvrent aussi les remplacements
+    atomiques (écriture dans un fichier temporaire puis rename).
+    """
+    
+    def __init__(self, paths, interval=5.0):
+        self.paths = [Path(path) for path in paths]
+        self.interval = interval
+        self.last_check = time.monotonic()
+        self.signatures = {path: self._signature(path) for path in self.paths}
+    
+    def _signature(self, path):
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def changed(self):
+        """Fichiers modifiés depuis le dernier appel (vide hors échéance)"""
+        now = time.monotonic()
+        if now - self.last_check < self.interval:
+            return []
+        self.last_check = now
+        
+        changed = []
+        for path in self.paths:
+            signature = self._signature(path)
+            if signature != self.signatures[path]:
+                self.signatures[path] = signature
+                if signature is not None:
+                    changed.append(path)
+        return changed
+
+def process_age():
+    """Secondes écoulées depuis le lancement du processus (Linux, précision
+    d'un tick d'horloge noyau); None si /proc n'est pas disponible"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Champ 22 (starttime); le nom du processus peut contenir des espaces
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StartupProfile:
+    """Jalons du démarrage d'un collecteur
+    
+    Chaque phase est mesurée depuis le jalon précédent; l'origine est le
+    lancement du processus, de sorte que la phase 'imports' couvre
+    l'interpréteur et tous les imports de module.
+    """
+    
+    LABELS = {
+        'imports': 'imports',
+        'config': 'config',
+        'connect': 'connexion',
+        'initialize': 'initialize',
+        'first_cycle': 'premier cycle'
+    }
+    
+    def __init__(self):
+        now = time.monotonic()
+        age = process_age()
+        if age is not None:
+            self.origin = now - age
+            self.origin_source = 'process'
+        else:
+            self.origin = MODULE_LOADED
+            self.origin_source = 'module'
+        self.marks = [('imports', now)]
+    
+    def mark(self, phase):
+        self.marks.append((phase, time.monotonic()))
+    
+    @property
+    def complete(self):
+        return self.marks[-1][0] == 'first_cycle'
+    
+    def report(self):
+        phases = {}
+        previous = self.origin
+        for phase, at in self.marks:
+            phases[phase] = round((at - previous) * 1000, 1)
+            previous = at
+        return {
+            'origin': self.origin_source,
+            'phases_ms': phases,
+            'total_ms': round((previous - self.origin) * 1000, 1)
+        }
+    
+    def summary(self):
+        report = self.report()
+        phases = ', '.join(
+            f"{self.LABELS.get(phase, phase)} {duration:.0f}ms"
+            for phase, duration in report['phases_ms'].items()
+        )
+        origin = 'processus' if report['origin'] == 'process' else 'module collector_base'
+        return f"{phases} (total {report['total_ms']:.0f}ms depuis le lancement du {origin})"
+
+# Écart minimal entre horloges murale et monotone considéré comme un saut
+# de l'heure (un slew adjtimex ne dépasse pas 0,5 ms par seconde)
+CLOCK_STEP_THRESHOLD = 1.0
+
+class CollectorClock:
+    """Horloges d'un collecteur: monotone pour planifier, murale pour horodater
+    
+    Intervalles, délais et durées se mesurent avec monotonic(), insensible
+    aux changements d'heure; wall() ne sert qu'aux horodatages publiés.
+    check_step() compare l'avance des deux horloges depuis l'appel précédent:
+    un écart au-delà du seuil est un saut de l'heure système (timesync, RTC),
+    signalé aux observateurs avec sa valeur en secondes.
+    """
+    
+    monotonic = staticmethod(time.monotonic)
+    wall = staticmethod(time.time)
+    
+    def __init__(self, step_threshold=CLOCK_STEP_THRESHOLD):
+        self.step_threshold = step_threshold
+        self.listeners = []
+        self.steps = 0
+        self.last_step = None
+        self._reference = (time.monotonic(), time.time())
+    
+    def elapsed(self, since):
+        """Secondes écoulées depuis un instant monotone"""
+        return time.monotonic() - since
+    
+    def add_listener(self, callback):
+        """callback(step) appelé à chaque saut détecté"""
+        self.listeners.append(callback)
+    
+    def check_step(self):
+        """Détecte un saut de l'heure depuis le dernier appel; retourne sa
+        valeur (positive: avance) ou None"""
+        monotonic, wall = time.monotonic(), time.time()
+        previous_monotonic, previous_wall = self._reference
+        self._reference = (monotonic, wall)
+        
+        step = (wall - previous_wall) - (monotonic - previous_monotonic)
+        if abs(step) < self.step_threshold:
+            return None
+        
+        self.steps += 1
+        self.last_step = step
+        for callback in self.listeners:
+            try:
+                callback(step)
+            except Exception as e:
+                logging.error(f"Erreur d'un observateur de saut d'horloge: {e}")
+        return step
+
+class PeriodicJob:
+    """Tâche d'un PeriodicScheduler et ses compteurs"""
+    
+    __slots__ = ('name', 'interval', 'callback', 'next_due', 'runs', 'missed',
+                 'errors', 'max_lateness', 'last_duration')
+    
+    def __init__(self, name, interval, callback, next_due):
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.next_due = next_due
+        self.runs = 0
+        self.missed = 0
+        self.errors = 0
+        self.max_lateness = 0.0
+        self.last_duration = 0.0
+
+class PeriodicScheduler:
+    """Tâches périodiques à cadence fixe sur l'horloge monotone
+    
+    Les échéances d'une tâche sont origine + k × intervalle: une exécution
+    en retard ne décale pas les suivantes. Les échéances dépassées de plus
+    d'un intervalle (boucle bloquée, tâche trop longue) ne sont pas
+    rattrapées en rafale mais comptées comme manquées.
+    """
+    
+    def __init__(self, clock=None):
+        self.clock = clock or CollectorClock()
+        self.jobs = {}
+    
+    def add_job(self, name, interval, callback, delay=0.0):
+        """Ajoute une tâche; première exécution après `delay` secondes"""
+        if interval <= 0:
+            raise ValueError(f"Intervalle invalide pour {name}: {interval}")
+        self.jobs[name] = PeriodicJob(name, interval, callback, self.clock.monotonic() + delay)
+    
+    def set_interval(self, name, interval):
+        """Change la cadence d'une tâche à partir de sa prochaine échéance"""
+        if interval <= 0:
+            raise ValueError(f"Intervalle invalide pour {name}: {interval}")
+        self.jobs[name].interval = interval
+    
+    def run_soon(self, name):
+        """Avance la prochaine exécution d'une tâche à maintenant"""
+        job = self.jobs[name]
+        job.next_due = min(job.next_due, self.clock.monotonic())
+    
+    def run_pending(self):
+        """Exécute les tâches échues (ordre des échéances); retourne leur nombre"""
+        now = self.clock.monotonic()
+        due = sorted(
+            (job for job in self.jobs.values() if now >= job.next_due),
+            key=lambda job: job.next_due
+        )
+        
+        for job in due:
+            lateness = now - job.next_due
+            missed = int(lateness // job.interval)
+            job.missed += missed
+            job.next_due += (missed + 1) * job.interval
+            job.max_lateness = max(job.max_lateness, lateness - missed * job.interval)
+            
+            start = time.perf_counter()
+            try:
+                job.callback()
+            except Exception as e:
+                job.errors += 1
+                logging.error(f"Erreur de la tâche périodique {job.name}: {e}")
+            job.last_duration = time.perf_counter() - start
+            job.runs += 1
+        
+        return len(due)
+    
+    def time_until_next(self):
+        """Secondes avant la prochaine échéance (0 si une tâche est due)"""
+        if not self.jobs:
+            return INFINITY
+        next_due = min(job.next_due for job in self.jobs.values())
+        return max(0.0, next_due - self.clock.monotonic())
+    
+    def get_stats(self):
+        return {
+            name: {
+                'interval': job.interval,
+                'runs': job.runs,
+                'missed': job.missed,
+                'errors': job.errors,
+                'max_lateness_ms': round(job.max_lateness * 1000, 1),
+                'last_duration_ms': round(job.last_duration * 1000, 2)
+            }
+            for name, job in self.jobs.items()
+        }
+
 class BaseCollector(ABC):
     """Classe de base pour tous les collecteurs de widgets"""
     
     def __init__(self, config_file, logger_name):
         """Initialise le collecteur avec gestion de retry MQTT"""
+        self.startup = StartupProfile()
         self.logger = logging.getLogger(logger_name)
         
         # UTILISER UNIQUEMENT les chemins locaux
@@ -49,35 +1282,175 @@ class BaseCollector(ABC):
                 config_file = self.local_config_dir / f"{widget_name}_widget.json"
         
         self.config_file = Path(config_file)
-        self.logger.info(f"Utilisation du fichier de config: {self.config_file}")
+        self.logger.debug(f"Utilisation du fichier de config: {self.config_file}")
         
         self.config = self.load_config(self.config_file)
         self.mqtt_client = None
-        self.connected = False
+        
+        # Événement de connexion (remplace l'attente active sur self.connected)
+        self.connected_event = threading.Event()
+        self.connection_state = 'disconnected'
         
         # Configuration MQTT
         self.mqtt_config = self.config['mqtt']['broker']
         
-        # Configuration retry MQTT uniquement
+        # Configuration retry MQTT: backoff exponentiel avec jitter
         self.retry_enabled = os.environ.get('MQTT_RETRY_ENABLED', 'true').lower() == 'true'
-        self.retry_delay = int(os.environ.get('MQTT_RETRY_DELAY', '10'))
+        self.retry_delay = float(os.environ.get('MQTT_RETRY_DELAY', '10'))  # délai de base
+        self.retry_max_delay = float(os.environ.get('MQTT_RETRY_MAX_DELAY', '120'))
         self.max_retries = int(os.environ.get('MQTT_MAX_RETRIES', '0'))  # 0 = infini
+        self.initial_connect_timeout = float(os.environ.get('MQTT_INITIAL_CONNECT_TIMEOUT', '10'))
         
-        # Compteur de tentatives
+        # Compteur de tentatives consécutives (remis à zéro à la connexion)
         self.connection_attempts = 0
         self.last_connection_attempt = 0
+        self.reconnect_delay = None
+        
+        # Horloges: monotone pour tous les intervalles, murale pour les horodatages
+        clock_config = self.config.get('clock', {})
+        self.clock = CollectorClock(clock_config.get('step_threshold', CLOCK_STEP_THRESHOLD))
+        self.clock.add_listener(self.on_clock_step)
+        self.started = self.clock.monotonic()
         
-        # Statistiques
+        # Statistiques (start_time: horodatage affiché, décalé avec l'heure)
         self.stats = {
             'messages_sent': 0,
             'errors': 0,
-            'start_time': time.time(),
-            'connection_failures': 0
+            'start_time': self.clock.wall(),
+            'connection_failures': 0,
+            'queued': 0,
+            'clock_steps': 0
         }
         
+        # Sérialisation des publications et horodatage partagé par tick
+        self.serializer = self._create_serializer()
+        self._tick_thread = None
+        self._tick_timestamp = None
+        self._tick_millis = None
+        
+        # État de la boucle de collecte (coupure en cours, compteur de statistiques)
+        self._outage_start = None
+        self._stats_counter = 0
+        
+        # Métriques binaires compactes (optionnel)
+        self.compact_metrics = self._create_compact_metrics()
+        
+        # Auto-instrumentation (topic maxlink/collectors/<id>/health)
+        health_config = self.config.get('health', {})
+        self.health = (
+            CollectorHealth(health_config.get('sample_rate', DEFAULT_HEALTH_SAMPLE_RATE))
+            if health_config.get('enabled', True) else None
+        )
+        self.health_interval = health_config.get('interval', DEFAULT_HEALTH_INTERVAL)
+        self.health_topic = health_config.get('topic', f"maxlink/collectors/{self.config['widget']['id']}/health")
+        self.health_textfile = health_config.get('prometheus_textfile')
+        self.last_health_publish = time.monotonic()
+        # Tick courant échantillonné (un seul attribut testé sur le chemin chaud)
+        self.health_sampling = False
+        self.ack_callback = False
+        
+        # Profilage à la demande (commande MQTT)
+        profiler_config = self.config.get('profiler', {})
+        widget_id = self.config['widget']['id']
+        self.profiler = CollectorProfiler(widget_id, profiler_config) if profiler_config.get('enabled', True) else None
+        self.profiler_topic = profiler_config.get('topic', f"maxlink/collectors/{widget_id}/profile")
+        
+        # Rechargement à chaud du JSON du widget (sans redémarrage systemd)
+        reload_config = self.config.get('hot_reload', {})
+        self.config_watcher = None
+        if reload_config.get('enabled', True):
+            self.config_watcher = ConfigWatcher([self.config_file], reload_config.get('interval', 5))
+        
+        # File disque des publications pendant les coupures du broker
+        self.outbox = self._create_outbox()
+        self.outbox_tokens = 0.0
+        self.last_outbox_drain = self.clock.monotonic()
+        self.last_outbox_enforce = 0
+        
         self.logger.info(f"Collecteur initialisé - Version {self.config['widget']['version']}")
-        self.logger.info(f"Chemins locaux - Widgets: {self.local_widgets_dir}, Config: {self.local_config_dir}")
-        self.logger.info(f"Retry MQTT: {self.retry_enabled}, Delay: {self.retry_delay}s, Max: {self.max_retries}")
+        self.logger.debug(f"Chemins locaux - Widgets: {self.local_widgets_dir}, Config: {self.local_config_dir}")
+        self.logger.debug(f"Retry MQTT: {self.retry_enabled}, Delay: {self.retry_delay}-{self.retry_max_delay}s, Max: {self.max_retries}")
+        self.startup.mark('config')
+    
+    def validate_config(self, config):
+        """Vérifie une configuration rechargée; lève ValueError si invalide
+        
+        Les sous-classes complètent la validation (super() d'abord) en
+        construisant les objets dérivés de leur configuration.
+        """
+        if not isinstance(config, dict):
+            raise ValueError("la configuration doit être un objet JSON")
+        for section in ('widget', 'mqtt'):
+            if not isinstance(config.get(section), dict):
+                raise ValueError(f"section '{section}' manquante")
+        if config['widget'].get('id') != self.config['widget']['id']:
+            raise ValueError("l'identifiant du widget ne peut pas changer")
+        if not isinstance(config['mqtt'].get('broker'), dict):
+            raise ValueError("section 'mqtt.broker' manquante")
+    
+    def apply_config(self, config, changes):
+        """Applique les modifications propres au widget (self.config est encore l'ancienne)
+        
+        Retourne la liste des changements qui exigent un redémarrage.
+        """
+        return []
+    
+    def check_config_reload(self):
+        """Recharge la configuration si le fichier a changé"""
+        if self.config_watcher is None or not self.config_watcher.changed():
+            return False
+        
+        try:
+            with open(self.config_file, 'r') as f:
+                config = json.load(f)
+            self.validate_config(config)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Configuration rechargée invalide, conservation de l'actuelle: {e}")
+            return False
+        
+        changes = diff_config(self.config, config)
+        if not changes:
+            return False
+        
+        restart_required = [change for change in changes if config_changed([change], 'mqtt.broker', 'outbox')]
+        
+        # Paramètres de la base appliqués directement
+        health_config = config.get('health', {})
+        if self.health is not None and config_changed(changes, 'health'):
+            self.health_interval = health_config.get('interval', DEFAULT_HEALTH_INTERVAL)
+            self.health_topic = health_config.get('topic', self.health_topic)
+            self.health_textfile = health_config.get('prometheus_textfile')
+            self.health.sample_rate = health_config.get('sample_rate', self.health.sample_rate)
+        if config_changed(changes, 'hot_reload.interval'):
+            self.config_watcher.interval = config['hot_reload']['interval']
+        
+        try:
+            restart_required += self.apply_config(config, changes)
+        except Exception as e:
+            self.logger.error(f"Erreur application de la configuration: {e}")
+            return False
+        
+        self.config = config
+        self.logger.info(f"Configuration rechargée: {', '.join(changes)}")
+        if restart_required:
+            self.logger.warning(f"Redémarrage nécessaire pour: {', '.join(sorted(set(restart_required)))}")
+        return True
+    
+    def update_subscriptions(self, old_topics, new_topics, qos=0):
+        """Ajuste les abonnements sur la session en cours, sans reconnexion"""
+        removed = [topic for topic in old_topics if topic not in new_topics]
+        added = [topic for topic in new_topics if topic not in old_topics]
+        
+        if self.connected:
+            if removed:
+                self.mqtt_client.unsubscribe(removed)
+            for topic in added:
+                self.mqtt_client.subscribe(topic, qos)
+        
+        for topic in removed:
+            self.logger.info(f"Désabonné du topic: {topic}")
+        for topic in added:
+            self.logger.info(f"Abonné au topic: {topic}")
     
     def load_config(self, config_file):
         """Charge la configuration depuis le fichier JSON"""
@@ -94,6 +1467,295 @@ class BaseCollector(ABC):
             self.logger.error(f"Erreur chargement config: {e}")
             sys.exit(1)
     
+    def _create_serializer(self):
+        """Crée le sérialiseur depuis la section 'serialization' de la config"""
+        serialization_config = self.config.get('serialization', {})
+        
+        try:
+            serializer = PayloadSerializer(
+                serialization_config.get('format', 'legacy'),
+                serialization_config.get('backend', 'auto')
+            )
+        except ValueError as e:
+            self.logger.error(f"Configuration de sérialisation invalide: {e}")
+            serializer = PayloadSerializer()
+        
+        self.logger.info(f"Sérialisation: {serializer.format} ({serializer.backend})")
+        return serializer
+    
+    def get_timestamp(self):
+        """Horodatage ISO UTC des publications
+        
+        Calculé une seule fois par tick de la boucle principale; les
+        publications faites depuis d'autres threads restent à l'heure exacte.
+        """
+        if self._tick_thread == threading.get_ident():
+            if self._tick_timestamp is None:
+                self._tick_timestamp = datetime.utcnow().isoformat() + "Z"
+            return self._tick_timestamp
+        return datetime.utcnow().isoformat() + "Z"
+    
+    def get_timestamp_ms(self):
+        """Horodatage epoch en millisecondes (mis en cache par tick comme get_timestamp)"""
+        if self._tick_thread == threading.get_ident():
+            if self._tick_millis is None:
+                self._tick_millis = int(time.time() * 1000)
+            return self._tick_millis
+        return int(time.time() * 1000)
+    
+    def _create_compact_metrics(self):
+        """Crée l'encodeur binaire depuis la section 'compact_metrics' de la config"""
+        compact_config = self.config.get('compact_metrics', {})
+        if not compact_config.get('enabled', False):
+            return None
+        
+        compact_config.setdefault('meta_topic', f"rpi/widget/{self.config['widget']['id']}/meta")
+        try:
+            encoder = CompactMetricEncoder(compact_config)
+        except ValueError as e:
+            self.logger.error(f"Métriques compactes désactivées: {e}")
+            return None
+        
+        self.logger.info(f"Métriques compactes: mode {encoder.mode}, métadonnées sur {encoder.meta_topic}")
+        return encoder
+    
+    def _publish_compact_metric(self, topic, value, unit):
+        """Publie la version binaire d'une métrique (temps réel, pas de file disque)"""
+        payload = self.compact_metrics.encode(self.get_timestamp_ms(), value, topic, unit)
+        
+        if not self.connected:
+            return False
+        
+        result = self._publish_tracked(self.compact_metrics.binary_topic(topic), payload)
+        if result.rc == 0:
+            self.stats['messages_sent'] += 1
+            return True
+        
+        self.stats['errors'] += 1
+        return False
+    
+    def publish_compact_metadata(self):
+        """Publie les métadonnées retenues si les unités ont changé"""
+        if not self.compact_metrics or not self.compact_metrics.metadata_dirty or not self.connected:
+            return
+        
+        try:
+            payload = self.serializer.data(self.get_timestamp(), self.compact_metrics.metadata())
+            result = self.mqtt_client.publish(self.compact_metrics.meta_topic, payload, qos=1, retain=True)
+            if result.rc == 0:
+                self.compact_metrics.metadata_dirty = False
+        except Exception as e:
+            self.logger.error(f"Erreur publication métadonnées: {e}")
+    
+    def timed(self, job):
+        """Mesure la durée d'une étape de collecte (histogramme par job)
+        
+        Exemple: with self.timed('cpu'): self.collect_cpu_metrics()
+        """
+        if not self.health_sampling:
+            return NULL_CONTEXT
+        return self.health.job_timer(job)
+    
+    def _publish_tracked(self, topic, payload, qos=1, retain=False):
+        """Publie en mesurant (ticks échantillonnés) la latence d'acquittement du broker"""
+        if not self.health_sampling or qos == 0:
+            return self.mqtt_client.publish(topic, payload, qos=qos, retain=retain)
+        
+        sent_at = time.perf_counter()
+        result = self.mqtt_client.publish(topic, payload, qos=qos, retain=retain)
+        if result.rc == 0:
+            self.health.publish_sent(result.mid, sent_at)
+        return result
+    
+    def on_publish(self, client, userdata, mid):
+        """Callback d'acquittement (thread réseau paho, installé par begin_health_tick)"""
+        self.health.publish_acked(mid)
+    
+    def begin_health_tick(self):
+        """Tirage d'échantillonnage du tick; retourne True si le tick est mesuré
+        
+        on_publish n'est installé que pendant les ticks échantillonnés et tant
+        que des acquittements sont attendus: sur les autres ticks, paho
+        n'exécute aucun code Python par acquittement reçu.
+        """
+        sampled = self.health_sampling = self.health.begin_tick()
+        if sampled:
+            if not self.ack_callback and self.mqtt_client is not None:
+                self.mqtt_client.on_publish = self.on_publish
+                self.ack_callback = True
+        elif self.ack_callback and not self.health.awaiting_acks():
+            self.mqtt_client.on_publish = None
+            self.ack_callback = False
+        return sampled
+    
+    def get_queue_depths(self):
+        """Profondeur des files: outbox disque et file sortante paho"""
+        # _out_messages: file interne paho 1.x (messages non acquittés)
+        outgoing = getattr(self.mqtt_client, '_out_messages', None) if self.mqtt_client else None
+        return {
+            'outbox_bytes': self.outbox.pending_bytes if self.outbox else 0,
+            'mqtt_outgoing': len(outgoing) if outgoing is not None else 0
+        }
+    
+    def publish_health(self, force=False):
+        """Publie le rapport de santé toutes les health_interval secondes"""
+        if self.health is None:
+            return
+        
+        now = time.monotonic()
+        if not force and now - self.last_health_publish < self.health_interval:
+            return
+        self.last_health_publish = now
+        
+        start = time.perf_counter()
+        try:
+            report = self.health.snapshot(self.get_queue_depths())
+            report['collector'] = self.config['widget']['id']
+            report['state'] = self.connection_state
+            report['uptime_seconds'] = int(self.clock.elapsed(self.started))
+            report['startup'] = self.startup.report()
+            report['loop']['interval_seconds'] = self.get_update_interval()
+            # Rythme des rapports: le panneau d'administration en déduit le silence toléré
+            report['health_interval_seconds'] = self.health_interval
+            report['messages'] = {
+                'sent': self.stats['messages_sent'],
+                'errors': self.stats['errors'],
+                'queued': self.stats['queued']
+            }
+            report['clock_steps'] = self.stats['clock_steps']
+            
+            if self.connected:
+                self._publish_tracked(self.health_topic, self.serializer.data(self.get_timestamp(), report), qos=0)
+            
+            if self.health_textfile:
+                # Écriture atomique: node_exporter ne doit jamais lire un fichier partiel
+                textfile = Path(self.health_textfile)
+                tmp_path = textfile.with_name(textfile.name + '.tmp')
+                tmp_path.write_text(self.health.prometheus_text(report['collector'], report))
+                os.replace(tmp_path, textfile)
+            
+            # Budget de 1% du CPU: réduire l'échantillonnage plutôt que dépasser
+            overhead = report['instrumentation']['overhead_percent']
+            if overhead > 1.0 and self.health.sample_rate > 0.001:
+                self.health.sample_rate = max(0.001, self.health.sample_rate / 2)
+                self.logger.warning(
+                    f"Coût de l'instrumentation {overhead:.2f}% du CPU - "
+                    f"échantillonnage réduit à {self.health.sample_rate:.3f}"
+                )
+                
+        except Exception as e:
+            self.logger.error(f"Erreur publication santé: {e}")
+        finally:
+            self.health.overhead_seconds += time.perf_counter() - start
+    
+    def on_profiler_command(self, client, userdata, msg):
+        """Commande de profilage: {"command": "start", "mode": "sample", "duration": 30}"""
+        try:
+            command = json.loads(msg.payload.decode())
+            accepted, message = self.profiler.request(command)
+        except (ValueError, AttributeError) as e:
+            accepted, message = False, f"commande illisible: {e}"
+        
+        self.logger.info(f"Profilage: {message}")
+        self.publish_data(self.profiler_topic + '/result', {
+            'status': 'accepted' if accepted else 'rejected',
+            'message': message
+        })
+    
+    def _check_profiler(self):
+        """Démarre ou clôture un profilage; publie le résumé final"""
+        summary = self.profiler.on_tick()
+        if summary is None:
+            return
+        
+        self.logger.info(f"Profilage terminé ({summary['mode']}, {summary['duration_seconds']}s): {summary['file']}")
+        for entry in summary['top'][:5]:
+            self.logger.info(f"  {entry}")
+        self.publish_data(self.profiler_topic + '/result', summary)
+    
+    def _create_outbox(self):
+        """Crée la file hors connexion depuis la section 'outbox' de la config"""
+        outbox_config = self.config.get('outbox', {})
+        self.outbox_drain_rate = outbox_config.get('drain_rate', 20)
+        
+        if not outbox_config.get('enabled', True):
+            return None
+        
+        widget_id = self.config['widget']['id']
+        outbox_dir = outbox_config.get('path', f"/var/lib/maxlink/outbox/{widget_id}")
+        
+        try:
+            outbox = DiskOutbox(
+                outbox_dir,
+                outbox_config.get('classes'),
+                outbox_config.get('segment_bytes', 256 * 1024)
+            )
+            if outbox.pending_bytes > 0:
+                self.logger.info(f"File hors connexion à vider: {outbox.pending_bytes} octets")
+            return outbox
+        except Exception as e:
+            self.logger.error(f"File hors connexion désactivée ({outbox_dir}): {e}")
+            return None
+    
+    def _queue_publication(self, topic_class, topic, payload):
+        """Met une publication en file disque en attendant le broker"""
+        if not self.outbox:
+            return False
+        
+        try:
+            if self.outbox.put(topic_class, topic, payload):
+                self.stats['queued'] += 1
+                return True
+        except OSError as e:
+            self.logger.error(f"Erreur écriture file hors connexion: {e}")
+        return False
+    
+    def _publish_outbox_record(self, record):
+        """Republie un enregistrement de la file (payload et horodatage d'origine)"""
+        if not self.connected:
+            return False
+        
+        try:
+            result = self.mqtt_client.publish(record['t'], record['p'], qos=record.get('q', 1))
+        except Exception:
+            return False
+        
+        if result.rc == 0:
+            self.stats['messages_sent'] += 1
+            return True
+        return False
+    
+    def drain_outbox(self):
+        """Vide la file hors connexion avec limitation de débit (seau à jetons)"""
+        if not self.outbox:
+            return 0
+        
+        current_time = self.clock.monotonic()
+        
+        # Purge périodique des segments trop anciens, même hors connexion
+        if current_time - self.last_outbox_enforce >= 60:
+            self.outbox.enforce_limits()
+            self.last_outbox_enforce = current_time
+        
+        elapsed = max(0.0, current_time - self.last_outbox_drain)
+        self.last_outbox_drain = current_time
+        self.outbox_tokens = min(
+            float(self.outbox_drain_rate),
+            self.outbox_tokens + elapsed * self.outbox_drain_rate
+        )
+        
+        budget = int(self.outbox_tokens)
+        if not self.connected or budget <= 0 or self.outbox.pending_bytes <= 0:
+            return 0
+        
+        published = self.outbox.drain(self._publish_outbox_record, budget)
+        self.outbox_tokens -= published
+        
+        if published and self.outbox.pending_bytes <= 0:
+            self.logger.info("File hors connexion entièrement vidée")
+        
+        return published
+    
     def get_widget_file(self, filename):
         """Retourne le chemin d'un fichier du widget - CHEMINS LOCAUX UNIQUEMENT"""
         widget_name = self.config['widget']['id']
@@ -105,115 +1767,166 @@ class BaseCollector(ABC):
         
         raise FileNotFoundError(f"Fichier {filename} non trouvé dans {self.local_widgets_dir / widget_name}")
     
-    def connect_mqtt(self):
-        """Connexion au broker MQTT avec retry robuste"""
-        while True:
-            try:
-                self.connection_attempts += 1
-                self.last_connection_attempt = time.time()
-                
-                # Vérifier si on a atteint la limite de tentatives
-                if self.max_retries > 0 and self.connection_attempts > self.max_retries:
-                    self.logger.error(f"Limite de tentatives atteinte ({self.max_retries})")
-                    return False
-                
-                self.logger.info(f"Tentative de connexion MQTT #{self.connection_attempts} à {self.mqtt_config['host']}:{self.mqtt_config['port']}")
-                
-                # Créer le client MQTT
-                self.mqtt_client = mqtt.Client()
-                
-                # Callbacks
-                self.mqtt_client.on_connect = self.on_connect
-                self.mqtt_client.on_disconnect = self.on_disconnect
-                
-                # Authentification
-                self.mqtt_client.username_pw_set(
-                    self.mqtt_config['username'],
-                    self.mqtt_config['password']
-                )
-                
-                # Options de reconnexion automatique
-                self.mqtt_client.reconnect_delay_set(min_delay=1, max_delay=120)
-                
-                # Connexion
-                self.mqtt_client.connect(
-                    self.mqtt_config['host'], 
-                    self.mqtt_config['port'], 
-                    60
-                )
-                
-                # Démarrer la boucle
-                self.mqtt_client.loop_start()
-                
-                # Attendre la connexion
-                timeout = 30
-                while not self.connected and timeout > 0:
-                    time.sleep(0.5)
-                    timeout -= 0.5
-                
-                if self.connected:
-                    self.logger.info("Connexion MQTT établie avec succès")
-                    self.stats['connection_failures'] = 0
-                    return True
-                else:
-                    raise Exception("Timeout de connexion")
-                
-            except Exception as e:
-                self.stats['connection_failures'] += 1
-                self.logger.error(f"Erreur connexion MQTT: {e}")
-                
-                if self.mqtt_client:
-                    try:
-                        self.mqtt_client.loop_stop()
-                        self.mqtt_client.disconnect()
-                    except:
-                        pass
-                
-                if not self.retry_enabled:
-                    return False
-                
-                # Attendre avant de réessayer
-                self.logger.info(f"Nouvelle tentative dans {self.retry_delay} secondes...")
-                time.sleep(self.retry_delay)
+    @property
+    def connected(self):
+        """État de connexion MQTT (adossé à connected_event)"""
+        return self.connected_event.is_set()
+    
+    @connected.setter
+    def connected(self, value):
+        if value:
+            self.connected_event.set()
+        else:
+            self.connected_event.clear()
+    
+    def wait_connected(self, timeout=None):
+        """Attend la connexion MQTT sans attente active"""
+        return self.connected_event.wait(timeout)
+    
+    def _set_connection_state(self, state):
+        if state != self.connection_state:
+            self.logger.debug(f"État MQTT: {self.connection_state} → {state}")
+            self.connection_state = state
+    
+    def _create_mqtt_client(self):
+        """Crée l'unique client MQTT du collecteur (réutilisé à chaque reconnexion)"""
+        client = mqtt.Client()
+        
+        client.on_connect = self.on_connect
+        client.on_disconnect = self.on_disconnect
+        client.on_connect_fail = self.on_connect_fail
+        
+        client.username_pw_set(
+            self.mqtt_config['username'],
+            self.mqtt_config['password']
+        )
+        
+        # Premier essai immédiat; les suivants sont planifiés par _schedule_reconnect
+        client.reconnect_delay_set(min_delay=self.retry_delay, max_delay=self.retry_delay)
+        return client
+    
+    def get_reconnect_delay(self):
+        """Backoff exponentiel plafonné avec jitter (50-100% du délai)
+        
+        Le jitter désynchronise les widgets après un redémarrage du broker.
+        """
+        exponent = min(max(self.connection_attempts - 1, 0), 16)
+        delay = min(self.retry_max_delay, self.retry_delay * (2 ** exponent))
+        import random
+        return random.uniform(delay / 2, delay)
+    
+    def _schedule_reconnect(self):
+        """Planifie la prochaine tentative dans la boucle réseau paho"""
+        self.connection_attempts += 1
+        self.last_connection_attempt = self.clock.monotonic()
+        self.stats['connection_failures'] += 1
+        
+        if not self.retry_enabled or (self.max_retries > 0 and self.connection_attempts >= self.max_retries):
+            self.logger.error(f"Abandon de la connexion MQTT après {self.connection_attempts} tentative(s)")
+            self._set_connection_state('failed')
+            # disconnect() termine la boucle réseau paho
+            self.mqtt_client.disconnect()
+            return
+        
+        delay = self.get_reconnect_delay()
+        self.reconnect_delay = delay
+        # Consommé par paho avant la prochaine tentative (une seule boucle de reconnexion)
+        self.mqtt_client.reconnect_delay_set(min_delay=delay, max_delay=delay)
+        self._set_connection_state('backoff')
+        self.logger.info(f"Nouvelle tentative MQTT #{self.connection_attempts + 1} dans {delay:.1f}s")
+    
+    def connect_mqtt(self, timeout=None):
+        """Démarre la connexion MQTT non bloquante
+        
+        Le client est créé une seule fois; la boucle réseau paho se charge des
+        tentatives selon le backoff de _schedule_reconnect. Avec timeout,
+        attend la connexion et retourne son état.
+        """
+        if self.mqtt_client is None:
+            self.logger.info(f"Connexion MQTT à {self.mqtt_config['host']}:{self.mqtt_config['port']}")
+            self.mqtt_client = self._create_mqtt_client()
+            self.mqtt_client.connect_async(
+                self.mqtt_config['host'],
+                self.mqtt_config['port'],
+                60
+            )
+            self._set_connection_state('connecting')
+            self.mqtt_client.loop_start()
+        
+        if timeout is not None:
+            return self.wait_connected(timeout)
+        return True
     
     def on_connect(self, client, userdata, flags, rc):
         """Callback de connexion"""
         if rc == 0:
             self.logger.info("Connecté au broker MQTT")
+            self.connection_attempts = 0
+            self._set_connection_state('connected')
             self.connected = True
-            self.on_mqtt_connected()
+            
+            # Métadonnées retenues republiées à chaque connexion
+            if self.compact_metrics:
+                self.compact_metrics.metadata_dirty = True
+            
+            # Callback dédié: prioritaire sur le on_message des sous-classes
+            if self.profiler is not None:
+                client.message_callback_add(self.profiler_topic, self.on_profiler_command)
+                client.subscribe(self.profiler_topic, qos=1)
+            
+            try:
+                self.on_mqtt_connected()
+            except Exception as e:
+                self.logger.error(f"Erreur dans on_mqtt_connected: {e}")
         else:
+            # Refus du broker: paho ferme la connexion puis on_disconnect planifie la suite
             self.logger.error(f"Échec connexion MQTT, code: {rc}")
             self.connected = False
     
+    def on_connect_fail(self, client, userdata):
+        """Callback d'échec de connexion (broker injoignable)"""
+        self.logger.warning("Broker MQTT injoignable")
+        self.connected = False
+        self._schedule_reconnect()
+    
     def on_disconnect(self, client, userdata, rc):
         """Callback de déconnexion"""
-        self.logger.warning(f"Déconnecté du broker MQTT (code: {rc})")
         self.connected = False
+        if self.health is not None:
+            self.health.connection_lost()
         
-        # Le client Paho gère la reconnexion automatiquement si rc != 0
+        if rc == 0:
+            # Déconnexion volontaire (arrêt du collecteur)
+            if self.connection_state != 'failed':
+                self._set_connection_state('disconnected')
+            return
+        
+        self.logger.warning(f"Déconnecté du broker MQTT (code: {rc})")
+        self._schedule_reconnect()
     
     def publish_metric(self, topic, value, unit=None):
-        """Publie une métrique sur MQTT"""
-        if not self.connected:
-            return False
-        
+        """Publie une métrique sur MQTT (mise en file si le broker est absent)"""
         try:
-            payload = {
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                "value": value
-            }
+            # Variante binaire pour les valeurs numériques si activée
+            if self.compact_metrics and type(value) in (int, float):
+                published = self._publish_compact_metric(topic, value, unit)
+                if self.compact_metrics.mode == 'binary':
+                    return published
             
-            if unit:
-                payload["unit"] = unit
+            payload = self.serializer.metric(self.get_timestamp(), value, unit)
+            
+            if not self.connected:
+                self._queue_publication('metrics', topic, payload)
+                return False
             
-            result = self.mqtt_client.publish(topic, json.dumps(payload), qos=1)
+            result = self._publish_tracked(topic, payload)
             
             if result.rc == 0:
                 self.stats['messages_sent'] += 1
                 return True
             else:
                 self.stats['errors'] += 1
+                self._queue_publication('metrics', topic, payload)
                 return False
                 
         except Exception as e:
@@ -222,17 +1935,18 @@ class BaseCollector(ABC):
             return False
     
     def publish_data(self, topic, data):
-        """Publie des données complexes sur MQTT"""
-        if not self.connected:
-            return False
-        
+        """Publie des données complexes sur MQTT (mise en file si le broker est absent)"""
         try:
-            payload = {
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-                **data
-            }
+            payload = self.serializer.data(self.get_timestamp(), data)
+            
+            if not self.connected:
+                self._queue_publication('data', topic, payload)
+                return False
             
-            result = self.mqtt_client.publish(topic, json.dumps(payload), qos=1)
+            result = self._publish_tracked(topic, payload)
+            
+            if result.rc != 0:
+                self._queue_publication('data', topic, payload)
             return result.rc == 0
             
         except Exception as e:
@@ -241,7 +1955,7 @@ class BaseCollector(ABC):
     
     def log_statistics(self):
         """Affiche les statistiques"""
-        runtime = time.time() - self.stats['start_time']
+        runtime = self.clock.elapsed(self.started)
         hours = int(runtime // 3600)
         minutes = int((runtime % 3600) // 60)
         
@@ -251,44 +1965,127 @@ class BaseCollector(ABC):
             f"Erreurs: {self.stats['errors']} | "
             f"Échecs connexion: {self.stats['connection_failures']}"
         )
+        
+        if self.outbox and (self.stats['queued'] or self.outbox.pending_bytes):
+            self.logger.info(
+                f"File hors connexion - Mis en file: {self.stats['queued']} | "
+                f"En attente: {self.outbox.pending_bytes} octets | "
+                f"Segments supprimés: {self.outbox.dropped_segments}"
+            )
+    
+    def begin_tick(self):
+        """Préparation d'un tick: coupure MQTT, profileur et rechargement
+        
+        Retourne False si la reconnexion est abandonnée (arrêt du collecteur).
+        """
+        if self.connection_state == 'failed':
+            self.logger.error("Reconnexion abandonnée, arrêt du collecteur")
+            return False
+        
+        # Coupure MQTT: la boucle réseau se reconnecte selon le backoff,
+        # la collecte continue et les publications passent en file disque
+        if not self.connected:
+            if self._outage_start is None:
+                self._outage_start = self.clock.monotonic()
+                self.logger.warning("Connexion MQTT perdue - publications mises en file jusqu'à la reconnexion")
+        elif self._outage_start is not None:
+            self.logger.info(f"Connexion MQTT rétablie après {self.clock.elapsed(self._outage_start):.0f}s")
+            self._outage_start = None
+        
+        # Saut de l'heure système depuis le tick précédent (synchronisation)
+        self.clock.check_step()
+        
+        # Un horodatage par tick
+        self._tick_thread = threading.get_ident()
+        self._tick_timestamp = None
+        self._tick_millis = None
+        if self.profiler is not None:
+            self._check_profiler()
+        self.check_config_reload()
+        return True
+    
+    def end_tick(self, tick_duration, sampled):
+        """Suite d'un tick: profil de démarrage, santé, file disque, statistiques"""
+        if not self.startup.complete:
+            self.startup.mark('first_cycle')
+            self.logger.info(f"Profil de démarrage: {self.startup.summary()}")
+        
+        if self.health is not None:
+            # Dépassements comptés sur tous les ticks, durée sur l'échantillon
+            if tick_duration > self.get_update_interval():
+                self.health.loop_overruns += 1
+            if sampled:
+                self.health.observe_job('collect', tick_duration)
+        
+        # Rattraper l'historique accumulé pendant la coupure
+        self.drain_outbox()
+        
+        # Rapport d'auto-instrumentation
+        self.publish_health()
+        
+        # Afficher les statistiques toutes les 5 minutes
+        self._stats_counter += 1
+        if self._stats_counter >= 300:  # 5 minutes si sleep de 1s
+            self.log_statistics()
+            self._stats_counter = 0
+    
+    def run_once(self):
+        """Un tick complet de collecte; retourne False pour arrêter la boucle
+        
+        Partagé par run() et par le runtime asyncio (collector_async).
+        """
+        if not self.begin_tick():
+            return False
+        
+        sampled = self.begin_health_tick() if self.health is not None else False
+        tick_start = time.perf_counter()
+        try:
+            self.collect_and_publish()
+            self.publish_compact_metadata()
+        finally:
+            self._tick_thread = None
+        
+        self.end_tick(time.perf_counter() - tick_start, sampled)
+        return True
+    
+    def shutdown(self):
+        """Nettoyage, déconnexion MQTT et statistiques finales"""
+        self.cleanup()
+        
+        if self.mqtt_client:
+            # Sans effet si la boucle réseau n'a pas de thread (runtime asyncio)
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
+        
+        self.log_statistics()
+        self.logger.info("Collecteur arrêté")
     
     def run(self):
         """Boucle principale du collecteur"""
         self.logger.info("Démarrage du collecteur")
-        self.logger.info(f"Répertoire de travail: {os.getcwd()}")
-        self.logger.info(f"Variables d'environnement WIDGET: {os.environ.get('WIDGET_NAME', 'Non défini')}")
+        self.logger.debug(f"Répertoire de travail: {os.getcwd()}")
+        self.logger.debug(f"Variables d'environnement WIDGET: {os.environ.get('WIDGET_NAME', 'Non défini')}")
         
-        # Se connecter au broker MQTT
-        if not self.connect_mqtt():
-            self.logger.error("Impossible de se connecter au broker MQTT après toutes les tentatives")
-            return
+        # Connexion non bloquante: la collecte démarre même si le broker est absent
+        if not self.connect_mqtt(timeout=self.initial_connect_timeout):
+            if self.connection_state == 'failed':
+                self.logger.error("Impossible de se connecter au broker MQTT après toutes les tentatives")
+                self.cleanup()
+                return
+            self.logger.warning("Broker MQTT indisponible - démarrage hors connexion")
+        self.startup.mark('connect')
         
         self.logger.info("Collecteur opérationnel")
         
         # Initialiser les variables spécifiques au widget
         self.initialize()
-        
-        # Compteur pour les statistiques
-        stats_counter = 0
+        self.startup.mark('initialize')
         
         try:
             while True:
                 try:
-                    # Vérifier la connexion MQTT
-                    if not self.connected:
-                        self.logger.warning("Connexion MQTT perdue, tentative de reconnexion...")
-                        if not self.connect_mqtt():
-                            self.logger.error("Reconnexion échouée, arrêt du collecteur")
-                            break
-                    
-                    # Collecter et publier les données
-                    self.collect_and_publish()
-                    
-                    # Afficher les statistiques toutes les 5 minutes
-                    stats_counter += 1
-                    if stats_counter >= 300:  # 5 minutes si sleep de 1s
-                        self.log_statistics()
-                        stats_counter = 0
+                    if not self.run_once():
+                        break
                     
                     # Pause selon l'intervalle configuré
                     time.sleep(self.get_update_interval())
@@ -303,14 +2100,7 @@ class BaseCollector(ABC):
         except Exception as e:
             self.logger.error(f"Erreur dans la boucle principale: {e}")
         finally:
-            self.cleanup()
-            
-            if self.mqtt_client:
-                self.mqtt_client.loop_stop()
-                self.mqtt_client.disconnect()
-            
-            self.log_statistics()
-            self.logger.info("Collecteur arrêté")
+            self.shutdown()
     
     @abstractmethod
     def on_mqtt_connected(self):
@@ -332,6 +2122,19 @@ class BaseCollector(ABC):
         """Retourne l'intervalle de mise à jour en secondes (à implémenter)"""
         pass
     
+    def on_clock_step(self, step):
+        """Appelé quand l'heure système a sauté de `step` secondes
+        
+        La planification (monotone) n'est pas affectée; les sous-classes qui
+        conservent des heures murales les recalent ici (super() d'abord).
+        """
+        self.stats['clock_steps'] += 1
+        self.stats['start_time'] += step
+        self.logger.warning(f"Saut de l'heure système détecté: {step:+.1f}s (planification inchangée)")
+        # Horodatages des prochaines publications déjà à la nouvelle heure
+        self._tick_timestamp = None
+        self._tick_millis = None
+    
     def cleanup(self):
         """Nettoyage optionnel avant l'arrêt (peut être surchargé)"""
         pass
\ No newline at end of file
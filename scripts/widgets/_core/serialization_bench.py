@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark et contrôle de compatibilité de la sérialisation MaxLink
+Vérifie que le format 'legacy' produit octet pour octet les payloads
+historiques (json.dumps) puis mesure le coût par publication, y compris
+pour les métriques binaires compactes et l'auto-instrumentation (health)
+
+Usage:
+    python3 serialization_bench.py                 # contrôle + mesures
+    python3 serialization_bench.py --check-only    # contrôle seul (code retour 1 si écart)
+
+Code retour 1 si le surcoût de l'auto-instrumentation dépasse --health-budget.
+"""
+
+import sys
+import json
+import logging
+import math
+import time
+import timeit
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from datetime import datetime
+
+from collector_base import BaseCollector, PayloadSerializer, CompactMetricEncoder, fast_json_modules
+
+# Budget de l'auto-instrumentation (% du CPU d'un tick), cf. CollectorHealth
+HEALTH_BUDGET_PERCENT = 1.0
+
+TIMESTAMPS = [
+    "2025-05-27T10:00:00Z",
+    "2025-05-27T10:00:00.123456Z",
+    datetime.utcnow().isoformat() + "Z"
+]
+
+# Valeurs et unités réellement publiées (servermonitoring, wifistats...) + cas limites
+METRIC_CASES = [
+    (42.5, "%"), (0.0, "%"), (-1, "N/A"), (1.5, "GHz"), (600.0, "MHz"),
+    (48.3, "°C"), (86400, "seconds"), (12, None), (3, ""), (True, None),
+    (None, "%"), ("ok", None), ("élevé", "état"), (1e20, None), (-0.0, None),
+    (0.1 + 0.2, "%"), (2 ** 63, None), (float('nan'), None), (float('inf'), "%"),
+    (-float('inf'), "%"), ([1, 2.5, "a"], None), ({"a": 1, "b": [None]}, "u")
+]
+
+DATA_CASES = [
+    {},
+    {"clients": [{"mac": "aa:bb:cc:dd:ee:ff", "ip": "192.168.4.2", "hostname": "esp32-509"}], "count": 1},
+    {"ssid": "MaxLink-NETWORK", "status": "active", "channel": 6, "signal": -42.0},
+    {"machines": {"509": {"window": {"total": 10, "passed": 9, "rate": 90.0}}}, "window_minutes": 60},
+    {"message": "Température élevée \"critique\"\n", "valeurs": [1, 2.5, None, True]},
+    {"timestamp": "remplacé", "value": 1},
+    {1: "clé entière", "2": "clé texte"}
+]
+
+def reference_metric(timestamp, value, unit=None):
+    """Ancienne implémentation de publish_metric (référence)"""
+    payload = {
+        "timestamp": timestamp,
+        "value": value
+    }
+    if unit:
+        payload["unit"] = unit
+    return json.dumps(payload)
+
+def reference_data(timestamp, data):
+    """Ancienne implémentation de publish_data (référence)"""
+    return json.dumps({
+        "timestamp": timestamp,
+        **data
+    })
+
+def _finite(value):
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, (list, tuple)):
+        return all(_finite(item) for item in value)
+    if isinstance(value, dict):
+        return all(_finite(item) for item in value.values())
+    return True
+
+def check_compatibility():
+    """Retourne la liste des écarts (vide si compatible)"""
+    errors = []
+    legacy = PayloadSerializer('legacy')
+    compact_serializers = [PayloadSerializer('compact', backend) for backend in PayloadSerializer.BACKENDS]
+
+    for timestamp in TIMESTAMPS:
+        for value, unit in METRIC_CASES:
+            expected = reference_metric(timestamp, value, unit)
+
+            # Deux passages: gabarit construit puis gabarit en cache
+            for _ in range(2):
+                produced = legacy.metric(timestamp, value, unit)
+                if produced != expected:
+                    errors.append(f"legacy metric {value!r} {unit!r}: {produced!r} != {expected!r}")
+
+            if _finite(value):
+                for serializer in compact_serializers:
+                    produced = serializer.metric(timestamp, value, unit)
+                    if json.loads(produced) != json.loads(expected):
+                        errors.append(f"compact/{serializer.backend} metric {value!r}: {produced!r}")
+
+        for data in DATA_CASES:
+            expected = reference_data(timestamp, data)
+            produced = legacy.data(timestamp, data)
+            if produced != expected:
+                errors.append(f"legacy data {data!r}: {produced!r} != {expected!r}")
+
+            for serializer in compact_serializers:
+                produced = serializer.data(timestamp, data)
+                if json.loads(produced) != json.loads(expected):
+                    errors.append(f"compact/{serializer.backend} data {data!r}: {produced!r}")
+
+    # Aller-retour du format binaire
+    encoder = CompactMetricEncoder({'meta_topic': 'rpi/system/meta'})
+    for value in (42.5, -1, 86400, 0.0):
+        decoded = CompactMetricEncoder.decode(encoder.encode(1748340000123, value, "t", "%"))
+        if decoded['value'] != value or decoded['timestamp_ms'] != 1748340000123:
+            errors.append(f"binary {value!r}: {decoded!r}")
+
+    return errors
+
+def measure(statement, iterations):
+    """Meilleur temps sur 5 séries, en microsecondes par appel"""
+    timer = timeit.Timer(statement)
+    return min(timer.repeat(repeat=5, number=iterations)) / iterations * 1e6
+
+def run_benchmark(iterations):
+    results = {}
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    data = DATA_CASES[3]
+
+    # Coût de l'horodatage par message (ancien) contre une fois par tick
+    results['timestamp'] = measure(lambda: datetime.utcnow().isoformat() + "Z", iterations)
+
+    results['metric/reference'] = measure(lambda: reference_metric(timestamp, 42.5, "%"), iterations)
+    results['data/reference'] = measure(lambda: reference_data(timestamp, data), iterations)
+
+    serializers = [PayloadSerializer('legacy')]
+    serializers += [PayloadSerializer('compact', backend) for backend in PayloadSerializer.BACKENDS]
+
+    for serializer in serializers:
+        # Un sérialiseur absent retombe sur json: une seule mesure par backend réel
+        name = serializer.format if serializer.format == 'legacy' else f"compact/{serializer.backend}"
+        if f'metric/{name}' in results:
+            continue
+        results[f'metric/{name}'] = measure(lambda: serializer.metric(timestamp, 42.5, "%"), iterations)
+        results[f'data/{name}'] = measure(lambda: serializer.data(timestamp, data), iterations)
+
+    return results
+
+# Charge réelle de servermonitoring: (topic, valeur, unité, publications par minute)
+SERVERMONITORING_LOAD = [
+    (f"rpi/system/cpu/core{n}", 12.5, "%", 60) for n in range(1, 5)
+] + [
+    ("rpi/system/frequency/cpu", 1.8, "GHz", 60),
+    ("rpi/system/frequency/gpu", 600.0, "MHz", 60),
+    ("rpi/system/memory/ram", 35.7, "%", 60),
+    ("rpi/system/memory/swap", 0.0, "%", 60),
+    ("rpi/system/uptime", 86400, "seconds", 60),
+    ("rpi/system/temperature/cpu", 52.3, "°C", 12),
+    ("rpi/system/temperature/gpu", 52.3, "°C", 12),
+    ("rpi/system/memory/disk", 25.3, "%", 2),
+    ("rpi/system/memory/usb", 15.2, "%", 2)
+]
+
+def publish_packet_size(topic, payload):
+    """Taille d'un PUBLISH QoS 1: en-tête fixe, longueur, topic, identifiant, payload"""
+    remaining = 2 + len(topic.encode('utf-8')) + 2 + len(payload)
+    length_bytes = 1 if remaining < 128 else 2 if remaining < 16384 else 3
+    return 1 + length_bytes + remaining
+
+def run_compact_comparison(iterations):
+    """Octets et CPU par minute de servermonitoring: JSON historique contre binaire"""
+    legacy = PayloadSerializer('legacy')
+    encoder = CompactMetricEncoder({'meta_topic': 'rpi/system/meta', 'mode': 'binary'})
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    timestamp_ms = int(time.time() * 1000)
+
+    results = {'json': {'payload': 0, 'packet': 0}, 'binary': {'payload': 0, 'packet': 0}}
+    for topic, value, unit, per_minute in SERVERMONITORING_LOAD:
+        payload = legacy.metric(timestamp, value, unit).encode('utf-8')
+        results['json']['payload'] += len(payload) * per_minute
+        results['json']['packet'] += publish_packet_size(topic, payload) * per_minute
+
+        payload = encoder.encode(timestamp_ms, value, topic, unit)
+        results['binary']['payload'] += len(payload) * per_minute
+        results['binary']['packet'] += publish_packet_size(encoder.binary_topic(topic), payload) * per_minute
+
+    # Métadonnées retenues: une publication par connexion
+    metadata = legacy.data(timestamp, encoder.metadata()).encode('utf-8')
+    results['binary']['metadata_once'] = publish_packet_size(encoder.meta_topic, metadata)
+
+    # CPU d'encodage par message (horodatage par message comme avant contre ms du tick)
+    results['json']['cpu_us'] = measure(
+        lambda: legacy.metric(datetime.utcnow().isoformat() + "Z", 12.5, "%").encode('utf-8'), iterations)
+    results['binary']['cpu_us'] = measure(
+        lambda: encoder.encode(timestamp_ms, 12.5, "rpi/system/cpu/core1", "%"), iterations)
+
+    return results
+
+def print_compact_report(results):
+    print("\n=== servermonitoring: JSON contre binaire compact (par minute) ===")
+    for name in ('json', 'binary'):
+        entry = results[name]
+        print(f"  {name:<7} payload {entry['payload']:6d} o | paquets MQTT {entry['packet']:6d} o | "
+              f"encodage {entry['cpu_us']:.2f} µs/msg")
+    saved = 1 - results['binary']['packet'] / results['json']['packet']
+    print(f"  Réduction réseau: {saved * 100:.0f}% (+{results['binary']['metadata_once']} o de métadonnées par connexion)")
+
+class FakePublishResult:
+    rc = 0
+
+    def __init__(self, mid):
+        self.mid = mid
+
+class AckingClient:
+    """Client MQTT factice: acquittements livrés par deliver_acks, après le
+    retour de publish() comme depuis le thread réseau de paho"""
+
+    def __init__(self):
+        self.mid = 0
+        self.on_publish = None
+        self.unacked = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.mid = self.mid % 65535 + 1
+        if qos:
+            self.unacked.append(self.mid)
+        return FakePublishResult(self.mid)
+
+    def deliver_acks(self):
+        on_publish = self.on_publish
+        if on_publish:
+            for mid in self.unacked:
+                on_publish(self, None, mid)
+        self.unacked.clear()
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+class TickCollector(BaseCollector):
+    """Collecteur type servermonitoring: 9 métriques par tick en 4 jobs
+    
+    Les lectures système réelles (psutil) sont faites si psutil est installé;
+    le client MQTT reste factice, ce qui rend le surcoût mesuré pessimiste
+    (le coût de paho n'entre pas dans le dénominateur).
+    """
+
+    def on_mqtt_connected(self):
+        pass
+
+    def initialize(self):
+        pass
+
+    def get_update_interval(self):
+        return 1
+
+    def collect_and_publish(self):
+        with self.timed('cpu'):
+            percents = psutil.cpu_percent(interval=None, percpu=True)[:4] if psutil else [12.5] * 4
+            for n, percent in enumerate(percents, 1):
+                self.publish_metric(f"rpi/system/cpu/core{n}", round(percent, 1), "%")
+        with self.timed('frequency'):
+            frequency = psutil.cpu_freq() if psutil else None
+            self.publish_metric("rpi/system/frequency/cpu", round(frequency.current / 1000, 2) if frequency else 1.8, "GHz")
+            self.publish_metric("rpi/system/frequency/gpu", 600.0, "MHz")
+        with self.timed('memory'):
+            ram = psutil.virtual_memory().percent if psutil else 35.7
+            swap = psutil.swap_memory().percent if psutil else 0.0
+            self.publish_metric("rpi/system/memory/ram", round(ram, 1), "%")
+            self.publish_metric("rpi/system/memory/swap", round(swap, 1), "%")
+        with self.timed('uptime'):
+            with open('/proc/uptime', 'r') as f:
+                uptime = int(float(f.readline().split()[0]))
+            self.publish_metric("rpi/system/uptime", uptime, "seconds")
+
+def run_tick_loop(collector, ticks):
+    """Reproduit le corps de la boucle de BaseCollector.run sans les pauses
+    (collecteur sans instrumentation: CPU d'un tick, dénominateur du surcoût)"""
+    start = time.process_time()
+    for _ in range(ticks):
+        collector.collect_and_publish()
+        collector.mqtt_client.deliver_acks()
+    return time.process_time() - start
+
+def measure_median(statement, iterations, repeat=9):
+    """Médiane de séries répétées, en microsecondes par appel (toujours >= 0)"""
+    timer = timeit.Timer(statement)
+    return statistics.median(timer.repeat(repeat=repeat, number=iterations)) / iterations * 1e6
+
+def measure_health_overhead(ticks, textfile=False):
+    """Surcoût CPU de l'instrumentation rapporté au coût réel d'un tick
+    
+    Chaque appel instrumenté est chronométré directement (médiane de séries
+    répétées) puis pondéré par sa fréquence dans la boucle de production:
+      begin_health_tick          à chaque tick
+      timed() + observe_job      sur les ticks échantillonnés (sample_rate)
+      publish_sent/publish_acked par publication QoS 1 échantillonnée
+      publish_health             une fois par health.interval
+    La soustraction de deux boucles complètes (health activé et désactivé)
+    restait dans le bruit de mesure et pouvait donner un surcoût négatif.
+    """
+    logging_level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.ERROR)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        collectors = {}
+        for enabled in (False, True):
+            config_file = Path(tmp) / f"health_{enabled}.json"
+            health_config = {'enabled': enabled}
+            if textfile:
+                health_config['prometheus_textfile'] = str(Path(tmp) / 'bench.prom')
+            config_file.write_text(json.dumps({
+                'widget': {'id': 'bench', 'version': '0'},
+                'mqtt': {'broker': {'host': 'localhost', 'port': 1883, 'username': '', 'password': ''}},
+                'outbox': {'enabled': False},
+                'health': health_config
+            }))
+            collector = TickCollector(config_file, 'bench')
+            collector.mqtt_client = AckingClient()
+            collector.connected = True
+            collectors[enabled] = collector
+
+        # Dénominateur: CPU d'un tick sans instrumentation (médiane de séries)
+        bare = collectors[False]
+        run_tick_loop(bare, max(1, ticks // 10))  # échauffement
+        results['tick_us'] = statistics.median(
+            run_tick_loop(bare, ticks) / ticks * 1e6 for _ in range(5)
+        )
+
+        collector = collectors[True]
+        health = collector.health
+        sample_rate = health.sample_rate
+
+        # Jobs chronométrés et publications QoS 1 d'un tick échantillonné
+        observations = health.observations
+        health.pending_acks.clear()
+        collector.health_sampling = True
+        collector.collect_and_publish()
+        collector.health_sampling = False
+        publishes = len(health.pending_acks)
+        jobs = health.observations - observations - publishes
+        health.pending_acks.clear()
+        collector.mqtt_client.unacked.clear()
+
+        iterations = max(1000, ticks)
+        costs = {'begin_health_tick': measure_median(collector.begin_health_tick, iterations)}
+        collector.mqtt_client.on_publish = None
+        collector.ack_callback = False
+
+        collector.health_sampling = True
+        def timed_job():
+            with collector.timed('bench'):
+                pass
+        costs['timed'] = measure_median(timed_job, iterations)
+        collector.health_sampling = False
+        costs['observe_job'] = measure_median(lambda: health.observe_job('bench', 0.001), iterations)
+
+        def tracked_ack():
+            sent_at = time.perf_counter()
+            health.publish_sent(1, sent_at)
+            health.publish_acked(1)
+        costs['publish_ack'] = measure_median(tracked_ack, iterations)
+
+        # Rapport complet (snapshot, sérialisation, textfile éventuel)
+        costs['publish_health'] = measure_median(
+            lambda: collector.publish_health(force=True), max(10, iterations // 100), repeat=5
+        )
+        reports_per_tick = collector.get_update_interval() / collector.health_interval
+
+        results['costs_us'] = costs
+        results['jobs_per_tick'] = jobs
+        results['qos1_publishes_per_tick'] = publishes
+        results['sample_rate'] = sample_rate
+        results['instrumentation_us'] = (
+            costs['begin_health_tick']
+            + sample_rate * (jobs * costs['timed'] + costs['observe_job'] + publishes * costs['publish_ack'])
+            + reports_per_tick * costs['publish_health']
+        )
+
+    logging.getLogger().setLevel(logging_level)
+    results['overhead_percent'] = 100.0 * results['instrumentation_us'] / results['tick_us']
+    return results
+
+def print_health_report(results):
+    costs = results['costs_us']
+    print(f"\n=== Auto-instrumentation (tick servermonitoring, psutil: {'oui' if psutil else 'non'}, client factice) ===")
+    print(f"  Tick sans instrumentation : {results['tick_us']:.1f} µs CPU")
+    print(f"  begin_health_tick {costs['begin_health_tick']:.3f} µs/tick | "
+          f"publish_health {costs['publish_health']:.1f} µs/rapport")
+    print(f"  Tick échantillonné ({results['sample_rate']:g}): {results['jobs_per_tick']} job(s) × "
+          f"{costs['timed']:.3f} µs + observe_job {costs['observe_job']:.3f} µs + "
+          f"{results['qos1_publishes_per_tick']} publication(s) QoS 1 × {costs['publish_ack']:.3f} µs")
+    print(f"  Coût de l'instrumentation : {results['instrumentation_us']:.3f} µs CPU/tick")
+    print(f"  Surcoût: {results['overhead_percent']:.3f}% du CPU d'un tick")
+
+def print_report(results):
+    print("\n=== Sérialisation des publications (µs par appel) ===")
+    installed = fast_json_modules()
+    print(f"orjson: {'oui' if 'orjson' in installed else 'non'} | ujson: {'oui' if 'ujson' in installed else 'non'}")
+    print(f"Horodatage utcnow().isoformat(): {results['timestamp']:.2f} µs (économisé sur chaque message après le premier du tick)")
+
+    for kind in ('metric', 'data'):
+        reference = results[f'{kind}/reference']
+        print(f"\n{kind}:")
+        for name, value in results.items():
+            if name.startswith(kind + '/'):
+                print(f"  {name.split('/', 1)[1]:<16} {value:7.2f} µs  (x{reference / value:.2f})")
+
+    # Cas type servermonitoring: une dizaine de métriques par tick
+    per_tick_before = 10 * (results['metric/reference'] + results['timestamp'])
+    per_tick_after = 10 * results['metric/legacy'] + results['timestamp']
+    print(f"\nTick de 10 métriques (legacy): {per_tick_before:.1f} µs → {per_tick_after:.1f} µs")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la sérialisation des collecteurs")
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--check-only', action='store_true', help="Contrôle de compatibilité uniquement")
+    parser.add_argument('--json', help="Écrit les mesures JSON dans ce fichier")
+    parser.add_argument('--health-budget', type=float, default=HEALTH_BUDGET_PERCENT,
+                        help="Surcoût maximal de l'auto-instrumentation (%% du CPU d'un tick)")
+    args = parser.parse_args()
+
+    errors = check_compatibility()
+    if errors:
+        print(f"ÉCARTS DE FORMAT ({len(errors)}):")
+        for error in errors:
+            print(f"  {error}")
+        return 1
+    print("Format legacy identique octet pour octet, format compact équivalent")
+
+    if args.check_only:
+        return 0
+
+    started = time.time()
+    results = run_benchmark(args.iterations)
+    print_report(results)
+    results['compact_metrics'] = run_compact_comparison(args.iterations)
+    print_compact_report(results['compact_metrics'])
+    results['health'] = measure_health_overhead(args.iterations // 4)
+    print_health_report(results['health'])
+    print(f"\nDurée du benchmark: {time.time() - started:.1f}s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if results['health']['overhead_percent'] > args.health_budget:
+        print(f"\nBudget de l'auto-instrumentation dépassé: "
+              f"{results['health']['overhead_percent']:.2f}% > {args.health_budget:.2f}%")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
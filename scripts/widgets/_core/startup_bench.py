@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Banc de démarrage à froid des collecteurs MaxLink
+Lance chaque collecteur dans un processus neuf contre un broker MQTT
+minimal intégré et mesure le délai jusqu'à sa première publication.
+Le mode --together reproduit le redémarrage simultané des services
+après une synchronisation de l'heure.
+
+Exemples:
+    python3 startup_bench.py
+    python3 startup_bench.py --together --budget 8
+    python3 startup_bench.py --collectors servermonitoring --importtime
+    python3 startup_bench.py --json startup.json
+
+Code de sortie 1 si un collecteur dépasse le budget ou ne publie pas.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+CORE_DIR = Path(__file__).resolve().parent
+WIDGETS_DIR = CORE_DIR.parent
+
+DEFAULT_COLLECTORS = ('servermonitoring', 'wifistats', 'mqttstats', 'testpersist', 'timesync', 'rebootbutton')
+PROFILE_GRACE = 1.0
+
+# Pré-charge collector_base depuis le dépôt: les collecteurs ajoutent
+# /opt/maxlink/widgets/_core en tête du path, la copie installée serait mesurée.
+# Le répertoire du widget est dans le path comme pour le service (modules annexes)
+LAUNCHER = (
+    "import os, sys, runpy; sys.path.insert(0, sys.argv[1]); import collector_base; "
+    "script = sys.argv[2]; sys.path.insert(0, os.path.dirname(script)); "
+    "sys.argv = [script] + sys.argv[3:]; "
+    "runpy.run_path(script, run_name='__main__')"
+)
+
+# ===============================================================================
+# BROKER MQTT MINIMAL (3.1.1, sans routage)
+# ===============================================================================
+
+class StubBroker(threading.Thread):
+    """Accepte les connexions, acquitte tout et date la première publication"""
+
+    def __init__(self):
+        super().__init__(name='stub-broker', daemon=True)
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+        self.first_connect = None
+        self.first_publish = None
+        self.first_topic = None
+        self.published = threading.Event()
+        self.closed = False
+
+    def run(self):
+        while not self.closed:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _read_exact(self, connection, size):
+        data = b''
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError()
+            data += chunk
+        return data
+
+    def _read_packet(self, connection):
+        header = self._read_exact(connection, 1)[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = self._read_exact(connection, 1)[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        return header, self._read_exact(connection, length) if length else b''
+
+    def _serve(self, connection):
+        try:
+            while True:
+                header, body = self._read_packet(connection)
+                packet_type = header >> 4
+
+                if packet_type == 1:  # CONNECT
+                    if self.first_connect is None:
+                        self.first_connect = time.monotonic()
+                    connection.sendall(b'\x20\x02\x00\x00')
+                elif packet_type == 3:  # PUBLISH
+                    if self.first_publish is None:
+                        self.first_publish = time.monotonic()
+                        topic_length = int.from_bytes(body[:2], 'big')
+                        self.first_topic = body[2:2 + topic_length].decode('utf-8', 'replace')
+                        self.published.set()
+                    qos = (header >> 1) & 0x03
+                    if qos:
+                        topic_length = int.from_bytes(body[:2], 'big')
+                        packet_id = body[2 + topic_length:4 + topic_length]
+                        connection.sendall((b'\x40\x02' if qos == 1 else b'\x50\x02') + packet_id)
+                elif packet_type == 6:  # PUBREL
+                    connection.sendall(b'\x70\x02' + body[:2])
+                elif packet_type == 8:  # SUBSCRIBE: un code QoS 0 par filtre
+                    filters, offset = 0, 2
+                    while offset < len(body):
+                        offset += 2 + int.from_bytes(body[offset:offset + 2], 'big') + 1
+                        filters += 1
+                    connection.sendall(bytes([0x90, 2 + filters]) + body[:2] + b'\x00' * filters)
+                elif packet_type == 10:  # UNSUBSCRIBE
+                    connection.sendall(b'\xb0\x02' + body[:2])
+                elif packet_type == 12:  # PINGREQ
+                    connection.sendall(b'\xd0\x00')
+                elif packet_type == 14:  # DISCONNECT
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def close(self):
+        self.closed = True
+        self.server.close()
+
+# ===============================================================================
+# LANCEMENT DES COLLECTEURS
+# ===============================================================================
+
+class CollectorRun:
+    """Un collecteur lancé à froid dans son propre processus"""
+
+    def __init__(self, name, work_dir, importtime=False):
+        self.name = name
+        self.script = WIDGETS_DIR / name / f"{name}_collector.py"
+        self.broker = StubBroker()
+        self.config_file = self._write_config(work_dir)
+        self.importtime = importtime
+        self.process = None
+        self.started = None
+        self.output = None
+        self.errors = None
+
+    def _write_config(self, work_dir):
+        with open(WIDGETS_DIR / self.name / f"{self.name}_widget.json") as f:
+            config = json.load(f)
+        config['mqtt']['broker'].update({'host': '127.0.0.1', 'port': self.broker.port})
+
+        # Pas de fichiers de rapport ni de file disque hors du répertoire de test
+        config.setdefault('outbox', {})['path'] = str(work_dir / f"{self.name}_outbox")
+        config.setdefault('health', {})['prometheus_textfile'] = None
+
+        # Traçabilité testpersist: fichiers de semaine et quarantaine
+        if 'storage' in config:
+            config['storage']['base_path'] = str(work_dir / f"{self.name}_storage")
+            config['storage'].setdefault('columnar_export', {})['enabled'] = False
+        if 'quarantine' in config.get('parser', {}):
+            config['parser']['quarantine']['file'] = str(work_dir / f"{self.name}_quarantine.log")
+
+        config_dir = work_dir / self.name
+        config_dir.mkdir()
+        config_file = config_dir / f"{self.name}_widget.json"
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+
+        # Fichiers annexes lus au démarrage (ex: topic_config.json de mqttstats)
+        for extra in (WIDGETS_DIR / self.name).glob('*.json'):
+            if not extra.name.endswith('_widget.json'):
+                (config_dir / extra.name).write_bytes(extra.read_bytes())
+        return config_file
+
+    def start(self):
+        self.broker.start()
+        command = [sys.executable]
+        if self.importtime:
+            command += ['-X', 'importtime']
+        command += ['-c', LAUNCHER, str(CORE_DIR), str(self.script), str(self.config_file)]
+
+        env = dict(os.environ, CONFIG_FILE=str(self.config_file), PYTHONUNBUFFERED='1')
+        self.started = time.monotonic()
+        self.process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env
+        )
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+        try:
+            self.output, self.errors = self.process.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.output, self.errors = self.process.communicate()
+        self.broker.close()
+
+    def result(self, budget):
+        first_publish = None
+        if self.broker.first_publish is not None:
+            first_publish = self.broker.first_publish - self.started
+        first_connect = None
+        if self.broker.first_connect is not None:
+            first_connect = self.broker.first_connect - self.started
+
+        profile = None
+        for line in self.output.splitlines():
+            if 'Profil de démarrage:' in line:
+                profile = line.split('Profil de démarrage:', 1)[1].strip()
+
+        return {
+            'collector': self.name,
+            'first_connect_s': round(first_connect, 3) if first_connect is not None else None,
+            'first_publish_s': round(first_publish, 3) if first_publish is not None else None,
+            'first_topic': self.broker.first_topic,
+            'within_budget': first_publish is not None and first_publish <= budget,
+            'profile': profile,
+            'imports': self.top_imports() if self.importtime else None
+        }
+
+    def top_imports(self, limit=10):
+        """Modules de premier niveau les plus coûteux (sortie de -X importtime)"""
+        modules = []
+        for line in self.errors.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line.split(':', 1)[1].split('|')
+            # Modules importés directement: un séparateur + deux espaces d'indentation
+            if len(name) - len(name.lstrip(' ')) <= 3:
+                modules.append((int(cumulative), name.strip()))
+        modules.sort(reverse=True)
+        return [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for us, name in modules[:limit]]
+
+def run_collectors(names, budget, together=False, importtime=False):
+    """Lance les collecteurs (un par un ou simultanément); retourne les résultats"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix='maxlink_startup_') as work_dir:
+        runs = [CollectorRun(name, Path(work_dir), importtime) for name in names]
+        batches = [runs] if together else [[run] for run in runs]
+
+        for batch in batches:
+            for run in batch:
+                run.start()
+            deadline = time.monotonic() + budget * 2
+            for run in batch:
+                run.broker.published.wait(max(0.0, deadline - time.monotonic()))
+            # Laisse le premier cycle se terminer (ligne « Profil de démarrage »)
+            time.sleep(PROFILE_GRACE)
+            for run in batch:
+                run.stop()
+                results.append(run.result(budget))
+    return results
+
+def print_report(results, budget, together):
+    mode = 'simultané' if together else 'séquentiel'
+    print(f"\n=== Démarrage à froid ({mode}, budget {budget:.1f}s jusqu'à la première publication) ===")
+    for result in results:
+        status = 'OK' if result['within_budget'] else 'DÉPASSÉ'
+        publish = f"{result['first_publish_s']:.3f}s" if result['first_publish_s'] is not None else 'aucune'
+        connect = f"{result['first_connect_s']:.3f}s" if result['first_connect_s'] is not None else 'aucune'
+        print(f"  {result['collector']:<18} connexion {connect:>8} | 1re publication {publish:>8} [{status}]")
+        if result['first_topic']:
+            print(f"    topic: {result['first_topic']}")
+        if result['profile']:
+            print(f"    profil: {result['profile']}")
+        for entry in result['imports'] or []:
+            print(f"    import {entry['module']:<28} {entry['cumulative_ms']:>7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Délai jusqu'à la première publication des collecteurs")
+    parser.add_argument('--collectors', nargs='+', default=list(DEFAULT_COLLECTORS),
+                        help="Collecteurs à lancer (répertoires de scripts/widgets)")
+    parser.add_argument('--budget', type=float, default=5.0,
+                        help="Délai maximal en secondes (Pi sur carte SD: prévoir large)")
+    parser.add_argument('--together', action='store_true',
+                        help="Lance tous les collecteurs en même temps")
+    parser.add_argument('--importtime', action='store_true',
+                        help="Affiche les imports les plus coûteux (python -X importtime)")
+    parser.add_argument('--json', help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    results = run_collectors(args.collectors, args.budget, args.together, args.importtime)
+    print_report(results, args.budget, args.together)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'budget_s': args.budget, 'together': args.together, 'results': results}, f, indent=2)
+
+    failures = [result['collector'] for result in results if not result['within_budget']]
+    if failures:
+        print(f"\nBudget dépassé: {', '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Bundle hors ligne des widgets MaxLink
+La construction (poste de développement ou Pi de référence) regroupe dans
+une seule archive les wheels des dépendances Python pour l'architecture
+cible, le bytecode précompilé de _core et de chaque widget, et un manifeste
+d'empreintes SHA-256. L'installation sur le Pi se limite à vérifier et
+dépaqueter l'archive: ni pip, ni résolution de dépendances, ni compilation
+au premier démarrage.
+
+Exemples:
+    python3 widget_bundle.py build --arch aarch64
+    python3 widget_bundle.py build --wheels-dir ./wheels --no-download
+    python3 widget_bundle.py verify
+    python3 widget_bundle.py install --widget servermonitoring
+
+Le bytecode n'est utilisable que par la version de Python qui l'a produit:
+construire avec le même python3 que le Pi (3.11 sur Bookworm). En cas de
+différence, l'installation ignore le bytecode et les sources sont compilées
+au premier lancement comme avant.
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tarfile
+import zipfile
+import argparse
+import platform
+import tempfile
+import py_compile
+import subprocess
+import importlib.util
+from pathlib import Path
+
+CORE_DIR = Path(__file__).resolve().parent
+WIDGETS_DIR = CORE_DIR.parent
+
+BUNDLE_FILE = WIDGETS_DIR / 'widgets_bundle.tar.gz'
+MANIFEST_NAME = 'manifest.json'
+BUNDLE_VERSION = 1
+
+LOCAL_WIDGETS_DIR = Path('/opt/maxlink/widgets')
+VENDOR_DIR_NAME = '_vendor'
+VENDOR_MARKER = '.bundle.json'
+
+# Contraintes de version des dépendances déclarées par les widgets
+# (les collecteurs utilisent l'API de callbacks de paho-mqtt 1.x)
+BUNDLE_PINS = {
+    'paho-mqtt': 'paho-mqtt>=1.6,<2.0',
+    'psutil': 'psutil>=5.9'
+}
+
+# Plateformes pip par architecture du Pi
+PIP_PLATFORMS = {
+    'aarch64': ['manylinux2014_aarch64', 'manylinux_2_17_aarch64', 'linux_aarch64'],
+    'armv7l': ['linux_armv7l'],
+    'x86_64': ['manylinux2014_x86_64', 'manylinux_2_17_x86_64', 'linux_x86_64']
+}
+
+# ===============================================================================
+# UTILITAIRES
+# ===============================================================================
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def bundle_hash(files):
+    """Empreinte globale: SHA-256 de la liste triée (chemin, empreinte)"""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}\0{files[name]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def widget_dirs():
+    """Répertoires des widgets (hors _core et répertoires techniques)"""
+    return sorted(
+        path for path in WIDGETS_DIR.iterdir()
+        if path.is_dir() and not path.name.startswith(('_', '.'))
+    )
+
+def widget_requirements():
+    """Union des python_packages des widgets, avec les contraintes BUNDLE_PINS"""
+    packages = set()
+    for widget_dir in widget_dirs():
+        config_file = widget_dir / f"{widget_dir.name}_widget.json"
+        try:
+            config = json.loads(config_file.read_text())
+        except (OSError, ValueError):
+            continue
+        packages.update(config.get('dependencies', {}).get('python_packages', []))
+    return sorted(BUNDLE_PINS.get(package, package) for package in packages)
+
+def normalize_name(name):
+    """Nom de distribution normalisé (paho-mqtt, paho_mqtt, Paho.MQTT -> paho_mqtt)"""
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+def missing_requirements(manifest, contents):
+    """Dépendances du manifeste sans wheel correspondante dans l'archive"""
+    wheels = {
+        normalize_name(Path(name).name.split('-', 1)[0])
+        for name in contents if name.startswith('wheels/') and name.endswith('.whl')
+    }
+    return [
+        requirement for requirement in manifest.get('requirements', [])
+        if normalize_name(re.split(r'[<>=!~;\[\s]', requirement, 1)[0]) not in wheels
+    ]
+
+def is_safe_member(name):
+    """Refuse les chemins absolus ou remontant hors du répertoire cible"""
+    path = Path(name)
+    return not path.is_absolute() and '..' not in path.parts
+
+# ===============================================================================
+# CONSTRUCTION
+# ===============================================================================
+
+def download_wheels(requirements, destination, arch, python_version, index_url=None):
+    """Télécharge les wheels binaires pour l'architecture cible (pip download)"""
+    command = [
+        sys.executable, '-m', 'pip', 'download', '--quiet',
+        '--only-binary=:all:', '--implementation', 'cp',
+        '--python-version', python_version,
+        '--dest', str(destination)
+    ]
+    for platform_tag in PIP_PLATFORMS.get(arch, [f"linux_{arch}"]):
+        command += ['--platform', platform_tag]
+    if index_url:
+        command += ['--extra-index-url', index_url]
+    subprocess.run(command + requirements, check=True)
+
+def compile_sources(staging):
+    """Bytecode de _core et de chaque widget, vérifié par empreinte du source
+
+    CHECKED_HASH: le .pyc reste valide après la copie vers /opt/maxlink
+    (cp ne conserve pas les dates) et est ignoré si le source est modifié.
+    Les chemins enregistrés (tracebacks) sont ceux de l'installation.
+    """
+    compiled = 0
+    for source_dir in [CORE_DIR] + widget_dirs():
+        for source in sorted(source_dir.glob('*.py')):
+            relative = source.relative_to(WIDGETS_DIR)
+            cache_file = Path(importlib.util.cache_from_source(str(relative)))
+            py_compile.compile(
+                str(source),
+                cfile=str(staging / 'pycache' / cache_file),
+                dfile=str(LOCAL_WIDGETS_DIR / relative),
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH
+            )
+            compiled += 1
+    return compiled
+
+def build_bundle(output, arch, wheels_dir=None, download=True, index_url=None, with_bytecode=True):
+    """Construit l'archive; retourne le manifeste"""
+    python_version = f"{sys.version_info.major}.{sys.version_info.minor}"
+
+    with tempfile.TemporaryDirectory(prefix='widgets_bundle_') as temp_dir:
+        staging = Path(temp_dir)
+        wheels = staging / 'wheels'
+        wheels.mkdir()
+
+        if wheels_dir:
+            for wheel in Path(wheels_dir).glob('*.whl'):
+                shutil.copy2(wheel, wheels / wheel.name)
+        requirements = widget_requirements()
+        if download and requirements:
+            print(f"◦ Téléchargement des wheels ({arch}, Python {python_version}): {', '.join(requirements)}")
+            download_wheels(requirements, wheels, arch, python_version, index_url)
+
+        compiled = compile_sources(staging) if with_bytecode else 0
+
+        files = {}
+        for path in sorted(staging.rglob('*')):
+            if path.is_file():
+                files[path.relative_to(staging).as_posix()] = sha256_bytes(path.read_bytes())
+
+        manifest = {
+            'version': BUNDLE_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'arch': arch,
+            'python': python_version,
+            'cache_tag': sys.implementation.cache_tag if with_bytecode else None,
+            'magic': importlib.util.MAGIC_NUMBER.hex() if with_bytecode else None,
+            'requirements': requirements,
+            'files': files,
+            'bundle_hash': bundle_hash(files)
+        }
+        (staging / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        temp_output = output.with_name(output.name + '.tmp')
+        with tarfile.open(temp_output, 'w:gz') as archive:
+            archive.add(staging / MANIFEST_NAME, arcname=MANIFEST_NAME)
+            for name in files:
+                archive.add(staging / name, arcname=name)
+        os.replace(temp_output, output)
+
+    wheel_count = sum(1 for name in files if name.startswith('wheels/'))
+    print(f"✓ Bundle {output}: {wheel_count} wheel(s), {compiled} module(s) compilé(s)")
+    print(f"  Empreinte: {manifest['bundle_hash']}")
+    return manifest
+
+# ===============================================================================
+# VÉRIFICATION ET INSTALLATION
+# ===============================================================================
+
+class BundleError(Exception):
+    """Archive absente, corrompue ou incompatible avec ce système"""
+
+def read_bundle(bundle_file):
+    """Lit l'archive en mémoire et vérifie chaque fichier contre le manifeste
+
+    Retourne (manifeste, {chemin: contenu}).
+    """
+    try:
+        with tarfile.open(bundle_file, 'r:gz') as archive:
+            contents = {}
+            for member in archive.getmembers():
+                if not member.isfile():
+                    continue
+                if not is_safe_member(member.name):
+                    raise BundleError(f"Chemin refusé dans l'archive: {member.name}")
+                contents[member.name] = archive.extractfile(member).read()
+    except (OSError, tarfile.TarError) as e:
+        raise BundleError(f"Archive illisible: {e}")
+
+    try:
+        manifest = json.loads(contents.pop(MANIFEST_NAME))
+    except (KeyError, ValueError):
+        raise BundleError("Manifeste absent ou invalide")
+
+    if manifest.get('version') != BUNDLE_VERSION:
+        raise BundleError(f"Version de bundle non supportée: {manifest.get('version')}")
+
+    files = manifest.get('files', {})
+    if set(files) != set(contents):
+        raise BundleError("Contenu de l'archive différent du manifeste")
+    for name, data in contents.items():
+        if sha256_bytes(data) != files[name]:
+            raise BundleError(f"Empreinte invalide: {name}")
+    if bundle_hash(files) != manifest.get('bundle_hash'):
+        raise BundleError("Empreinte globale du bundle invalide")
+
+    return manifest, contents
+
+def bytecode_compatible(manifest):
+    return (manifest.get('cache_tag') == sys.implementation.cache_tag
+            and manifest.get('magic') == importlib.util.MAGIC_NUMBER.hex())
+
+def unpack_wheel(data, vendor_dir):
+    """Dépaquette une wheel (équivalent pip install --target, sans scripts)"""
+    with zipfile.ZipFile(io.BytesIO(data)) as wheel:
+        for name in wheel.namelist():
+            if name.endswith('/') or not is_safe_member(name):
+                continue
+            parts = name.split('/')
+            if parts[0].endswith('.data'):
+                # purelib/platlib: à la racine; scripts, headers, data: ignorés
+                if len(parts) < 3 or parts[1] not in ('purelib', 'platlib'):
+                    continue
+                parts = parts[2:]
+            target = vendor_dir.joinpath(*parts)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(wheel.read(name))
+
+def install_wheels(manifest, contents, target_dir):
+    """Installe les wheels dans <cible>/_vendor (une fois par bundle)
+
+    Une dépendance sans wheel (bundle construit avec --no-download) fait
+    échouer l'installation: widget_common.sh repasse alors par le cache.
+    """
+    missing = missing_requirements(manifest, contents)
+    if missing:
+        raise BundleError(f"Wheel(s) absente(s) du bundle: {', '.join(missing)}")
+
+    vendor_dir = target_dir / VENDOR_DIR_NAME
+    marker = vendor_dir / VENDOR_MARKER
+    try:
+        if json.loads(marker.read_text()).get('bundle_hash') == manifest['bundle_hash']:
+            return 0
+    except (OSError, ValueError):
+        pass
+
+    wheels = [name for name in contents if name.startswith('wheels/')]
+    if wheels and manifest.get('arch') != platform.machine():
+        raise BundleError(f"Bundle construit pour {manifest.get('arch')}, système {platform.machine()}")
+
+    # Remplacement complet: aucune version précédente ne doit subsister
+    temp_dir = target_dir / (VENDOR_DIR_NAME + '.tmp')
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    temp_dir.mkdir(parents=True)
+    for name in wheels:
+        unpack_wheel(contents[name], temp_dir)
+    (temp_dir / VENDOR_MARKER).write_text(json.dumps({
+        'bundle_hash': manifest['bundle_hash'],
+        'requirements': manifest.get('requirements', []),
+        'installed': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }, indent=2))
+    shutil.rmtree(vendor_dir, ignore_errors=True)
+    os.replace(temp_dir, vendor_dir)
+    return len(wheels)
+
+def install_bytecode(manifest, contents, target_dir, widgets):
+    """Place le bytecode de _core et des widgets demandés dans leurs __pycache__"""
+    if not bytecode_compatible(manifest):
+        print(f"⚠ Bytecode {manifest.get('cache_tag')} ignoré (Python local: {sys.implementation.cache_tag})")
+        return 0
+
+    prefixes = tuple(f"pycache/{name}/" for name in ['_core'] + list(widgets))
+    installed = 0
+    for name, data in contents.items():
+        if not name.startswith(prefixes):
+            continue
+        target = target_dir / name[len('pycache/'):]
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = target.with_name(target.name + '.tmp')
+        temp_file.write_bytes(data)
+        os.replace(temp_file, target)
+        installed += 1
+    return installed
+
+def install_bundle(bundle_file, target_dir, widgets):
+    manifest, contents = read_bundle(bundle_file)
+    target_dir = Path(target_dir)
+    wheels = install_wheels(manifest, contents, target_dir)
+    modules = install_bytecode(manifest, contents, target_dir, widgets)
+    print(f"✓ Bundle {manifest['bundle_hash'][:12]}: {wheels} wheel(s) installée(s), {modules} module(s) précompilé(s)")
+    return manifest
+
+# ===============================================================================
+# PROGRAMME PRINCIPAL
+# ===============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle hors ligne des widgets MaxLink")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Construit l'archive")
+    build_parser.add_argument('--output', default=str(BUNDLE_FILE), help="Archive produite")
+    build_parser.add_argument('--arch', default='aarch64', choices=sorted(PIP_PLATFORMS), help="Architecture du Pi")
+    build_parser.add_argument('--wheels-dir', help="Wheels déjà téléchargées à inclure")
+    build_parser.add_argument('--no-download', action='store_true', help="N'appelle pas pip download")
+    build_parser.add_argument('--index-url', help="Index supplémentaire (ex: https://www.piwheels.org/simple)")
+    build_parser.add_argument('--no-bytecode', action='store_true', help="Sans bytecode précompilé")
+
+    verify_parser = subparsers.add_parser('verify', help="Vérifie l'archive")
+    verify_parser.add_argument('--bundle', default=str(BUNDLE_FILE))
+
+    install_parser = subparsers.add_parser('install', help="Dépaquette l'archive sur le Pi")
+    install_parser.add_argument('--bundle', default=str(BUNDLE_FILE))
+    install_parser.add_argument('--target', default=str(LOCAL_WIDGETS_DIR), help="Répertoire des widgets installés")
+    install_parser.add_argument('--widget', action='append', default=[], help="Widget dont installer le bytecode")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            build_bundle(args.output, args.arch, args.wheels_dir, not args.no_download,
+                         args.index_url, not args.no_bytecode)
+        elif args.command == 'verify':
+            manifest, contents = read_bundle(args.bundle)
+            print(f"✓ Bundle valide: {manifest['bundle_hash']}")
+            print(f"  {manifest['arch']}, Python {manifest['python']}, construit le {manifest['created']}")
+            print(f"  Dépendances: {', '.join(manifest.get('requirements', [])) or 'aucune'}")
+            missing = missing_requirements(manifest, contents)
+            if missing:
+                print(f"  ⚠ Sans wheel (installation refusée): {', '.join(missing)}")
+            print(f"  Bytecode utilisable ici: {'oui' if bytecode_compatible(manifest) else 'non'}")
+        else:
+            install_bundle(args.bundle, args.target, args.widget)
+    except BundleError as e:
+        print(f"✗ {e}")
+        return 1
+    except subprocess.CalledProcessError as e:
+        print(f"✗ pip download a échoué (code {e.returncode})")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
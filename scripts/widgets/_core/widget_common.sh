@@ -22,6 +22,9 @@ LOCAL_CONFIG_DIR="/opt/maxlink/config/widgets"
 # Pour l'installation initiale depuis la clé USB
 USB_WIDGETS_DIR="$BASE_DIR/scripts/widgets"
 
+# Bundle hors ligne (wheels + bytecode), produit par widget_bundle.py build
+WIDGETS_BUNDLE_FILE="$USB_WIDGETS_DIR/widgets_bundle.tar.gz"
+
 # Fichiers de tracking
 WIDGETS_CONFIG_DIR="/etc/maxlink/widgets"
 WIDGETS_TRACKING_FILE="/etc/maxlink/widgets_installed.json"
@@ -127,6 +130,16 @@ widget_install_python_deps() {
     
     log_info "Vérification des dépendances Python pour $widget_name"
     
+    # Bundle présent: wheels et bytecode dépaquetés tels quels (ni pip ni compilation)
+    if [ -f "$WIDGETS_BUNDLE_FILE" ]; then
+        if python3 "$USB_WIDGETS_DIR/_core/widget_bundle.py" install \
+            --bundle "$WIDGETS_BUNDLE_FILE" --target "$LOCAL_WIDGETS_DIR" --widget "$widget_name"; then
+            log_success "Dépendances Python installées depuis le bundle"
+            return 0
+        fi
+        log_warn "Bundle inutilisable pour $widget_name, dépendances via le cache"
+    fi
+    
     local python_deps=$(widget_get_value "$config_file" "dependencies.python_packages")
     
     if [ -z "$python_deps" ] || [ "$python_deps" = "[]" ]; then
@@ -196,7 +209,9 @@ ConditionPathExists=$local_config
 
 [Service]
 Type=simple
-ExecStart=/usr/bin/python3 $local_collector
+# Lancé comme module: le bytecode de __pycache__ est utilisé (un script
+# passé en argument est toujours recompilé au démarrage)
+ExecStart=/usr/bin/python3 -m ${widget_name}_collector
 Restart=always
 RestartSec=30
 StartLimitInterval=600
@@ -213,7 +228,7 @@ Environment="CONFIG_FILE=$local_config"
 Environment="MQTT_RETRY_ENABLED=true"
 Environment="MQTT_RETRY_DELAY=10"
 Environment="MQTT_MAX_RETRIES=0"
-Environment="PYTHONPATH=/opt/maxlink/widgets/_core:/opt/maxlink/widgets"
+Environment="PYTHONPATH=/opt/maxlink/widgets/_core:/opt/maxlink/widgets:/opt/maxlink/widgets/_vendor"
 
 # Répertoire de travail LOCAL
 WorkingDirectory=/opt/maxlink/widgets/$widget_name
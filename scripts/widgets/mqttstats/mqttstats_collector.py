@@ -2,6 +2,8 @@
 """
 Collecteur de statistiques MQTT - Version RTP/CONFIRMED
 Surveille spécifiquement les topics RTP et leurs confirmations
+Publications et maintenance cadencées par un ordonnanceur périodique
+(horloge monotone, échéances manquées comptées dans les statistiques)
 """
 
 import os
@@ -9,7 +11,9 @@ import sys
 import time
 import json
 import re
+import queue
 import logging
+import threading
 from datetime import datetime
 from pathlib import Path
 
@@ -27,15 +31,162 @@ except ImportError:
     logger.error("Module paho-mqtt non installé")
     sys.exit(1)
 
+# Horloges partagées avec les collecteurs BaseCollector
+sys.path.insert(0, '/opt/maxlink/widgets/_core')
+
+try:
+    from collector_base import CollectorClock, PeriodicScheduler
+except ImportError:
+    logger.error("collector_base.py non trouvé dans /opt/maxlink/widgets/_core")
+    sys.exit(1)
+
+# Uptime du broker publié par mosquitto: b"12345 seconds"
+SYS_UPTIME_PATTERN = re.compile(rb'(\d+)\s*seconds?')
+
+# Période de vérification de topic_config.json (secondes)
+CONFIG_CHECK_INTERVAL = 5
+
+# Cadences par défaut des tâches (section collector.schedule, secondes)
+DEFAULT_SCHEDULE = {
+    'stats': 2,
+    'topics': 30,
+    'cleanup': 60,
+    'latency': 10
+}
+
+# Topic inactif retiré de la liste après ce délai (secondes)
+TOPIC_TIMEOUT = 300
+
+# Pause maximale de la boucle entre deux vérifications (saut d'horloge)
+MAX_DISPATCH_WAIT = 1.0
+
+class MQTTConnectionManager:
+    """Session MQTT unique partagée entre publication et surveillance
+    
+    Les abonnements sont rejoués à chaque connexion, la disponibilité est
+    suivie par callbacks et les messages reçus sont routés par préfixe de
+    topic vers des files distinctes, vidées par la boucle principale.
+    """
+    
+    def __init__(self, broker_config, client_id="mqttstats_rtp"):
+        self.broker_config = broker_config
+        self.client = mqtt.Client(client_id=client_id)
+        self.client.username_pw_set(broker_config['username'], broker_config['password'])
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+        
+        # Disponibilité: connecté ET abonnements envoyés
+        self.ready = threading.Event()
+        self.pending = threading.Event()
+        
+        # Abonnements modifiés par la boucle principale, rejoués par le thread réseau
+        self.subscriptions = {}
+        self.subscriptions_lock = threading.Lock()
+        self.routes = []  # (préfixe, nom, file, handler) - premier préfixe correspondant
+        self.routed_counts = {}
+    
+    def add_route(self, name, prefix, handler):
+        """Déclare une file de traitement pour les topics commençant par prefix"""
+        self.routes.append((prefix, name, queue.SimpleQueue(), handler))
+        self.routed_counts[name] = 0
+        # Préfixes les plus longs en premier ('' sert de route par défaut)
+        self.routes.sort(key=lambda route: len(route[0]), reverse=True)
+    
+    def subscribe(self, topic, qos=0):
+        """Enregistre un abonnement (envoyé immédiatement si connecté)"""
+        with self.subscriptions_lock:
+            self.subscriptions[topic] = qos
+            if self.ready.is_set():
+                self.client.subscribe(topic, qos)
+    
+    def unsubscribe(self, topic):
+        """Retire un abonnement de la session en cours et des reconnexions"""
+        with self.subscriptions_lock:
+            if self.subscriptions.pop(topic, None) is not None and self.ready.is_set():
+                self.client.unsubscribe(topic)
+    
+    def start(self):
+        """Connexion non bloquante; paho gère les reconnexions"""
+        self.client.connect_async(self.broker_config['host'], self.broker_config['port'], 60)
+        self.client.loop_start()
+    
+    def wait_ready(self, timeout=None):
+        return self.ready.wait(timeout)
+    
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Publie si la session est prête; retourne False sinon"""
+        if not self.ready.is_set():
+            return False
+        result = self.client.publish(topic, payload, qos=qos, retain=retain)
+        return result.rc == mqtt.MQTT_ERR_SUCCESS
+    
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logger.error(f"Échec connexion MQTT, code: {rc}")
+            return
+        
+        # Session propre: tous les abonnements sont rejoués en un seul SUBSCRIBE;
+        # ready est levé sous le même verrou pour qu'aucun ajout ne soit perdu
+        with self.subscriptions_lock:
+            subscriptions = list(self.subscriptions.items())
+            if subscriptions:
+                client.subscribe(subscriptions)
+            self.ready.set()
+        logger.info(f"Connecté au broker MQTT ({len(subscriptions)} abonnements)")
+        for topic, _ in subscriptions:
+            logger.info(f"  → Abonné à: {topic}")
+    
+    def _on_disconnect(self, client, userdata, rc):
+        self.ready.clear()
+        if rc != 0:
+            logger.warning(f"Déconnecté du broker MQTT (code: {rc}), reconnexion automatique")
+    
+    def _on_message(self, client, userdata, msg):
+        """Thread réseau: routage uniquement, aucun traitement"""
+        topic = msg.topic
+        for prefix, name, messages, handler in self.routes:
+            if topic.startswith(prefix):
+                messages.put(msg)
+                self.pending.set()
+                return
+    
+    def dispatch(self, timeout):
+        """Traite les messages en attente jusqu'à l'échéance (remplace la pause)"""
+        deadline = time.monotonic() + timeout
+        
+        while True:
+            self.pending.clear()
+            for prefix, name, messages, handler in self.routes:
+                while True:
+                    try:
+                        msg = messages.get_nowait()
+                    except queue.Empty:
+                        break
+                    self.routed_counts[name] += 1
+                    try:
+                        handler(msg)
+                    except Exception as e:
+                        logger.error(f"Erreur traitement message ({name}): {e}")
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.pending.wait(remaining):
+                return
+    
+    def stop(self):
+        self.ready.clear()
+        self.client.disconnect()
+        self.client.loop_stop()
+
 class MQTTStatsCollector:
     def __init__(self, config_file):
         """Initialise le collecteur avec surveillance RTP spécialisée"""
         self.config_file = config_file
         self.config = self.load_config()
         
-        # Clients MQTT
-        self.stats_client = None  # Pour publier les stats
-        self.monitor_client = None  # Pour surveiller les topics RTP
+        # Session MQTT unique (publication + surveillance)
+        self.connection = None
         
         # Configuration des topics à surveiller
         self.monitored_patterns = self.load_monitored_patterns()
@@ -59,9 +210,11 @@ class MQTTStatsCollector:
         self.active_topics = []
         self.topic_last_seen = {}
         
-        # Timestamps
-        self.start_time = time.time()
-        self.last_publish = 0
+        # Horloges: instants monotones pour les intervalles, heure murale
+        # uniquement dans les payloads
+        self.clock = CollectorClock()
+        self.clock.add_listener(self.on_clock_step)
+        self.start_time = self.clock.monotonic()
         
         # Topics de publication
         self.publish_topics = {
@@ -69,6 +222,25 @@ class MQTTStatsCollector:
             'topics': 'rpi/network/mqtt/topics'
         }
         
+        # Sonde de latence: aller-retour d'un message via le broker
+        self.probe_topic = f"rpi/network/mqtt/probe/{os.getpid()}"
+        self.probe_pending = None
+        self.probe_lost = 0
+        
+        # Rechargement à chaud de topic_config.json (signature stat() périodique)
+        self.topic_config_file = os.path.join(os.path.dirname(self.config_file), 'topic_config.json')
+        self.topic_config_signature = self._file_signature(self.topic_config_file)
+        
+        # Tâches périodiques à cadence fixe
+        schedule = dict(DEFAULT_SCHEDULE, **self.config.get('collector', {}).get('schedule', {}))
+        self.topic_timeout = self.config.get('collector', {}).get('topic_timeout', TOPIC_TIMEOUT)
+        self.scheduler = PeriodicScheduler(self.clock)
+        self.scheduler.add_job('stats', schedule['stats'], self.publish_stats)
+        self.scheduler.add_job('topics', schedule['topics'], self.publish_topics_list)
+        self.scheduler.add_job('cleanup', schedule['cleanup'], self.cleanup_old_topics, delay=schedule['cleanup'])
+        self.scheduler.add_job('latency', schedule['latency'], self.send_latency_probe)
+        self.scheduler.add_job('config', CONFIG_CHECK_INTERVAL, self.check_config_reload, delay=CONFIG_CHECK_INTERVAL)
+        
         logger.info("=== Collecteur MQTT Stats RTP/CONFIRMED ===")
         logger.info(f"Topics surveillés: {self.monitored_patterns}")
         logger.info(f"Rôles des topics: {self.topic_roles}")
@@ -157,95 +329,105 @@ class MQTTStatsCollector:
         
         return default_roles
     
-    def connect_mqtt(self):
-        """Connexion des clients MQTT"""
-        mqtt_config = self.config['mqtt']['broker']
+    def _file_signature(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def check_config_reload(self):
+        """Applique les modifications de topic_config.json sans reconnexion"""
+        signature = self._file_signature(self.topic_config_file)
+        if signature is None or signature == self.topic_config_signature:
+            return
+        self.topic_config_signature = signature
+        
+        try:
+            with open(self.topic_config_file, 'r') as f:
+                topic_config = json.load(f)
+            patterns = topic_config.get('monitoredPatterns', self.monitored_patterns)
+            roles = topic_config.get('topicRoles', self.topic_roles)
+            if not isinstance(patterns, list) or not all(isinstance(p, str) and p for p in patterns):
+                raise ValueError("monitoredPatterns doit être une liste de topics")
+            if not isinstance(roles, dict):
+                raise ValueError("topicRoles doit être un objet")
+        except (OSError, ValueError, AttributeError) as e:
+            logger.error(f"topic_config.json invalide, conservation de la configuration actuelle: {e}")
+            return
+        
+        removed = [pattern for pattern in self.monitored_patterns if pattern not in patterns]
+        added = [pattern for pattern in patterns if pattern not in self.monitored_patterns]
+        
+        # Compteurs et session conservés: seuls les abonnements changent
+        for pattern in removed:
+            self.connection.unsubscribe(pattern)
+            logger.info(f"  → Désabonné de: {pattern}")
+        for pattern in added:
+            self.connection.subscribe(pattern)
+            logger.info(f"  → Abonné à: {pattern}")
         
+        self.monitored_patterns = patterns
+        self.topic_roles = roles
+        logger.info(f"topic_config.json rechargé: {len(patterns)} topics surveillés, rôles {roles}")
+    
+    def connect_mqtt(self):
+        """Prépare la session MQTT partagée et démarre la connexion"""
         try:
-            # Client pour publier les stats
-            self.stats_client = mqtt.Client(client_id="mqttstats_rtp_publisher")
-            self.stats_client.username_pw_set(mqtt_config['username'], mqtt_config['password'])
-            self.stats_client.on_connect = self._on_stats_connect
-            self.stats_client.connect(mqtt_config['host'], mqtt_config['port'], 60)
-            self.stats_client.loop_start()
+            self.connection = MQTTConnectionManager(self.config['mqtt']['broker'])
             
-            # Client pour surveiller les topics RTP
-            self.monitor_client = mqtt.Client(client_id="mqttstats_rtp_monitor")
-            self.monitor_client.username_pw_set(mqtt_config['username'], mqtt_config['password'])
-            self.monitor_client.on_connect = self._on_monitor_connect
-            self.monitor_client.on_message = self._on_message
-            self.monitor_client.connect(mqtt_config['host'], mqtt_config['port'], 60)
-            self.monitor_client.loop_start()
+            # Files séparées: métriques broker, sonde de latence et trafic RTP
+            self.connection.add_route('sys', '$SYS/', self._handle_sys_message)
+            self.connection.add_route('probe', self.probe_topic, self._handle_probe_message)
+            self.connection.add_route('rtp', '', self._handle_rtp_message)
             
-            # Attendre la connexion
-            time.sleep(2)
+            for topic in ("$SYS/broker/clients/connected", "$SYS/broker/version", "$SYS/broker/uptime",
+                          self.probe_topic):
+                self.connection.subscribe(topic)
+            for pattern in self.monitored_patterns:
+                self.connection.subscribe(pattern)
             
-            logger.info("Clients MQTT connectés")
+            self.connection.start()
             return True
             
         except Exception as e:
             logger.error(f"Erreur connexion MQTT: {e}")
             return False
     
-    def _on_stats_connect(self, client, userdata, flags, rc):
-        """Callback connexion client stats"""
-        if rc == 0:
-            logger.info("Client stats connecté")
-            # S'abonner aux topics système pour les métriques générales
-            client.subscribe("$SYS/broker/clients/connected")
-            client.subscribe("$SYS/broker/version")
-    
-    def _on_monitor_connect(self, client, userdata, flags, rc):
-        """Callback connexion client monitor"""
-        if rc == 0:
-            logger.info("Client monitor connecté")
-            # S'abonner aux topics RTP spécifiques
-            for pattern in self.monitored_patterns:
-                client.subscribe(pattern)
-                logger.info(f"  → Abonné à: {pattern}")
-                
-            # S'abonner aussi aux topics système pour l'uptime
-            client.subscribe("$SYS/broker/uptime")
-            logger.info("  → Abonné à: $SYS/broker/uptime")
+    def _handle_sys_message(self, msg):
+        """Métriques système du broker ($SYS), lues directement depuis les bytes"""
+        topic = msg.topic
+        payload = msg.payload
+        if topic == "$SYS/broker/clients/connected":
+            # int() accepte les bytes ASCII: pas de décodage intermédiaire
+            self.system_stats['clients_connected'] = int(payload)
+        elif topic == "$SYS/broker/version":
+            self.system_stats['broker_version'] = payload.decode()
+        elif topic == "$SYS/broker/uptime":
+            # Format: "X seconds"
+            match = SYS_UPTIME_PATTERN.match(payload)
+            if match:
+                self.system_stats['uptime_seconds'] = int(match.group(1))
     
-    def _on_message(self, client, userdata, msg):
-        """Traitement des messages - comptage séparé RTP/CONFIRMED"""
-        try:
-            topic = msg.topic
-            
-            # Traiter les topics système
-            if topic.startswith("$SYS/"):
-                if topic == "$SYS/broker/clients/connected":
-                    self.system_stats['clients_connected'] = int(msg.payload.decode())
-                elif topic == "$SYS/broker/version":
-                    self.system_stats['broker_version'] = msg.payload.decode()
-                elif topic == "$SYS/broker/uptime":
-                    # Format: "X seconds"
-                    uptime_str = msg.payload.decode()
-                    match = re.match(r'(\d+)\s*seconds?', uptime_str)
-                    if match:
-                        self.system_stats['uptime_seconds'] = int(match.group(1))
-            else:
-                # Message RTP - identifier le rôle et incrémenter le bon compteur
-                role = self.topic_roles.get(topic)
-                if role == 'received':
-                    self.rtp_stats['received'] += 1
-                    logger.debug(f"RTP reçu: {self.rtp_stats['received']}")
-                elif role == 'sent':
-                    self.rtp_stats['sent'] += 1
-                    logger.debug(f"RTP confirmé: {self.rtp_stats['sent']}")
-                else:
-                    logger.warning(f"Topic inconnu reçu: {topic}")
-                
-                # Gérer la liste des topics actifs
-                self.update_active_topics(topic)
-                
-        except Exception as e:
-            logger.error(f"Erreur traitement message: {e}")
+    def _handle_rtp_message(self, msg):
+        """Message RTP - identifier le rôle et incrémenter le bon compteur"""
+        topic = msg.topic
+        role = self.topic_roles.get(topic)
+        if role == 'received':
+            self.rtp_stats['received'] += 1
+            logger.debug(f"RTP reçu: {self.rtp_stats['received']}")
+        elif role == 'sent':
+            self.rtp_stats['sent'] += 1
+            logger.debug(f"RTP confirmé: {self.rtp_stats['sent']}")
+        else:
+            logger.warning(f"Topic inconnu reçu: {topic}")
+        
+        # Gérer la liste des topics actifs
+        self.update_active_topics(topic)
     
     def update_active_topics(self, topic):
         """Met à jour la liste des topics actifs"""
-        current_time = time.time()
+        current_time = self.clock.monotonic()
         
         # Mettre à jour le timestamp
         self.topic_last_seen[topic] = current_time
@@ -261,101 +443,96 @@ class MQTTStatsCollector:
         if len(self.active_topics) > 5:
             self.active_topics = self.active_topics[:5]
     
-    def calculate_latency(self):
-        """Calcule la latence MQTT"""
-        try:
-            # Pour localhost, simulation d'une latence réaliste
-            import random
-            if self.config['mqtt']['broker']['host'] in ['localhost', '127.0.0.1']:
-                self.system_stats['latency_ms'] = round(random.uniform(1.0, 5.0), 1)
-            else:
-                # Pour d'autres brokers, on pourrait faire un ping MQTT réel
-                self.system_stats['latency_ms'] = round(random.uniform(5.0, 50.0), 1)
-                
-        except Exception as e:
-            logger.error(f"Erreur calcul latence: {e}")
-            self.system_stats['latency_ms'] = 0
+    def send_latency_probe(self):
+        """Publie une sonde horodatée (monotone); la latence est mesurée à son retour"""
+        if not self.connection.ready.is_set():
+            return
+        if self.probe_pending is not None:
+            self.probe_lost += 1
+        self.probe_pending = str(time.monotonic_ns()).encode('ascii')
+        self.connection.publish(self.probe_topic, self.probe_pending)
+    
+    def _handle_probe_message(self, msg):
+        """Retour de la sonde: aller-retour client → broker → client"""
+        if msg.payload != self.probe_pending:
+            return
+        self.probe_pending = None
+        elapsed_ns = time.monotonic_ns() - int(msg.payload)
+        self.system_stats['latency_ms'] = round(elapsed_ns / 1e6, 1)
     
     def publish_stats(self):
-        """Publie les statistiques RTP sur MQTT"""
-        current_time = time.time()
+        """Publie les statistiques RTP sur MQTT (tâche 'stats')"""
+        # Pas de publication avant que la session soit prête
+        if not self.connection.ready.is_set():
+            return
+        
+        # Calculer l'uptime formaté
+        uptime_seconds = self.system_stats['uptime_seconds']
+        days = uptime_seconds // 86400
+        hours = (uptime_seconds % 86400) // 3600
+        minutes = (uptime_seconds % 3600) // 60
+        seconds = uptime_seconds % 60
+        uptime_formatted = f"{days:02d}j {hours:02d}h {minutes:02d}m {seconds:02d}s"
         
-        # Publier toutes les 2 secondes
-        if current_time - self.last_publish < 2:
+        # Construire les données de stats avec mapping RTP
+        stats_data = {
+            'timestamp': datetime.now().isoformat(),
+            'messages_received': self.rtp_stats['received'],  # Messages RTP reçus
+            'messages_sent': self.rtp_stats['sent'],          # Messages RTP confirmés
+            'clients_connected': self.system_stats['clients_connected'],
+            'uptime_seconds': self.system_stats['uptime_seconds'],
+            'uptime': uptime_formatted,
+            'latency_ms': self.system_stats['latency_ms'],
+            'broker_version': self.system_stats['broker_version'],
+            'status': 'ok',
+            'rtp_details': {
+                'received_count': self.rtp_stats['received'],
+                'confirmed_count': self.rtp_stats['sent'],
+                'difference': self.rtp_stats['received'] - self.rtp_stats['sent']
+            },
+            'latency_probes_lost': self.probe_lost,
+            'scheduler': self.scheduler.get_stats()
+        }
+        
+        self.connection.publish(
+            self.publish_topics['stats'],
+            json.dumps(stats_data)
+        )
+    
+    def publish_topics_list(self):
+        """Publie la liste des topics actifs (tâche 'topics')"""
+        if not self.connection.ready.is_set():
             return
         
-        try:
-            # Calculer la latence périodiquement
-            if int(current_time) % 10 == 0:
-                self.calculate_latency()
-            
-            # Calculer l'uptime formaté
-            uptime_seconds = self.system_stats['uptime_seconds']
-            days = uptime_seconds // 86400
-            hours = (uptime_seconds % 86400) // 3600
-            minutes = (uptime_seconds % 3600) // 60
-            seconds = uptime_seconds % 60
-            uptime_formatted = f"{days:02d}j {hours:02d}h {minutes:02d}m {seconds:02d}s"
-            
-            # Construire les données de stats avec mapping RTP
-            stats_data = {
-                'timestamp': datetime.now().isoformat(),
-                'messages_received': self.rtp_stats['received'],  # Messages RTP reçus
-                'messages_sent': self.rtp_stats['sent'],          # Messages RTP confirmés
-                'clients_connected': self.system_stats['clients_connected'],
-                'uptime_seconds': self.system_stats['uptime_seconds'],
-                'uptime': uptime_formatted,
-                'latency_ms': self.system_stats['latency_ms'],
-                'broker_version': self.system_stats['broker_version'],
-                'status': 'ok',
-                'rtp_details': {
-                    'received_count': self.rtp_stats['received'],
-                    'confirmed_count': self.rtp_stats['sent'],
-                    'difference': self.rtp_stats['received'] - self.rtp_stats['sent']
-                }
-            }
-            
-            # Publier les stats
-            self.stats_client.publish(
-                self.publish_topics['stats'],
-                json.dumps(stats_data)
-            )
-            
-            # Publier la liste des topics (toutes les 30 secondes)
-            if int(current_time) % 30 == 0:
-                topics_data = {
-                    'timestamp': datetime.now().isoformat(),
-                    'topics': self.active_topics,
-                    'count': len(self.active_topics)
-                }
-                
-                self.stats_client.publish(
-                    self.publish_topics['topics'],
-                    json.dumps(topics_data)
-                )
-                
-                # Log périodique avec détails RTP
-                logger.info(
-                    f"Stats RTP - Reçus: {self.rtp_stats['received']}, "
-                    f"Confirmés: {self.rtp_stats['sent']}, "
-                    f"Différence: {self.rtp_stats['received'] - self.rtp_stats['sent']}, "
-                    f"Topics actifs: {len(self.active_topics)}"
-                )
-            
-            self.last_publish = current_time
-            
-        except Exception as e:
-            logger.error(f"Erreur publication stats: {e}")
+        topics_data = {
+            'timestamp': datetime.now().isoformat(),
+            'topics': self.active_topics,
+            'count': len(self.active_topics)
+        }
+        
+        self.connection.publish(
+            self.publish_topics['topics'],
+            json.dumps(topics_data)
+        )
+        
+        # Log périodique avec détails RTP
+        missed = sum(job['missed'] for job in self.scheduler.get_stats().values())
+        logger.info(
+            f"Stats RTP - Reçus: {self.rtp_stats['received']}, "
+            f"Confirmés: {self.rtp_stats['sent']}, "
+            f"Différence: {self.rtp_stats['received'] - self.rtp_stats['sent']}, "
+            f"Topics actifs: {len(self.active_topics)}, "
+            f"Échéances manquées: {missed}"
+        )
     
     def cleanup_old_topics(self):
-        """Nettoie les topics inactifs"""
-        current_time = time.time()
-        timeout = 300  # 5 minutes
+        """Nettoie les topics inactifs (tâche 'cleanup')"""
+        current_time = self.clock.monotonic()
         
         # Identifier les topics à supprimer
         topics_to_remove = [
             topic for topic, last_seen in self.topic_last_seen.items()
-            if current_time - last_seen > timeout
+            if current_time - last_seen > self.topic_timeout
         ]
         
         # Supprimer les topics inactifs
@@ -372,17 +549,18 @@ class MQTTStatsCollector:
             logger.error("Impossible de se connecter à MQTT")
             return
         
+        if not self.connection.wait_ready(10):
+            logger.warning("Broker MQTT pas encore disponible - publication à la connexion")
+        
         try:
             while True:
-                # Publier les stats
-                self.publish_stats()
+                self.clock.check_step()
                 
-                # Nettoyer les vieux topics (toutes les minutes)
-                if int(time.time()) % 60 == 0:
-                    self.cleanup_old_topics()
+                # Tâches échues: stats, liste des topics, nettoyage, sonde, config
+                self.scheduler.run_pending()
                 
-                # Pause
-                time.sleep(1)
+                # Pause jusqu'à la prochaine échéance: traite les messages routés
+                self.connection.dispatch(min(self.scheduler.time_until_next(), MAX_DISPATCH_WAIT))
                 
         except KeyboardInterrupt:
             logger.info("Arrêt demandé")
@@ -391,17 +569,18 @@ class MQTTStatsCollector:
         finally:
             self.cleanup()
     
+    def on_clock_step(self, step):
+        """Saut de l'heure système: la planification monotone continue,
+        les compteurs sont conservés; publication à la nouvelle heure"""
+        logger.warning(f"Saut de l'heure système détecté: {step:+.1f}s (compteurs conservés)")
+        self.scheduler.run_soon('stats')
+    
     def cleanup(self):
         """Nettoyage avant arrêt"""
         logger.info("Arrêt du collecteur...")
         
-        if self.stats_client:
-            self.stats_client.loop_stop()
-            self.stats_client.disconnect()
-            
-        if self.monitor_client:
-            self.monitor_client.loop_stop()
-            self.monitor_client.disconnect()
+        if self.connection:
+            self.connection.stop()
             
         logger.info("Collecteur arrêté")
 
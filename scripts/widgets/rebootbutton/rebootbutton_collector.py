@@ -9,7 +9,6 @@ import sys
 import time
 import json
 import logging
-import subprocess
 from datetime import datetime
 
 # Configuration du logging
@@ -158,6 +157,9 @@ class RebootButtonCollector:
     
     def execute_system_reboot(self):
         """Exécute le redémarrage système"""
+        # Import différé: utilisé uniquement au redémarrage
+        import subprocess
+        
         try:
             logger.info("Exécution du redémarrage système...")
             
@@ -6,12 +6,10 @@ Version avec support USB MAXLINKSAVE
 
 import os
 import sys
-import time
 import json
 import logging
 from datetime import datetime
 from pathlib import Path
-import subprocess
 
 # Configuration du logging
 logging.basicConfig(
@@ -39,7 +37,7 @@ except ImportError:
 # IMPORTANT: Ajouter le chemin du core au PYTHONPATH
 sys.path.insert(0, '/opt/maxlink/widgets/_core')
 try:
-    from collector_base import BaseCollector
+    from collector_base import BaseCollector, config_changed
 except ImportError:
     logger.error("Impossible d'importer BaseCollector depuis /opt/maxlink/widgets/_core")
     sys.exit(1)
@@ -49,22 +47,42 @@ class SystemMetricsCollector(BaseCollector):
         """Initialise le collecteur avec la configuration du widget"""
         super().__init__(config_file, 'servermonitoring')
         
-        # Intervalles de mise à jour
-        self.intervals = {
-            'fast': 1,    # CPU usage, Fréquences, RAM/SWAP
-            'normal': 5,  # Températures
-            'slow': 30    # Disk et USB
-        }
+        # Intervalles de mise à jour (section collector.update_intervals)
+        self.intervals = self._read_intervals(self.config)
         
+        # Instants monotones des dernières collectes (-inf: dues au premier tick)
         self.last_update = {
-            'fast': 0,
-            'normal': 0,
-            'slow': 0
+            'fast': float('-inf'),
+            'normal': float('-inf'),
+            'slow': float('-inf')
         }
         
         # Cache pour le point de montage USB
         self.usb_mount_point = None
-        self.last_usb_check = 0
+        self.last_usb_check = float('-inf')
+    
+    def _read_intervals(self, config):
+        """Intervalles fast (CPU, fréquences, RAM/SWAP), normal (températures), slow (disque, USB)"""
+        configured = config.get('collector', {}).get('update_intervals', {})
+        return {
+            'fast': configured.get('fast', 1),
+            'normal': configured.get('normal', 5),
+            'slow': configured.get('slow', 30)
+        }
+    
+    def validate_config(self, config):
+        """Refuse les intervalles nuls ou non numériques"""
+        super().validate_config(config)
+        for name, interval in self._read_intervals(config).items():
+            if not isinstance(interval, (int, float)) or interval <= 0:
+                raise ValueError(f"intervalle {name} invalide: {interval}")
+    
+    def apply_config(self, config, changes):
+        """Applique les nouveaux intervalles sans redémarrage"""
+        if config_changed(changes, 'collector.update_intervals'):
+            self.intervals = self._read_intervals(config)
+            logger.info(f"Intervalles: Fast={self.intervals['fast']}s, Normal={self.intervals['normal']}s, Slow={self.intervals['slow']}s")
+        return []
     
     def on_mqtt_connected(self):
         """Appelé quand la connexion MQTT est établie"""
@@ -86,29 +104,39 @@ class SystemMetricsCollector(BaseCollector):
     
     def collect_and_publish(self):
         """Collecte et publie les données selon les intervalles définis"""
-        current_time = time.time()
+        current_time = self.clock.monotonic()
         
         # Groupe FAST (CPU, Fréquences, RAM/SWAP, Uptime)
         if current_time - self.last_update['fast'] >= self.intervals['fast']:
-            self.collect_cpu_metrics()
-            self.collect_frequency_metrics()
-            self.collect_memory_metrics()
-            self.collect_uptime_metrics()
+            with self.timed('cpu'):
+                self.collect_cpu_metrics()
+            with self.timed('frequency'):
+                self.collect_frequency_metrics()
+            with self.timed('memory'):
+                self.collect_memory_metrics()
+            with self.timed('uptime'):
+                self.collect_uptime_metrics()
             self.last_update['fast'] = current_time
         
         # Groupe NORMAL (Températures)
         if current_time - self.last_update['normal'] >= self.intervals['normal']:
-            self.collect_temperature_metrics()
+            with self.timed('temperature'):
+                self.collect_temperature_metrics()
             self.last_update['normal'] = current_time
         
         # Groupe SLOW (Disque et USB)
         if current_time - self.last_update['slow'] >= self.intervals['slow']:
-            self.collect_disk_metrics()
-            self.collect_usb_metrics()
+            with self.timed('disk'):
+                self.collect_disk_metrics()
+            with self.timed('usb'):
+                self.collect_usb_metrics()
             self.last_update['slow'] = current_time
     
     def find_usb_mount_point(self):
         """Trouve le point de montage de la clé USB MAXLINKSAVE"""
+        # Import différé: hors du chemin de la première publication
+        import subprocess
+        
         try:
             # Utiliser lsblk pour obtenir les informations sur les périphériques
             result = subprocess.run(['lsblk', '-J', '-o', 'NAME,LABEL,MOUNTPOINT,TYPE'], 
@@ -147,7 +175,7 @@ class SystemMetricsCollector(BaseCollector):
     def collect_usb_metrics(self):
         """Collecte les métriques de la clé USB MAXLINKSAVE"""
         try:
-            current_time = time.time()
+            current_time = self.clock.monotonic()
             
             # Rechercher le point de montage toutes les 60 secondes
             # ou si on n'a pas encore de point de montage
@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+"""
+Banc de mesure du chemin d'ingestion testpersist
+Pilote TestPersistCollector de bout en bout avec un générateur de scans
+ESP32 synthétiques, contre un broker en mémoire ou un mosquitto local
+
+Exemples:
+    python3 testpersist_bench.py --count 5000
+    python3 testpersist_bench.py --rate 50 --duration 60 --storage-dir /mnt/sd/bench
+    python3 testpersist_bench.py --broker mosquitto --host localhost --json bench.json
+    python3 testpersist_bench.py --allocations --count 5000
+"""
+
+import os
+import sys
+import json
+import time
+import array
+import queue
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import datetime
+from pathlib import Path
+
+WIDGET_DIR = Path(__file__).resolve().parent
+CORE_DIR = WIDGET_DIR.parent / '_core'
+
+# Le banc utilise les sources du dépôt, pas la copie installée dans /opt
+sys.path.insert(0, str(CORE_DIR))
+sys.path.insert(0, str(WIDGET_DIR))
+
+RTP_TOPIC = 'SOUFFLAGE/ESP32/RTP'
+CONFIRM_TOPIC = 'SOUFFLAGE/ESP32/RTP/CONFIRMED'
+MACHINES = ('509', '511', '998', '999')
+TEAMS = ('A', 'B', 'C')
+
+logger = logging.getLogger('testpersist_bench')
+
+# ===============================================================================
+# GÉNÉRATEUR DE CHARGE ESP32
+# ===============================================================================
+
+class ScanGenerator:
+    """Produit des lignes CSV réalistes date,heure,equipe,codebarre,resultat"""
+
+    def __init__(self, machines=MACHINES, pass_ratio=0.97, seed=None):
+        self.machines = machines
+        self.pass_ratio = pass_ratio
+        self.random = random.Random(seed)
+        self.sequence = 0
+
+    def next_line(self):
+        """Retourne une ligne unique (le numéro de série sert de clé de latence)"""
+        now = datetime.datetime.now()
+        self.sequence += 1
+
+        # Code-barres de 26 caractères, machine en positions 7 à 9
+        machine = self.random.choice(self.machines)
+        barcode = f"{self.random.randint(0, 999999):06d}{machine}{self.sequence:017d}"
+        result = '1' if self.random.random() < self.pass_ratio else '0'
+
+        return (
+            f"{now.strftime('%d/%m/%Y')},{now.hour:02d}H{now.minute:02d},"
+            f"{self.random.choice(TEAMS)},{barcode},{result}"
+        )
+
+# ===============================================================================
+# BROKER EN MÉMOIRE
+# ===============================================================================
+
+class FakeMessage:
+    __slots__ = ('topic', 'payload', 'qos', 'retain')
+
+    def __init__(self, topic, payload, qos=0, retain=False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+class FakePublishResult:
+    __slots__ = ('rc', 'mid')
+
+    def __init__(self, mid):
+        self.rc = 0
+        self.mid = mid
+
+class FakeClient:
+    """Client compatible paho: une file et un thread réseau par client"""
+
+    def __init__(self, broker, name):
+        self.broker = broker
+        self.name = name
+        self.on_message = None
+        self.inbox = queue.Queue()
+        self.thread = None
+        self.running = False
+        self.cpu_time = 0.0
+        self.delivered = 0
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscribe(topic, self)
+        return (0, 0)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        return self.broker.publish(topic, payload, qos, retain)
+
+    def deliver(self, message):
+        self.inbox.put(message)
+
+    def loop_start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._network_loop, name=f"fake-{self.name}", daemon=True)
+        self.thread.start()
+
+    def loop_stop(self):
+        self.running = False
+        self.inbox.put(None)
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def disconnect(self):
+        pass
+
+    def _network_loop(self):
+        start_cpu = time.thread_time()
+        while self.running:
+            message = self.inbox.get()
+            if message is None:
+                break
+            if self.on_message:
+                self.on_message(self, None, message)
+            self.delivered += 1
+            self.cpu_time = time.thread_time() - start_cpu
+
+class FakeBroker:
+    """Routage exact des topics (suffisant pour testpersist)"""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+        self.mid = 0
+
+    def client(self, name):
+        return FakeClient(self, name)
+
+    def subscribe(self, topic, client):
+        with self.lock:
+            self.subscriptions.setdefault(topic, []).append(client)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        with self.lock:
+            self.mid += 1
+            mid = self.mid
+            subscribers = list(self.subscriptions.get(topic, ()))
+        for client in subscribers:
+            client.deliver(FakeMessage(topic, payload, qos, retain))
+        return FakePublishResult(mid)
+
+# ===============================================================================
+# INSTRUMENTATION
+# ===============================================================================
+
+class SyncCounter:
+    """Compte les appels fsync/fdatasync du processus pendant la mesure"""
+
+    def __init__(self):
+        self.counts = {'fsync': 0, 'fdatasync': 0}
+        self.originals = {}
+
+    def install(self):
+        for name in self.counts:
+            original = getattr(os, name, None)
+            if original is None:
+                continue
+            self.originals[name] = original
+            setattr(os, name, self._wrap(name, original))
+
+    def uninstall(self):
+        for name, original in self.originals.items():
+            setattr(os, name, original)
+
+    def _wrap(self, name, original):
+        def counted(fd):
+            self.counts[name] += 1
+            return original(fd)
+        return counted
+
+    def reset(self):
+        for name in self.counts:
+            self.counts[name] = 0
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def directory_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+
+# ===============================================================================
+# BANC
+# ===============================================================================
+
+class IngestBenchmark:
+    """Mesure débit, latence de confirmation, fsync et CPU par message"""
+
+    def __init__(self, args):
+        self.args = args
+        self.generator = ScanGenerator(seed=args.seed)
+        self.send_times = {}
+        self.latencies = []
+        self.confirm_lock = threading.Lock()
+        self.all_confirmed = threading.Event()
+        self.expected = 0
+        self.sync_counter = SyncCounter()
+        self.collector = None
+        self.collector_client = None
+        self.bench_client = None
+        self.main_loop_running = False
+
+    def build_config(self, storage_dir):
+        """Copie la configuration du widget en redirigeant stockage et outbox"""
+        with open(WIDGET_DIR / 'testpersist_widget.json', 'r') as f:
+            config = json.load(f)
+
+        config['storage']['base_path'] = str(storage_dir)
+        config['storage'].setdefault('columnar_export', {})['enabled'] = False
+        config.setdefault('parser', {}).setdefault('quarantine', {})['file'] = str(Path(storage_dir) / 'quarantine.log')
+        # Outbox de production: des scans de test y resteraient en attente et
+        # seraient rejoués vers le vrai broker au prochain démarrage du service
+        config.setdefault('outbox', {})['path'] = str(Path(storage_dir) / 'outbox')
+
+        broker = config['mqtt']['broker']
+        broker['host'] = self.args.host
+        broker['port'] = self.args.port
+        if self.args.username:
+            broker['username'] = self.args.username
+        if self.args.password:
+            broker['password'] = self.args.password
+
+        config_path = Path(storage_dir) / 'testpersist_widget.json'
+        with open(config_path, 'w') as f:
+            json.dump(config, f, indent=2)
+        return config_path
+
+    def on_confirmation(self, client, userdata, msg):
+        received = time.perf_counter()
+        payload = msg.payload.decode('utf-8')
+        with self.confirm_lock:
+            sent = self.send_times.pop(payload, None)
+            if sent is None:
+                return
+            self.latencies.append(received - sent)
+            if len(self.latencies) >= self.expected:
+                self.all_confirmed.set()
+
+    def start_fake(self):
+        broker = FakeBroker()
+        self.collector_client = broker.client('testpersist')
+        self.bench_client = broker.client('bench')
+
+        self.collector.mqtt_client = self.collector_client
+        self.collector.connected = True
+        self.collector.initialize()
+        self.collector.on_mqtt_connected()
+        self.collector_client.loop_start()
+
+        self.bench_client.on_message = self.on_confirmation
+        self.bench_client.subscribe(CONFIRM_TOPIC)
+        self.bench_client.loop_start()
+
+    def start_mosquitto(self):
+        import paho.mqtt.client as mqtt
+
+        if not self.collector.connect_mqtt(timeout=30):
+            raise RuntimeError("Connexion du collecteur au broker impossible")
+        self.collector.initialize()
+
+        connected = threading.Event()
+        self.bench_client = mqtt.Client(client_id=f"testpersist_bench_{os.getpid()}")
+        if self.args.username:
+            self.bench_client.username_pw_set(self.args.username, self.args.password)
+        else:
+            broker = self.collector.mqtt_config
+            self.bench_client.username_pw_set(broker['username'], broker['password'])
+        self.bench_client.on_connect = lambda client, userdata, flags, rc: (
+            client.subscribe(CONFIRM_TOPIC, qos=1), connected.set()
+        )
+        self.bench_client.on_message = self.on_confirmation
+        self.bench_client.connect(self.args.host, self.args.port, 60)
+        self.bench_client.loop_start()
+
+        if not connected.wait(10):
+            raise RuntimeError("Client de charge non connecté")
+
+    def start_main_loop(self):
+        """Reproduit la boucle principale de BaseCollector (publications périodiques)"""
+        self.main_loop_running = True
+
+        def loop():
+            while self.main_loop_running:
+                self.collector.collect_and_publish()
+                time.sleep(self.collector.get_update_interval())
+
+        threading.Thread(target=loop, name='bench-main-loop', daemon=True).start()
+
+    def send(self, count, rate):
+        """Envoie count scans au débit demandé (0 = maximum)"""
+        interval = 1.0 / rate if rate > 0 else 0
+        next_send = time.perf_counter()
+
+        for _ in range(count):
+            line = self.generator.next_line()
+            with self.confirm_lock:
+                self.send_times[line] = time.perf_counter()
+            self.bench_client.publish(RTP_TOPIC, line, qos=1)
+
+            if interval:
+                next_send += interval
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def expect(self, expected):
+        """Réinitialise les mesures avant une série de expected scans"""
+        with self.confirm_lock:
+            self.expected = expected
+            self.latencies = []
+            self.send_times.clear()
+            self.all_confirmed.clear()
+
+    def run(self):
+        args = self.args
+        temp_dir = None
+
+        if args.storage_dir:
+            storage_dir = Path(args.storage_dir)
+            storage_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            temp_dir = tempfile.TemporaryDirectory(prefix='testpersist_bench_')
+            storage_dir = Path(temp_dir.name)
+
+        os.environ['CONFIG_FILE'] = str(self.build_config(storage_dir))
+
+        if not args.verbose:
+            logging.getLogger('testpersist_collector').setLevel(logging.WARNING)
+
+        from testpersist_collector import TestPersistCollector
+
+        self.sync_counter.install()
+        try:
+            self.collector = TestPersistCollector()
+
+            if args.broker == 'fake':
+                self.start_fake()
+            else:
+                self.start_mosquitto()
+            self.start_main_loop()
+
+            count = args.count if not args.duration else int(args.duration * args.rate)
+
+            # Échauffement exclu des mesures
+            if args.warmup:
+                self.expect(args.warmup)
+                self.send(args.warmup, args.rate)
+                self.all_confirmed.wait(args.timeout)
+            self.expect(count)
+            self.sync_counter.reset()
+
+            collector_cpu_start = self.collector_client.cpu_time if self.collector_client else 0.0
+            bytes_start = directory_size(storage_dir)
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+
+            self.send(count, args.rate)
+            self.all_confirmed.wait(args.timeout)
+
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            collector_cpu = (self.collector_client.cpu_time - collector_cpu_start) if self.collector_client else None
+
+            return self.build_report(count, wall, cpu, collector_cpu, directory_size(storage_dir) - bytes_start, storage_dir)
+
+        finally:
+            self.main_loop_running = False
+            self.sync_counter.uninstall()
+            for client in (self.bench_client, self.collector_client or (self.collector and self.collector.mqtt_client)):
+                if client:
+                    try:
+                        client.loop_stop()
+                        client.disconnect()
+                    except Exception:
+                        pass
+            if temp_dir:
+                temp_dir.cleanup()
+
+    def build_report(self, count, wall, cpu, collector_cpu, bytes_written, storage_dir):
+        with self.confirm_lock:
+            latencies = sorted(self.latencies)
+
+        confirmed = len(latencies)
+        to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+        fsyncs = self.sync_counter.counts['fsync'] + self.sync_counter.counts['fdatasync']
+
+        return {
+            'broker': self.args.broker,
+            'storage_dir': str(storage_dir) if self.args.storage_dir else 'tmp',
+            'rate_target': self.args.rate or 'max',
+            'sent': count,
+            'confirmed': confirmed,
+            'lost': count - confirmed,
+            'duration_s': round(wall, 3),
+            'throughput_msg_s': round(confirmed / wall, 1) if wall else None,
+            'latency_ms': {
+                'p50': to_ms(percentile(latencies, 0.50)),
+                'p90': to_ms(percentile(latencies, 0.90)),
+                'p99': to_ms(percentile(latencies, 0.99)),
+                'max': to_ms(latencies[-1] if latencies else None)
+            },
+            'fsync_calls': fsyncs,
+            'fsync_per_msg': round(fsyncs / confirmed, 3) if confirmed else None,
+            'bytes_written': bytes_written,
+            # En mode fake: CPU du seul thread réseau du collecteur
+            'collector_cpu_us_per_msg': round(collector_cpu * 1e6 / confirmed, 1) if collector_cpu is not None and confirmed else None,
+            # CPU total du processus (collecteur + générateur + broker en mémoire)
+            'process_cpu_us_per_msg': round(cpu * 1e6 / confirmed, 1) if confirmed else None
+        }
+
+# ===============================================================================
+# ALLOCATIONS PAR MESSAGE
+# ===============================================================================
+
+class SinkClient:
+    """Client synchrone: publie comme paho (str encodé en UTF-8, bytes tel quel)"""
+
+    def __init__(self):
+        self.published = 0
+        self.last_payload = None
+
+    def subscribe(self, topic, qos=0):
+        return (0, 0)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self.last_payload = payload
+        self.published += 1
+        return FakePublishResult(self.published)
+
+def measure_allocations(args):
+    """Mémoire allouée par scan sur on_message (tracemalloc)
+
+    Compare les payloads bytes (chemin actuel) avec les mêmes payloads
+    décodés en str, qui reproduisent l'ancien chemin décodage/découpage/
+    réencodage. Le pic transitoire est l'allocation maximale au-dessus de
+    la mémoire déjà tracée pendant le traitement d'un message.
+    """
+    with tempfile.TemporaryDirectory(prefix='testpersist_alloc_') as storage_dir:
+        os.environ['CONFIG_FILE'] = str(IngestBenchmark(args).build_config(storage_dir))
+        logging.getLogger('testpersist_collector').setLevel(logging.WARNING)
+
+        from testpersist_collector import TestPersistCollector
+
+        collector = TestPersistCollector()
+        collector.mqtt_client = SinkClient()
+        collector.connected = True
+        collector.initialize()
+
+        generator = ScanGenerator(seed=args.seed)
+        lines = [generator.next_line() for _ in range(args.count)]
+        json_keys = ('date', 'heure', 'equipe', 'codebarre', 'resultat')
+        csv_payloads = [line.encode('ascii') for line in lines]
+        json_payloads = [json.dumps(dict(zip(json_keys, line.split(',')))).encode('ascii') for line in lines]
+        variants = (
+            ('csv_bytes', csv_payloads, False),
+            ('csv_text', csv_payloads, True),
+            ('json_bytes', json_payloads, False)
+        )
+
+        def parse_and_confirm(message):
+            record, reason = collector.scan_parser.parse(message.payload)
+            collector.mqtt_client.publish(CONFIRM_TOPIC, record.confirmation, qos=1)
+
+        def handle(message):
+            collector.on_message(collector.mqtt_client, None, message)
+
+        def decoded(process):
+            """Ancien chemin: payload décodé en str avant traitement"""
+            def run(message):
+                payload = message.payload
+                message.payload = payload.decode('utf-8')
+                try:
+                    process(message)
+                finally:
+                    message.payload = payload
+            return run
+
+        # Chemin complet (avec écriture CSV) puis validation + confirmation seules
+        results = {}
+        for stage, process in (('on_message', handle), ('parse', parse_and_confirm)):
+            for name, payloads, decode in variants:
+                messages = [FakeMessage(RTP_TOPIC, payload) for payload in payloads]
+                results[f"{stage}/{name}"] = measure_stage(
+                    decoded(process) if decode else process, messages, args.warmup, collector.mqtt_client
+                )
+        return results
+
+def measure_stage(process, messages, warmup, client):
+    """Pic d'allocation, mémoire retenue et CPU par message pour une étape"""
+    for message in messages[:warmup]:
+        process(message)
+
+    # Temps CPU sans tracemalloc (le traçage ralentit chaque allocation)
+    cpu_start = time.process_time()
+    for message in messages:
+        process(message)
+    cpu = time.process_time() - cpu_start
+
+    # Tableaux préalloués: les mesures elles-mêmes ne sont pas tracées
+    peaks = array.array('q', bytes(8 * len(messages)))
+    retained = array.array('q', bytes(8 * len(messages)))
+    tracemalloc.start()
+    for message in messages[:warmup]:
+        process(message)
+    for index, message in enumerate(messages):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        process(message)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks[index] = peak - before
+        retained[index] = current - before
+    tracemalloc.stop()
+
+    # Médiane de la mémoire retenue: ignore les agrandissements ponctuels
+    # de tables globales (chaînes internées de pathlib, caches re)
+    peaks = sorted(peaks)
+    retained = sorted(retained)
+    return {
+        'messages': len(messages),
+        'peak_bytes_avg': round(sum(peaks) / len(peaks), 1),
+        'peak_bytes_p50': percentile(peaks, 0.50),
+        'peak_bytes_p99': percentile(peaks, 0.99),
+        'retained_bytes_p50': percentile(retained, 0.50),
+        'cpu_us_per_msg': round(cpu * 1e6 / len(messages), 1),
+        'confirmation_is_payload': client.last_payload is messages[-1].payload
+    }
+
+def print_allocation_report(results):
+    print("=" * 60)
+    print("Allocations par scan (on_message, tracemalloc)")
+    print("=" * 60)
+    for name, result in results.items():
+        print(f"{name:<22}: pic {result['peak_bytes_avg']:>8.0f} o (p50 {result['peak_bytes_p50']}, "
+              f"p99 {result['peak_bytes_p99']}) | retenu {result['retained_bytes_p50']} o | "
+              f"{result['cpu_us_per_msg']} µs CPU | confirmation = buffer reçu: "
+              f"{'oui' if result['confirmation_is_payload'] else 'non'}")
+
+def print_report(report):
+    latency = report['latency_ms']
+    print("=" * 60)
+    print(f"Banc testpersist - broker {report['broker']} - débit cible {report['rate_target']}")
+    print("=" * 60)
+    print(f"Messages      : {report['confirmed']}/{report['sent']} confirmés ({report['lost']} perdus)")
+    print(f"Durée         : {report['duration_s']} s")
+    print(f"Débit         : {report['throughput_msg_s']} msg/s")
+    print(f"Latence (ms)  : p50={latency['p50']} p90={latency['p90']} p99={latency['p99']} max={latency['max']}")
+    print(f"fsync         : {report['fsync_calls']} ({report['fsync_per_msg']} par message)")
+    print(f"Octets écrits : {report['bytes_written']}")
+    if report['collector_cpu_us_per_msg'] is not None:
+        print(f"CPU collecteur: {report['collector_cpu_us_per_msg']} µs/msg")
+    print(f"CPU processus : {report['process_cpu_us_per_msg']} µs/msg")
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de mesure de l'ingestion testpersist")
+    parser.add_argument('--broker', choices=('fake', 'mosquitto'), default='fake',
+                        help="Broker en mémoire ou mosquitto réel")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--count', type=int, default=2000, help="Nombre de scans mesurés")
+    parser.add_argument('--rate', type=float, default=0, help="Scans par seconde (0 = maximum)")
+    parser.add_argument('--duration', type=float, help="Durée en secondes (remplace --count, requiert --rate)")
+    parser.add_argument('--warmup', type=int, default=100, help="Scans d'échauffement non mesurés")
+    parser.add_argument('--timeout', type=float, default=60, help="Attente maximale des confirmations")
+    parser.add_argument('--storage-dir', help="Répertoire de stockage à mesurer (carte SD, clé USB...)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Écrit le rapport JSON dans ce fichier (suivi des régressions)")
+    parser.add_argument('--verbose', action='store_true', help="Conserve les logs INFO du collecteur")
+    parser.add_argument('--allocations', action='store_true',
+                        help="Mesure la mémoire allouée par scan (tracemalloc) au lieu du débit")
+    args = parser.parse_args()
+
+    if args.duration and not args.rate:
+        parser.error("--duration nécessite --rate")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    if args.allocations:
+        results = measure_allocations(args)
+        print_allocation_report(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+        return
+
+    report = IngestBenchmark(args).run()
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(0 if report['lost'] == 0 else 1)
+
+if __name__ == "__main__":
+    main()
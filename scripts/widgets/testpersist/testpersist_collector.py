@@ -6,22 +6,26 @@ Version 3.0 - Architecture 1: Extension Simple
 """
 
 import os
+import re
 import sys
 import threading
 import datetime
 import glob
-import shutil
+import hashlib
 from pathlib import Path
 
 # Ajouter le répertoire parent au path pour l'import
 sys.path.insert(0, '/opt/maxlink/widgets/_core')
 
 try:
-    from collector_base import BaseCollector
+    from collector_base import BaseCollector, config_changed
 except ImportError:
     print("Erreur: collector_base.py non trouvé dans /opt/maxlink/widgets/_core")
     sys.exit(1)
 
+from testpersist_stats import YieldAggregator
+from testpersist_schema import ScanParser, Quarantine
+
 class TestPersistCollector(BaseCollector):
     """Collecteur pour la persistance des résultats de tests CSV avec traçabilité hebdomadaire"""
     
@@ -38,14 +42,46 @@ class TestPersistCollector(BaseCollector):
         self.machine_pos_start = barcode_config.get('start', 6)
         self.machine_pos_length = barcode_config.get('length', 3)
         
+        # Parseur compilé une seule fois depuis le schéma de la configuration
+        parser_config = self.config.get('parser', {})
+        self.scan_parser = ScanParser(parser_config, barcode_config)
+        quarantine_config = parser_config.get('quarantine', {})
+        self.quarantine = Quarantine(
+            quarantine_config.get('file', '/var/lib/maxlink/testpersist/quarantine.log'),
+            quarantine_config.get('enabled', True),
+            quarantine_config.get('max_bytes', 10 * 1024 * 1024)
+        )
+        
         # Configuration de la traçabilité hebdomadaire
         self.weekly_config = self.storage_config.get('weekly_tracking', {})
         self.archives_enabled = self.weekly_config.get('enabled', True)
         self.archives_subdir = self.weekly_config.get('archives_folder', 'Archives')
+        self.hash_sidecars_enabled = self.weekly_config.get('hash_sidecars', True)
         
         # Répertoire d'archives
         self.archives_path = self.base_path / self.archives_subdir
         
+        # Export colonnaire des semaines closes (analyses qualité)
+        # L'exportateur (numpy, pyarrow) n'est construit qu'au premier export
+        self.export_config = self.storage_config.get('columnar_export', {})
+        self.exporter = None
+        self.export_lock = threading.Lock()
+        self.export_thread = None
+        self.export_pending = False
+        
+        # Agrégation temps réel des taux de réussite
+        self.live_stats_config = self.config.get('live_stats', {})
+        self.live_stats_topic = self.live_stats_config.get('topic', 'SOUFFLAGE/ESP32/RTP/YIELD')
+        self.live_stats_interval = self.live_stats_config.get('publish_interval', 5)
+        self.last_live_stats_publish = float('-inf')
+        self.yield_aggregator = None
+        if self.live_stats_config.get('enabled', False):
+            self.yield_aggregator = YieldAggregator(
+                self.live_stats_config.get('window_minutes', 60),
+                self.live_stats_config.get('shifts'),
+                str(self.live_stats_config.get('pass_value', '1'))
+            )
+        
         # Variables de suivi de semaine
         self.current_year, self.current_week = self._get_current_week_info()
         self.last_known_week = None
@@ -92,6 +128,8 @@ class TestPersistCollector(BaseCollector):
             # Archiver les fichiers de semaines précédentes s'ils existent
             if self.archives_enabled:
                 self._archive_previous_weeks()
+                self._ensure_archive_hashes()
+                self._start_columnar_export()
             
             # S'assurer que les fichiers de la semaine courante existent
             self._ensure_current_week_files_exist()
@@ -152,6 +190,9 @@ class TestPersistCollector(BaseCollector):
     
     def _archive_previous_weeks(self):
         """Archive automatiquement les fichiers de semaines précédentes"""
+        # Import différé: archivage hebdomadaire uniquement
+        import shutil
+        
         with self.archive_lock:
             previous_files = self._find_previous_week_files()
             
@@ -176,12 +217,142 @@ class TestPersistCollector(BaseCollector):
                     self.logger.info(f"Fichier archivé: {file_path.name} → Archives/{file_year}/")
                     archived_count += 1
                     
+                    # Semaine close: le fichier est désormais immuable
+                    self._write_content_hash(archive_dest)
+                    
                 except Exception as e:
                     self.logger.error(f"Erreur archivage {file_path.name}: {e}")
             
             if archived_count > 0:
                 self.logger.info(f"Archivage terminé: {archived_count} fichier(s) déplacé(s)")
     
+    def _start_columnar_export(self):
+        """Lance l'export colonnaire des archives en arrière-plan
+        
+        Un seul thread d'export à la fois: une demande arrivant pendant un
+        export en cours est regroupée en un passage supplémentaire.
+        """
+        if not self.export_config.get('enabled', False):
+            return
+        
+        with self.export_lock:
+            self.export_pending = True
+            if self.export_thread is not None:
+                return
+            
+            # Ne pas ralentir la persistance des scans pendant la conversion
+            self.export_thread = threading.Thread(
+                target=self._run_columnar_export,
+                name='testpersist-export',
+                daemon=True
+            )
+            self.export_thread.start()
+    
+    def _run_columnar_export(self):
+        """Boucle du thread d'export: un passage par demande en attente"""
+        while True:
+            with self.export_lock:
+                if not self.export_pending:
+                    self.export_thread = None
+                    return
+                self.export_pending = False
+            
+            exporter = self._get_exporter()
+            if exporter is None or not exporter.enabled:
+                with self.export_lock:
+                    self.export_pending = False
+                    self.export_thread = None
+                return
+            
+            try:
+                exporter.export_archives(self.archives_path)
+            except Exception as e:
+                self.logger.error(f"Erreur export colonnaire: {e}")
+    
+    def _get_exporter(self):
+        """Construit l'exportateur au premier export (thread d'export uniquement)"""
+        if self.exporter is None:
+            try:
+                # Import différé: numpy/pyarrow pour un export au plus hebdomadaire
+                from testpersist_export import TraceabilityExporter
+            except ImportError as e:
+                self.logger.error(f"Export colonnaire indisponible: {e}")
+                return None
+            
+            self.exporter = TraceabilityExporter(
+                self.export_config.get('path', '/var/lib/maxlink/testpersist/columnar'),
+                self.machine_pos_start,
+                self.machine_pos_length,
+                self.export_config.get('format', 'auto'),
+                self.logger
+            )
+        return self.exporter
+    
+    def _get_hash_sidecar_path(self, file_path):
+        """Retourne le chemin du fichier d'empreinte associé à un fichier archivé"""
+        return file_path.with_name(file_path.name + '.sha256')
+    
+    def _write_content_hash(self, file_path):
+        """Écrit l'empreinte SHA-256 d'une semaine close (format sha256sum)
+        
+        Utilisée par download-archive.php comme ETag fort et pour les
+        reprises de téléchargement (Range / If-Range).
+        """
+        if not self.hash_sidecars_enabled:
+            return False
+        
+        sidecar_path = self._get_hash_sidecar_path(file_path)
+        tmp_path = sidecar_path.with_name(sidecar_path.name + '.tmp')
+        
+        try:
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+            
+            # Écriture atomique pour ne jamais exposer une empreinte partielle
+            with open(tmp_path, 'w', encoding='ascii') as f:
+                f.write(f"{digest.hexdigest()}  {file_path.name}\n")
+            os.replace(tmp_path, sidecar_path)
+            
+            self.logger.debug(f"Empreinte écrite: {sidecar_path.name}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Erreur calcul empreinte {file_path.name}: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return False
+    
+    def _ensure_archive_hashes(self):
+        """Crée les empreintes manquantes ou périmées des semaines déjà archivées"""
+        if not self.hash_sidecars_enabled or not self.archives_path.exists():
+            return
+        
+        created_count = 0
+        
+        for year_dir in self.archives_path.iterdir():
+            if not (year_dir.is_dir() and year_dir.name.isdigit()):
+                continue
+            
+            for archive_file in year_dir.glob(f"S*_{year_dir.name}_*.csv"):
+                sidecar_path = self._get_hash_sidecar_path(archive_file)
+                
+                try:
+                    if (sidecar_path.exists() and
+                            sidecar_path.stat().st_mtime >= archive_file.stat().st_mtime):
+                        continue
+                except OSError:
+                    continue
+                
+                if self._write_content_hash(archive_file):
+                    created_count += 1
+        
+        if created_count > 0:
+            self.logger.info(f"Empreintes d'archives créées: {created_count}")
+    
     def _ensure_current_week_files_exist(self):
         """S'assure que tous les fichiers de la semaine courante existent"""
         # Obtenir toutes les machines uniques de la configuration
@@ -214,11 +385,8 @@ class TestPersistCollector(BaseCollector):
         if (current_year, current_week) != (self.current_year, self.current_week):
             self.logger.info(f"Changement de semaine détecté: S{self.current_week}/{self.current_year} → S{current_week}/{current_year}")
             
-            # Archiver les fichiers de la semaine précédente
-            if self.archives_enabled:
-                self._archive_previous_weeks()
-            
-            # Mettre à jour les variables de semaine courante
+            # Mettre à jour les variables de semaine courante (avant l'archivage:
+            # _find_previous_week_files compare à la semaine courante)
             self.current_year = current_year
             self.current_week = current_week
             
@@ -228,6 +396,15 @@ class TestPersistCollector(BaseCollector):
             # Réinitialiser les verrous pour les nouveaux fichiers
             self._initialize_file_locks()
             
+            # Archiver la semaine qui vient de se terminer, puis l'exporter
+            if self.archives_enabled:
+                self._archive_previous_weeks()
+                self._start_columnar_export()
+            
+            # Le cumul hebdomadaire repart de zéro
+            if self.yield_aggregator:
+                self.yield_aggregator.reset_week()
+            
             self.logger.info(f"Transition vers semaine S{self.current_week}/{self.current_year} terminée")
     
     def initialize(self):
@@ -237,36 +414,139 @@ class TestPersistCollector(BaseCollector):
         self.logger.info(f"Semaine courante: S{self.current_week:02d}_{self.current_year}")
         self.logger.info(f"Archives activées: {self.archives_enabled}")
         
+        # Reconstituer les compteurs temps réel depuis la semaine courante
+        if self.yield_aggregator:
+            self._recover_live_stats()
+        
         # Configuration explicite du callback MQTT
         self.mqtt_client.on_message = self.on_message
     
+    def _recover_live_stats(self):
+        """Relit les CSV de la semaine courante pour restaurer les compteurs"""
+        recovered = 0
+        filenames = {self._get_current_week_filename(machine_id) for machine_id in self.file_mapping}
+        
+        for filename in sorted(filenames):
+            filepath = self.base_path / filename
+            if not filepath.exists():
+                continue
+            
+            try:
+                with open(filepath, 'r', encoding='utf-8', newline='') as f:
+                    for line in f:
+                        record, reason = self.scan_parser.parse(line)
+                        if record and self._record_live_stats(record):
+                            recovered += 1
+                            
+            except Exception as e:
+                self.logger.error(f"Erreur relecture {filename}: {e}")
+        
+        self.logger.info(f"Compteurs temps réel restaurés: {recovered} scan(s) de la semaine courante")
+    
+    def _get_subscribe_topics(self, config):
+        """Topics des scans ESP32 (section mqtt.topics.subscribe)"""
+        entries = config['mqtt'].get('topics', {}).get('subscribe', [])
+        return [entry['topic'] for entry in entries if 'topic' in entry] or ["SOUFFLAGE/ESP32/RTP"]
+    
     def on_mqtt_connected(self):
         """Appelé quand la connexion MQTT est établie"""
-        topic = "SOUFFLAGE/ESP32/RTP"
-        result = self.mqtt_client.subscribe(topic)
-        self.logger.info(f"Abonné au topic: {topic}")
+        for topic in self._get_subscribe_topics(self.config):
+            self.mqtt_client.subscribe(topic)
+            self.logger.info(f"Abonné au topic: {topic}")
+    
+    def validate_config(self, config):
+        """Refuse un schéma de parseur ou une table de machines invalides"""
+        super().validate_config(config)
+        
+        storage_config = config.get('storage', {})
+        if not isinstance(storage_config.get('file_mapping', {}), dict):
+            raise ValueError("storage.file_mapping doit être un objet")
+        
+        try:
+            ScanParser(config.get('parser', {}), storage_config.get('barcode_machine_position', {}))
+        except (KeyError, TypeError, re.error) as e:
+            raise ValueError(f"schéma de parseur invalide: {e}")
+    
+    def apply_config(self, config, changes):
+        """Applique à chaud les machines, le schéma, les topics et les statistiques"""
+        restart_required = [
+            change for change in changes
+            if config_changed([change], 'storage.base_path', 'storage.weekly_tracking',
+                              'storage.columnar_export', 'parser.quarantine',
+                              'live_stats.enabled', 'live_stats.window_minutes',
+                              'live_stats.shifts', 'live_stats.pass_value')
+        ]
+        storage_config = config.get('storage', {})
+        
+        if config_changed(changes, 'storage.file_mapping'):
+            file_mapping = storage_config.get('file_mapping', {})
+            added = sorted(set(file_mapping) - set(self.file_mapping))
+            removed = sorted(set(self.file_mapping) - set(file_mapping))
+            
+            # Remplacement atomique: le thread MQTT lit l'une ou l'autre table
+            self.file_mapping = file_mapping
+            self._ensure_current_week_files_exist()
+            self.logger.info(f"Machines surveillées: {list(file_mapping)} (ajoutées: {added}, retirées: {removed})")
+        
+        if config_changed(changes, 'parser', 'storage.barcode_machine_position'):
+            barcode_config = storage_config.get('barcode_machine_position', {})
+            self.scan_parser = ScanParser(config.get('parser', {}), barcode_config)
+            self.logger.info("Schéma du parseur recompilé")
+        
+        if config_changed(changes, 'live_stats.topic', 'live_stats.publish_interval'):
+            live_stats_config = config.get('live_stats', {})
+            self.live_stats_topic = live_stats_config.get('topic', 'SOUFFLAGE/ESP32/RTP/YIELD')
+            self.live_stats_interval = live_stats_config.get('publish_interval', 5)
+        
+        if config_changed(changes, 'mqtt.topics.subscribe'):
+            self.update_subscriptions(self._get_subscribe_topics(self.config), self._get_subscribe_topics(config))
+        
+        self.storage_config = storage_config
+        self.live_stats_config = config.get('live_stats', {})
+        return restart_required
     
     def get_update_interval(self):
         """Retourne l'intervalle de mise à jour en secondes"""
         return 1  # Widget event-driven
     
     def collect_and_publish(self):
-        """Collecte et publie les données - Non utilisé car event-driven"""
-        pass
+        """Publie périodiquement le résumé des taux de réussite (persistance event-driven)"""
+        if not self.yield_aggregator:
+            return
+        
+        current_time = self.clock.monotonic()
+        if current_time - self.last_live_stats_publish < self.live_stats_interval:
+            return
+        
+        self.publish_data(self.live_stats_topic, self.yield_aggregator.summary())
+        self.last_live_stats_publish = current_time
     
-    def on_connect(self, client, userdata, flags, rc):
-        """Callback de connexion MQTT"""
-        if rc == 0:
-            self.logger.info("Connecté au broker MQTT")
-            self.connected = True
-            
-            try:
-                self.on_mqtt_connected()
-            except Exception as e:
-                self.logger.error(f"Erreur dans on_mqtt_connected: {e}")
-        else:
-            self.logger.error(f"Échec connexion MQTT, code: {rc}")
-            self.connected = False
+    def _record_live_stats(self, record):
+        """Alimente l'agrégation temps réel avec un scan validé"""
+        if not self.yield_aggregator:
+            return False
+        
+        raw = record.raw
+        return self.yield_aggregator.record(
+            raw.get('date', ''), raw.get('heure', ''), raw.get('equipe', ''),
+            record.segments.get('machine', ''), raw.get('resultat', '')
+        )
+    
+    def _reject_message(self, payload, reason):
+        """Met un message invalide en quarantaine avec sa raison"""
+        self.stats['errors'] += 1
+        self.logger.warning(f"Message mis en quarantaine ({reason})")
+        if not self.quarantine.add(payload, reason):
+            self.logger.error(f"Écriture quarantaine impossible: {self.quarantine.path}")
+    
+    def log_statistics(self):
+        """Affiche les statistiques, y compris les rejets par raison"""
+        super().log_statistics()
+        
+        reason_counts = self.quarantine.get_counts()
+        if reason_counts:
+            details = ', '.join(f"{reason}: {count}" for reason, count in sorted(reason_counts.items()))
+            self.logger.info(f"Quarantaine - {details}")
     
     def on_message(self, client, userdata, msg):
         """Traitement des messages MQTT avec vérification de changement de semaine"""
@@ -274,40 +554,32 @@ class TestPersistCollector(BaseCollector):
             # Vérifier si la semaine a changé avant de traiter le message
             self._check_week_change()
             
-            # Décoder le message CSV
-            csv_line = msg.payload.decode('utf-8').strip()
+            # Valider et typer le payload selon le schéma compilé
+            record, reason = self.scan_parser.parse(msg.payload)
             
-            # Parser la ligne CSV: date,heure,équipe,codebarre,résultat
-            csv_fields = csv_line.split(',')
-            
-            if len(csv_fields) != 5:
-                self.logger.error(f"Format CSV invalide - {len(csv_fields)} champs au lieu de 5")
+            if record is None:
+                self._reject_message(msg.payload, reason)
                 return
             
-            date, heure, equipe, codebarre, resultat = csv_fields
-            
-            # Vérifier la longueur du code-barres
-            if len(codebarre) < self.machine_pos_start + self.machine_pos_length:
-                self.logger.error(f"Code-barres trop court: {codebarre}")
-                return
-            
-            # Extraire le numéro de machine
-            machine_id = codebarre[self.machine_pos_start:self.machine_pos_start + self.machine_pos_length]
+            # Numéro de machine extrait du code-barres
+            machine_id = record.segments.get('machine')
             
             # Vérifier que la machine est connue
             if machine_id not in self.file_mapping:
-                self.logger.warning(f"Machine non configurée: {machine_id}")
+                self._reject_message(msg.payload, 'unknown_machine')
                 return
             
             # Déterminer le fichier de destination (semaine courante)
             filename = self._get_current_week_filename(machine_id)
             filepath = self.base_path / filename
             
-            # Persister les données CSV
-            if self.persist_csv_data(filepath, csv_line):
+            # Persister les données CSV (format canonique, même pour un payload JSON)
+            if self.persist_csv_data(filepath, record.csv_line):
+                self._record_live_stats(record)
+                
                 # Publication de la confirmation après persistance réussie
                 confirm_topic = "SOUFFLAGE/ESP32/RTP/CONFIRMED"
-                if self.mqtt_publish(confirm_topic, csv_line):
+                if self.mqtt_publish(confirm_topic, record.confirmation):
                     self.logger.info(f"Résultat persisté et confirmé: {machine_id} -> {filename}")
                 else:
                     self.logger.error(f"Échec publication confirmation")
@@ -326,15 +598,17 @@ class TestPersistCollector(BaseCollector):
                 lock = threading.Lock()
                 self.file_locks[str(filepath)] = lock
             
+            # Ligne reçue écrite telle quelle, sans réencodage
+            if isinstance(csv_line, str):
+                csv_line = csv_line.encode('utf-8')
+            data = csv_line + b'\r\n'
+            
             with lock:
-                # S'assurer que le fichier existe
-                if not filepath.exists():
-                    filepath.touch()
-                
-                # Écriture en mode append
-                with open(filepath, 'a', encoding='utf-8', newline='') as f:
-                    f.write(csv_line + '\r\n')
-                    f.flush()
+                # Append non tamponné (crée le fichier si besoin): un seul
+                # write(), sans allouer le tampon de 8 Ko d'un BufferedWriter
+                with open(filepath, 'ab', buffering=0) as f:
+                    if f.write(data) != len(data):
+                        raise OSError("écriture partielle")
                     
                 return True
                 
@@ -343,7 +617,7 @@ class TestPersistCollector(BaseCollector):
             return False
     
     def mqtt_publish(self, topic, message):
-        """Publie un message CSV sur MQTT"""
+        """Publie un message CSV sur MQTT (bytes transmis sans copie)"""
         if not self.connected:
             return False
         
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Export colonnaire des données de traçabilité MaxLink
+Convertit les semaines closes (CSV date,heure,equipe,codebarre,resultat)
+en colonnes typées compactes pour les analyses qualité
+"""
+
+import os
+import sys
+import json
+import datetime
+import logging
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger('testpersist_export')
+
+# Jour 0 des colonnes 'day' (jours depuis le 01/01/1970)
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Colonnes dictionnaire-encodées: codes entiers + table de valeurs
+DICTIONARY_COLUMNS = ('team', 'machine', 'barcode')
+VALUE_COLUMNS = ('day', 'minute', 'result')
+
+def available_format(preferred='auto'):
+    """Retourne le format d'export utilisable selon les modules installés"""
+    if preferred in ('auto', 'parquet') and pa is not None and np is not None:
+        return 'parquet'
+    if preferred in ('auto', 'npz') and np is not None:
+        return 'npz'
+    return None
+
+def _encode(value, index, dictionary):
+    """Dictionnaire-encode une valeur en réutilisant la table existante"""
+    code = index.get(value)
+    if code is None:
+        code = len(dictionary)
+        index[value] = code
+        dictionary.append(value)
+    return code
+
+def parse_week_csv(csv_path, machine_start=6, machine_length=3):
+    """Lit un fichier CSV de semaine et retourne les colonnes typées
+
+    Retourne (columns, dictionaries, skipped) où columns contient des
+    tableaux NumPy et dictionaries les tables de valeurs des colonnes
+    encodées.
+    """
+    columns = {name: [] for name in DICTIONARY_COLUMNS + VALUE_COLUMNS}
+    indexes = {name: {} for name in DICTIONARY_COLUMNS}
+    dictionaries = {name: [] for name in DICTIONARY_COLUMNS}
+    skipped = 0
+    machine_end = machine_start + machine_length
+
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) != 5:
+                skipped += 1
+                continue
+
+            date, heure, equipe, codebarre, resultat = fields
+
+            try:
+                day, month, year = date.split('/')
+                hours, minutes = heure.upper().split('H')
+                day_number = datetime.date(int(year), int(month), int(day)).toordinal() - EPOCH_ORDINAL
+                minute_of_day = int(hours) * 60 + int(minutes)
+                result = int(resultat)
+            except ValueError:
+                skipped += 1
+                continue
+
+            if len(codebarre) < machine_end:
+                skipped += 1
+                continue
+
+            columns['day'].append(day_number)
+            columns['minute'].append(minute_of_day)
+            columns['result'].append(result)
+            columns['team'].append(_encode(equipe, indexes['team'], dictionaries['team']))
+            columns['machine'].append(_encode(codebarre[machine_start:machine_end], indexes['machine'], dictionaries['machine']))
+            columns['barcode'].append(_encode(codebarre, indexes['barcode'], dictionaries['barcode']))
+
+    typed = {
+        'day': np.asarray(columns['day'], dtype=np.int32),
+        'minute': np.asarray(columns['minute'], dtype=np.int16),
+        'result': np.asarray(columns['result'], dtype=np.int8),
+        'team': np.asarray(columns['team'], dtype=np.uint8 if len(dictionaries['team']) < 256 else np.uint32),
+        'machine': np.asarray(columns['machine'], dtype=np.uint16),
+        'barcode': np.asarray(columns['barcode'], dtype=np.uint32)
+    }
+
+    return typed, dictionaries, skipped
+
+def _write_npz(output_path, columns, dictionaries):
+    """Écrit les colonnes dans un fichier .npz compressé"""
+    arrays = dict(columns)
+    for name in DICTIONARY_COLUMNS:
+        arrays[f"{name}_dictionary"] = np.asarray(dictionaries[name], dtype=str)
+
+    # np.savez ajoute '.npz' si absent: écrire dans un fichier ouvert
+    with open(output_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+def _write_parquet(output_path, columns, dictionaries):
+    """Écrit les colonnes dans un fichier Parquet avec colonnes dictionnaire"""
+    fields = {}
+    for name in VALUE_COLUMNS:
+        fields[name] = pa.array(columns[name])
+    for name in DICTIONARY_COLUMNS:
+        fields[name] = pa.DictionaryArray.from_arrays(
+            pa.array(columns[name].astype(np.int32)),
+            pa.array(dictionaries[name], type=pa.string())
+        )
+
+    pq.write_table(pa.table(fields), str(output_path), compression='zstd')
+
+def _read_npz(path, names):
+    """Lit les colonnes demandées d'un fichier .npz (chargement paresseux)"""
+    columns = {}
+    dictionaries = {}
+
+    with np.load(path, allow_pickle=False) as data:
+        for name in names:
+            columns[name] = data[name]
+            if name in DICTIONARY_COLUMNS:
+                dictionaries[name] = data[f"{name}_dictionary"].tolist()
+
+    return columns, dictionaries
+
+def _read_parquet(path, names):
+    """Lit les colonnes demandées d'un fichier Parquet"""
+    table = pq.read_table(str(path), columns=list(names))
+    columns = {}
+    dictionaries = {}
+
+    for name in names:
+        column = table.column(name).combine_chunks()
+        if name in DICTIONARY_COLUMNS:
+            if not pa.types.is_dictionary(column.type):
+                column = column.dictionary_encode()
+            columns[name] = column.indices.to_numpy(zero_copy_only=False)
+            dictionaries[name] = column.dictionary.to_pylist()
+        else:
+            columns[name] = column.to_numpy(zero_copy_only=False)
+
+    return columns, dictionaries
+
+class TraceabilityExporter:
+    """Convertit les semaines archivées en fichiers colonnaires"""
+
+    def __init__(self, export_path, machine_start=6, machine_length=3, export_format='auto', log=None):
+        self.export_path = Path(export_path)
+        self.machine_start = machine_start
+        self.machine_length = machine_length
+        self.format = available_format(export_format)
+        self.logger = log or logger
+
+        if self.format is None:
+            self.logger.warning("Export colonnaire désactivé: numpy non installé")
+
+    @property
+    def enabled(self):
+        return self.format is not None
+
+    def get_output_path(self, csv_path):
+        """Retourne le chemin du fichier colonnaire d'une semaine"""
+        csv_path = Path(csv_path)
+        extension = '.parquet' if self.format == 'parquet' else '.npz'
+        return self.export_path / csv_path.parent.name / (csv_path.stem + extension)
+
+    def export_week(self, csv_path, force=False):
+        """Exporte une semaine close; ignore les exports déjà à jour"""
+        if not self.enabled:
+            return None
+
+        csv_path = Path(csv_path)
+        output_path = self.get_output_path(csv_path)
+
+        try:
+            if (not force and output_path.exists() and
+                    output_path.stat().st_mtime >= csv_path.stat().st_mtime):
+                return output_path
+
+            columns, dictionaries, skipped = parse_week_csv(
+                csv_path, self.machine_start, self.machine_length
+            )
+
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = output_path.with_name(output_path.name + '.tmp')
+
+            if self.format == 'parquet':
+                _write_parquet(tmp_path, columns, dictionaries)
+            else:
+                _write_npz(tmp_path, columns, dictionaries)
+
+            os.replace(tmp_path, output_path)
+
+            # Export dans l'autre format (avant l'installation de pyarrow):
+            # une seule version par semaine, sinon les requêtes la comptent deux fois
+            other_path = output_path.with_suffix('.npz' if self.format == 'parquet' else '.parquet')
+            if other_path.exists():
+                other_path.unlink()
+
+            self.logger.info(
+                f"Export colonnaire: {csv_path.name} → {output_path.name} "
+                f"({len(columns['day'])} lignes, {skipped} ignorées)"
+            )
+            return output_path
+
+        except Exception as e:
+            self.logger.error(f"Erreur export colonnaire {csv_path.name}: {e}")
+            return None
+
+    def export_archives(self, archives_path):
+        """Exporte toutes les semaines archivées (répertoires par année)"""
+        if not self.enabled:
+            return 0
+
+        archives_path = Path(archives_path)
+        exported_count = 0
+
+        if not archives_path.exists():
+            return 0
+
+        for year_dir in sorted(archives_path.iterdir()):
+            if not (year_dir.is_dir() and year_dir.name.isdigit()):
+                continue
+
+            for csv_path in sorted(year_dir.glob(f"S*_{year_dir.name}_*.csv")):
+                if self.export_week(csv_path):
+                    exported_count += 1
+
+        return exported_count
+
+class TraceabilityQuery:
+    """Agrégations rapides (taux de réussite) sur les exports colonnaires"""
+
+    GROUP_COLUMNS = ('machine', 'team', 'day')
+
+    def __init__(self, export_path):
+        if np is None:
+            raise RuntimeError("numpy est requis pour les requêtes colonnaires")
+        self.export_path = Path(export_path)
+
+    def find_files(self, year=None, weeks=None):
+        """Liste les fichiers colonnaires, filtrés par année et semaines
+
+        Une semaine présente dans les deux formats n'est retenue qu'une fois
+        (parquet si pyarrow est installé, npz sinon).
+        """
+        pattern = f"{year}/S*" if year else "*/S*"
+        preferred = '.parquet' if pq is not None else '.npz'
+        files = {}
+
+        for path in sorted(self.export_path.glob(pattern)):
+            if path.suffix not in ('.npz', '.parquet'):
+                continue
+            if weeks is not None:
+                try:
+                    week = int(path.name.split('_')[0][1:])
+                except ValueError:
+                    continue
+                if week not in weeks:
+                    continue
+            key = path.with_suffix('')
+            if key not in files or path.suffix == preferred:
+                files[key] = path
+
+        return [files[key] for key in sorted(files)]
+
+    def load(self, names, year=None, weeks=None):
+        """Charge et concatène des colonnes avec dictionnaires unifiés"""
+        parts = {name: [] for name in names}
+        global_dictionaries = {name: [] for name in names if name in DICTIONARY_COLUMNS}
+        global_indexes = {name: {} for name in global_dictionaries}
+
+        for path in self.find_files(year, weeks):
+            if path.suffix == '.parquet':
+                if pq is None:
+                    logger.warning(f"pyarrow non installé, fichier ignoré: {path.name}")
+                    continue
+                columns, dictionaries = _read_parquet(path, names)
+            else:
+                columns, dictionaries = _read_npz(path, names)
+
+            for name in names:
+                values = columns[name]
+                if name in global_dictionaries:
+                    # Remapper les codes locaux vers le dictionnaire global
+                    remap = np.asarray([
+                        _encode(value, global_indexes[name], global_dictionaries[name])
+                        for value in dictionaries[name]
+                    ], dtype=np.int64)
+                    values = remap[values] if len(remap) else values.astype(np.int64)
+                parts[name].append(values)
+
+        merged = {
+            name: np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+            for name, arrays in parts.items()
+        }
+        return merged, global_dictionaries
+
+    def pass_rate(self, by='machine', year=None, weeks=None, pass_value=1):
+        """Taux de réussite groupé par machine, équipe ou jour
+
+        Retourne {clé: {'total': n, 'passed': n, 'rate': pourcentage}}.
+        """
+        if by not in self.GROUP_COLUMNS:
+            raise ValueError(f"Regroupement inconnu: {by} (attendu: {', '.join(self.GROUP_COLUMNS)})")
+
+        columns, dictionaries = self.load((by, 'result'), year, weeks)
+        keys = columns[by]
+
+        if len(keys) == 0:
+            return {}
+
+        if by == 'day':
+            # Les jours sont des valeurs, pas des codes: les compacter
+            labels, keys = np.unique(keys, return_inverse=True)
+            labels = [
+                datetime.date.fromordinal(int(day) + EPOCH_ORDINAL).isoformat()
+                for day in labels
+            ]
+        else:
+            labels = dictionaries[by]
+
+        totals = np.bincount(keys, minlength=len(labels))
+        passed = np.bincount(keys, weights=(columns['result'] == pass_value), minlength=len(labels))
+
+        summary = {}
+        for code, label in enumerate(labels):
+            total = int(totals[code])
+            if total == 0:
+                continue
+            summary[label] = {
+                'total': total,
+                'passed': int(passed[code]),
+                'rate': round(100.0 * float(passed[code]) / total, 2)
+            }
+
+        return dict(sorted(summary.items()))
+
+def main():
+    """Point d'entrée en ligne de commande"""
+    import argparse
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+
+    parser = argparse.ArgumentParser(description="Export colonnaire de la traçabilité MaxLink")
+    parser.add_argument('--config', default=os.environ.get(
+        'CONFIG_FILE', '/opt/maxlink/config/widgets/testpersist_widget.json'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Exporter les semaines archivées")
+    export_parser.add_argument('--force', action='store_true', help="Réexporter même si à jour")
+
+    query_parser = subparsers.add_parser('query', help="Taux de réussite groupé")
+    query_parser.add_argument('--by', choices=TraceabilityQuery.GROUP_COLUMNS, default='machine')
+    query_parser.add_argument('--year', type=int)
+    query_parser.add_argument('--weeks', type=int, nargs='*')
+
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        storage_config = json.load(f).get('storage', {})
+
+    base_path = Path(storage_config.get('base_path', '/var/www/maxlink-dashboard/archives'))
+    archives_path = base_path / storage_config.get('weekly_tracking', {}).get('archives_folder', 'Archives')
+    export_config = storage_config.get('columnar_export', {})
+    export_path = export_config.get('path', '/var/lib/maxlink/testpersist/columnar')
+    barcode_config = storage_config.get('barcode_machine_position', {})
+
+    if args.command == 'export':
+        exporter = TraceabilityExporter(
+            export_path,
+            barcode_config.get('start', 6),
+            barcode_config.get('length', 3),
+            export_config.get('format', 'auto')
+        )
+        if not exporter.enabled:
+            sys.exit(1)
+        if args.force:
+            for csv_path in sorted(archives_path.glob("*/S*_*_*.csv")):
+                exporter.export_week(csv_path, force=True)
+        else:
+            exported = exporter.export_archives(archives_path)
+            logger.info(f"{exported} semaine(s) disponibles en format colonnaire")
+    else:
+        query = TraceabilityQuery(export_path)
+        weeks = set(args.weeks) if args.weeks else None
+        print(json.dumps(query.pass_rate(args.by, args.year, weeks), indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
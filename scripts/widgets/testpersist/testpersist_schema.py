@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Parseur de scans MaxLink piloté par schéma
+Le schéma (section 'parser' de testpersist_widget.json) est compilé une
+seule fois au démarrage en une expression régulière de ligne complète,
+en version texte et en version bytes pour les payloads MQTT ASCII
+"""
+
+import re
+import json
+import threading
+import datetime
+from pathlib import Path
+
+# Schéma historique: date,heure,equipe,codebarre,resultat
+DEFAULT_FIELDS = [
+    {'name': 'date', 'type': 'str', 'pattern': r'\d{2}/\d{2}/\d{4}'},
+    {'name': 'heure', 'type': 'str', 'pattern': r'\d{1,2}[Hh]\d{2}'},
+    {'name': 'equipe', 'type': 'str', 'pattern': r'[A-Za-z0-9]{1,3}'},
+    {'name': 'codebarre', 'type': 'str', 'pattern': r'[0-9A-Za-z]+'},
+    {'name': 'resultat', 'type': 'str', 'pattern': r'[0-9]'}
+]
+
+TYPE_CONVERTERS = {
+    'str': str,
+    'int': int,
+    'float': float
+}
+
+class ScanRecord:
+    """Scan validé: valeurs typées, valeurs brutes et segments du code-barres
+
+    csv_line et confirmation sont des bytes quand le payload MQTT l'était:
+    pour une ligne CSV ASCII, les deux désignent le buffer reçu lui-même.
+    """
+
+    __slots__ = ('values', 'raw', 'segments', 'csv_line', 'confirmation')
+
+    def __init__(self, values, raw, segments, csv_line, confirmation):
+        self.values = values
+        self.raw = raw
+        self.segments = segments
+        self.csv_line = csv_line
+        self.confirmation = confirmation
+
+class ScanParser:
+    """Valide et type les payloads CSV ou JSON selon le schéma configuré"""
+
+    def __init__(self, parser_config=None, machine_position=None):
+        parser_config = parser_config or {}
+        machine_position = machine_position or {}
+
+        self.separator = parser_config.get('separator', ',')
+        self.accept_json = 'json' in parser_config.get('formats', ['csv', 'json'])
+        self.json_aliases = parser_config.get('json_aliases', {})
+
+        fields = parser_config.get('fields', DEFAULT_FIELDS)
+        self.field_names = [field['name'] for field in fields]
+        self.field_count = len(fields)
+
+        # Compilation des validateurs par champ (diagnostic des rejets)
+        self.field_patterns = []
+        self.field_converters = []
+        for field in fields:
+            field_type = field.get('type', 'str')
+            if field_type not in TYPE_CONVERTERS:
+                raise ValueError(f"Type inconnu pour le champ {field['name']}: {field_type}")
+            self.field_patterns.append(re.compile(field.get('pattern', '.*')))
+            self.field_converters.append(TYPE_CONVERTERS[field_type])
+
+        # Validateur rapide: une seule regex pour la ligne complète
+        # (impossible si un motif contient ses propres groupes capturants)
+        self.line_pattern = None
+        if all(pattern.groups == 0 for pattern in self.field_patterns):
+            self.line_pattern = re.compile(
+                re.escape(self.separator).join(
+                    f"({pattern.pattern})" for pattern in self.field_patterns
+                )
+            )
+
+        # Variante bytes: validation des payloads ASCII sans décodage
+        # (motifs non ASCII: repli sur la version texte)
+        self.line_pattern_bytes = None
+        if self.line_pattern is not None:
+            try:
+                self.line_pattern_bytes = re.compile(self.line_pattern.pattern.encode('ascii'))
+            except UnicodeEncodeError:
+                pass
+
+        # Segments extraits du code-barres (machine par défaut)
+        segments = parser_config.get('segments')
+        if segments is None:
+            segments = {
+                'machine': {
+                    'field': 'codebarre',
+                    'start': machine_position.get('start', 6),
+                    'length': machine_position.get('length', 3)
+                }
+            }
+
+        self.segments = []
+        for name, segment in segments.items():
+            if segment['field'] not in self.field_names:
+                raise ValueError(f"Segment {name}: champ inconnu {segment['field']}")
+            start = segment.get('start', 0)
+            self.segments.append((
+                name,
+                self.field_names.index(segment['field']),
+                start,
+                start + segment['length']
+            ))
+
+    def _diagnose(self, fields):
+        """Identifie le premier champ invalide d'une ligne rejetée"""
+        if len(fields) != self.field_count:
+            return 'field_count'
+        for name, pattern, value in zip(self.field_names, self.field_patterns, fields):
+            if not pattern.fullmatch(value):
+                return f"invalid_{name}"
+        return 'invalid_line'
+
+    def _build_record(self, fields, confirmation, csv_line=None):
+        """Convertit les champs validés en enregistrement typé"""
+        try:
+            values = {
+                name: converter(value)
+                for name, converter, value in zip(self.field_names, self.field_converters, fields)
+            }
+        except ValueError:
+            return None, 'type_conversion'
+
+        segments = {}
+        for name, index, start, end in self.segments:
+            value = fields[index]
+            if len(value) < end:
+                return None, f"segment_{name}"
+            segments[name] = value[start:end]
+
+        raw = dict(zip(self.field_names, fields))
+        if csv_line is None:
+            csv_line = self.separator.join(fields)
+        return ScanRecord(values, raw, segments, csv_line, confirmation), None
+
+    def parse_line(self, line):
+        """Valide une ligne CSV; retourne (enregistrement, raison du rejet)"""
+        if self.line_pattern is not None:
+            match = self.line_pattern.fullmatch(line)
+            if match is None:
+                return None, self._diagnose(line.split(self.separator))
+            fields = list(match.groups())
+        else:
+            fields = line.split(self.separator)
+            reason = self._diagnose(fields)
+            if reason != 'invalid_line':
+                return None, reason
+        return self._build_record(fields, line)
+
+    def parse_ascii_line(self, line):
+        """Valide une ligne CSV ASCII en bytes: la ligne reçue est réutilisée
+        telle quelle pour la persistance et la confirmation"""
+        match = self.line_pattern_bytes.fullmatch(line)
+        if match is None:
+            # Rejet (rare): diagnostic par la version texte
+            return self.parse_line(line.decode('ascii'))
+        fields = [field.decode('ascii') for field in match.groups()]
+        return self._build_record(fields, line, line)
+
+    def parse_json(self, text):
+        """Valide une variante JSON du firmware ESP (clés aliasées possibles)"""
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None, 'invalid_json'
+
+        if not isinstance(data, dict):
+            return None, 'invalid_json'
+
+        for alias, name in self.json_aliases.items():
+            if alias in data and name not in data:
+                data[name] = data[alias]
+
+        fields = []
+        for name, pattern in zip(self.field_names, self.field_patterns):
+            if name not in data:
+                return None, f"missing_{name}"
+            value = str(data[name])
+            if not pattern.fullmatch(value):
+                return None, f"invalid_{name}"
+            fields.append(value)
+
+        # Confirmer avec le payload d'origine pour que l'émetteur le reconnaisse
+        csv_line = self.separator.join(fields)
+        if isinstance(text, bytes):
+            csv_line = csv_line.encode('utf-8')
+        return self._build_record(fields, text, csv_line)
+
+    def parse(self, payload):
+        """Point d'entrée: payload MQTT brut (bytes) ou texte"""
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            return self.parse_bytes(payload)
+
+        text = payload.strip()
+        if not text:
+            return None, 'empty'
+
+        if text[0] == '{':
+            if not self.accept_json:
+                return None, 'format_disabled'
+            return self.parse_json(text)
+
+        return self.parse_line(text)
+
+    def parse_bytes(self, payload):
+        """Payload MQTT brut: les lignes ASCII ne sont jamais décodées en entier"""
+        if not isinstance(payload, bytes):
+            payload = bytes(payload)
+
+        # strip() retourne le même objet s'il n'y a rien à retirer
+        text = payload.strip()
+        if not text:
+            return None, 'empty'
+
+        if not text.isascii():
+            # Caractères non ASCII (rare): chemin texte, résultat réencodé
+            try:
+                decoded = payload.decode('utf-8')
+            except UnicodeDecodeError:
+                return None, 'encoding'
+            return self._encode_record(*self.parse(decoded))
+
+        if text[0] == 0x7B:  # '{'
+            if not self.accept_json:
+                return None, 'format_disabled'
+            return self.parse_json(text)
+
+        if self.line_pattern_bytes is not None:
+            return self.parse_ascii_line(text)
+
+        record, reason = self._encode_record(*self.parse_line(text.decode('ascii')))
+        if record is not None:
+            record.confirmation = text
+        return record, reason
+
+    def _encode_record(self, record, reason):
+        if record is not None:
+            record.csv_line = record.csv_line.encode('utf-8')
+            record.confirmation = record.confirmation.encode('utf-8')
+        return record, reason
+
+class Quarantine:
+    """Fichier des payloads rejetés avec compteurs par raison"""
+
+    def __init__(self, path, enabled=True, max_bytes=10 * 1024 * 1024):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.reason_counts = {}
+        self.lock = threading.Lock()
+
+    def add(self, payload, reason):
+        """Enregistre un payload rejeté; retourne False si l'écriture échoue"""
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = bytes(payload).decode('utf-8', errors='backslashreplace')
+
+        with self.lock:
+            self.reason_counts[reason] = self.reason_counts.get(reason, 0) + 1
+
+            if not self.enabled:
+                return True
+
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+
+                # Rotation simple pour ne pas remplir la carte SD
+                if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+                    self.path.replace(self.path.with_name(self.path.name + '.1'))
+
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(f"{datetime.datetime.now().isoformat()}\t{reason}\t{payload.strip()!r}\n")
+                return True
+
+            except OSError:
+                return False
+
+    def get_counts(self):
+        with self.lock:
+            return dict(self.reason_counts)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Agrégation temps réel des résultats de tests MaxLink
+Compteurs glissants et taux de réussite par machine, équipe et poste
+"""
+
+import datetime
+import threading
+
+MINUTES_PER_DAY = 1440
+
+# Postes par défaut (heures de début incluses, de fin exclues)
+DEFAULT_SHIFTS = {
+    'matin': [5, 13],
+    'apres-midi': [13, 21],
+    'nuit': [21, 5]
+}
+
+def parse_scan_minute(date, heure):
+    """Convertit 'jj/mm/aaaa' et 'HHhMM' en index de minute absolu
+
+    L'index ne dépend pas du fuseau horaire: il reste cohérent entre les
+    scans reçus en direct et ceux relus depuis les CSV.
+    """
+    day, month, year = date.split('/')
+    hours, minutes = heure.upper().split('H')
+    ordinal = datetime.date(int(year), int(month), int(day)).toordinal()
+    return ordinal * MINUTES_PER_DAY + int(hours) * 60 + int(minutes), int(hours)
+
+def current_minute():
+    """Index de minute absolu de l'heure locale courante"""
+    now = datetime.datetime.now()
+    return now.toordinal() * MINUTES_PER_DAY + now.hour * 60 + now.minute
+
+class YieldAggregator:
+    """Compteurs de production sur une fenêtre glissante de buckets par minute"""
+
+    DIMENSIONS = ('machines', 'teams', 'shifts')
+
+    def __init__(self, window_minutes=60, shifts=None, pass_value='1'):
+        self.window_minutes = max(1, int(window_minutes))
+        self.pass_value = pass_value
+
+        # Table heure → poste calculée une seule fois
+        self.shift_by_hour = [None] * 24
+        for name, (start, end) in (shifts or DEFAULT_SHIFTS).items():
+            hour = start % 24
+            while True:
+                self.shift_by_hour[hour] = name
+                hour = (hour + 1) % 24
+                if hour == end % 24:
+                    break
+
+        # Anneau de buckets: index de minute + compteurs {(dimension, clé): [total, ok]}
+        self.bucket_minutes = [None] * self.window_minutes
+        self.buckets = [{} for _ in range(self.window_minutes)]
+
+        # Cumul de la semaine courante
+        self.week_counts = {}
+
+        self.lock = threading.Lock()
+
+    def get_shift(self, hour):
+        """Retourne le poste correspondant à une heure"""
+        return self.shift_by_hour[hour % 24] or 'hors-poste'
+
+    def _increment(self, counts, key, passed):
+        entry = counts.get(key)
+        if entry is None:
+            entry = counts[key] = [0, 0]
+        entry[0] += 1
+        if passed:
+            entry[1] += 1
+
+    def record(self, date, heure, equipe, machine_id, resultat):
+        """Enregistre un scan; retourne False si la date est illisible"""
+        try:
+            minute, hour = parse_scan_minute(date, heure)
+        except ValueError:
+            return False
+
+        passed = resultat == self.pass_value
+        keys = (
+            ('machines', machine_id),
+            ('teams', equipe),
+            ('shifts', self.get_shift(hour))
+        )
+
+        with self.lock:
+            for key in keys:
+                self._increment(self.week_counts, key, passed)
+
+            # Scan trop ancien pour la fenêtre: uniquement dans le cumul
+            if minute <= current_minute() - self.window_minutes:
+                return True
+
+            slot = minute % self.window_minutes
+            if self.bucket_minutes[slot] != minute:
+                # Bucket recyclé pour une nouvelle minute
+                self.bucket_minutes[slot] = minute
+                self.buckets[slot] = {}
+
+            bucket = self.buckets[slot]
+            for key in keys:
+                self._increment(bucket, key, passed)
+
+        return True
+
+    def reset_week(self):
+        """Remet à zéro le cumul hebdomadaire (changement de semaine)"""
+        with self.lock:
+            self.week_counts = {}
+
+    def _format(self, total, passed):
+        return {
+            'total': total,
+            'passed': passed,
+            'rate': round(100.0 * passed / total, 1) if total else None
+        }
+
+    def summary(self):
+        """Construit le résumé compact à publier"""
+        oldest = current_minute() - self.window_minutes
+
+        with self.lock:
+            window_counts = {}
+            for slot, minute in enumerate(self.bucket_minutes):
+                if minute is None or minute <= oldest:
+                    continue
+                for key, (total, passed) in self.buckets[slot].items():
+                    entry = window_counts.setdefault(key, [0, 0])
+                    entry[0] += total
+                    entry[1] += passed
+
+            week_counts = {key: list(value) for key, value in self.week_counts.items()}
+
+        data = {dimension: {} for dimension in self.DIMENSIONS}
+        overall_window = [0, 0]
+        overall_week = [0, 0]
+
+        # La fenêtre peut chevaucher un changement de semaine: union des clés
+        for key in set(week_counts) | set(window_counts):
+            dimension, name = key
+            window_total, window_passed = window_counts.get(key, (0, 0))
+            week_total, week_passed = week_counts.get(key, (0, 0))
+            data[dimension][name] = {
+                'window': self._format(window_total, window_passed),
+                'week': self._format(week_total, week_passed)
+            }
+
+            # Vue globale: somme sur les machines (chaque scan compte une fois)
+            if dimension == 'machines':
+                overall_window[0] += window_total
+                overall_window[1] += window_passed
+                overall_week[0] += week_total
+                overall_week[1] += week_passed
+
+        data['overall'] = {
+            'window': self._format(*overall_window),
+            'week': self._format(*overall_week)
+        }
+        data['window_minutes'] = self.window_minutes
+
+        return data
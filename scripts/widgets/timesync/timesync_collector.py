@@ -2,18 +2,22 @@
 """
 Collecteur de synchronisation temps MaxLink - Version simplifiée
 Sans NTP, utilisation du RTC comme source primaire
-Avec redémarrage automatique des services après synchronisation
+Les commandes set_time alimentent un estimateur de dérive: les petits
+écarts sont rattrapés progressivement (adjtimex), seuls les grands écarts
+font sauter l'heure. Les collecteurs planifient sur l'horloge monotone et
+détectent eux-mêmes le saut (CollectorClock): aucun redémarrage de service
 """
 
 import json
 import time
-import subprocess
 import logging
 import os
 import sys
 from datetime import datetime
 import paho.mqtt.client as mqtt
 
+from timesync_drift import ClockDiscipline, DriftEstimator
+
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,11 +39,16 @@ class TimeSyncCollector:
             'sync_result': 'system/time/sync/result'
         }
         
-        # Services à redémarrer après synchronisation
-        self.services_to_restart = [
-            'maxlink-widget-servermonitoring',
-            'maxlink-widget-mqttstats'
-        ]
+        # Estimation de dérive sur plusieurs commandes set_time
+        time_config = self.config['time']
+        self.discipline = ClockDiscipline()
+        self.estimator = DriftEstimator(
+            self.discipline,
+            window=time_config['drift_window'],
+            outlier_threshold=time_config['outlier_threshold_seconds'],
+            frequency_min_span=time_config['frequency_min_span_seconds']
+        )
+        self.rtc_pending = False
         
         logger.info("Collecteur TimSync simplifié initialisé (sans NTP)")
     
@@ -54,7 +63,12 @@ class TimeSyncCollector:
             },
             'time': {
                 'publish_interval': 10,
-                'max_drift_seconds': 180
+                'step_threshold_seconds': 5.0,
+                'min_correction_seconds': 0.2,
+                'outlier_threshold_seconds': 1.0,
+                'drift_window': 32,
+                'frequency_min_span_seconds': 1800,
+                'max_frequency_ppm': 200
             }
         }
         
@@ -66,6 +80,9 @@ class TimeSyncCollector:
                         default_config['mqtt'].update(file_config['mqtt']['broker'])
                     if 'time' in file_config:
                         default_config['time'].update(file_config['time'])
+                        if 'max_drift_seconds' in file_config['time']:
+                            logger.warning("time.max_drift_seconds n'est plus utilisé - "
+                                           "voir step_threshold_seconds (saut au-delà, slew en deçà)")
                 logger.info(f"Configuration chargée depuis {config_file}")
             except Exception as e:
                 logger.error(f"Erreur lecture config: {e}")
@@ -111,54 +128,6 @@ class TimeSyncCollector:
         except Exception as e:
             logger.error(f"Erreur traitement message: {e}")
     
-    def restart_affected_services(self):
-        """Redémarre les services affectés par le changement d'heure"""
-        logger.info("Redémarrage des services affectés par le changement d'heure...")
-        
-        for service in self.services_to_restart:
-            try:
-                # Vérifier si le service existe et est actif
-                check_result = subprocess.run(
-                    ['systemctl', 'is-active', service],
-                    capture_output=True,
-                    text=True
-                )
-                
-                if check_result.returncode == 0:  # Service actif
-                    logger.info(f"  → Redémarrage de {service}...")
-                    
-                    # Redémarrer le service
-                    restart_result = subprocess.run(
-                        ['systemctl', 'restart', service],
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    
-                    # Attendre un peu pour laisser le service démarrer
-                    time.sleep(1)
-                    
-                    # Vérifier le statut après redémarrage
-                    status_result = subprocess.run(
-                        ['systemctl', 'is-active', service],
-                        capture_output=True,
-                        text=True
-                    )
-                    
-                    if status_result.returncode == 0:
-                        logger.info(f"  ✓ {service} redémarré avec succès")
-                    else:
-                        logger.warning(f"  ✗ {service} n'est pas actif après redémarrage")
-                else:
-                    logger.debug(f"  - {service} n'est pas actif, pas de redémarrage nécessaire")
-                    
-            except subprocess.CalledProcessError as e:
-                logger.error(f"  ✗ Erreur lors du redémarrage de {service}: {e}")
-            except Exception as e:
-                logger.error(f"  ✗ Erreur inattendue pour {service}: {e}")
-        
-        logger.info("Processus de redémarrage terminé")
-    
     def handle_sync_command(self, payload):
         """Exécuter une synchronisation temps"""
         try:
@@ -175,31 +144,56 @@ class TimeSyncCollector:
                 self.publish_sync_result('error', 'Timestamp manquant')
                 return
             
-            # Vérifier le décalage
-            current_time = time.time()
-            drift_seconds = abs(current_time - new_timestamp)
-            direction = "avant" if new_timestamp > current_time else "arrière"
-            
             logger.info(f"Sync demandée - Source: {source_mac} ({source})")
-            logger.info(f"Décalage: {drift_seconds:.1f}s en {direction}")
             
-            # Toujours synchroniser si le décalage est significatif
-            if drift_seconds < 2:
-                logger.info("Décalage négligeable - pas de synchronisation")
-                self.publish_sync_result('skipped', f'Décalage négligeable ({drift_seconds:.1f}s)')
+            if not self.estimator.add_sample(float(new_timestamp)):
+                drift_seconds = new_timestamp - time.time()
+                logger.warning(f"Échantillon aberrant ignoré ({drift_seconds:+.1f}s)")
+                self.publish_sync_result('rejected', f'Échantillon aberrant ({drift_seconds:+.1f}s)')
                 return
             
-            # Effectuer la synchronisation
-            if self.perform_time_sync(new_timestamp):
+            estimate = self.estimator.estimate()
+            offset = estimate.offset
+            drift_seconds = abs(offset)
+            direction = "avant" if offset > 0 else "arrière"
+            details = {
+                'offset': round(offset, 6),
+                'frequency_ppm': round(estimate.freq_ppm, 3) if estimate.freq_ppm is not None else None,
+                'jitter': round(estimate.jitter, 6),
+                'samples': estimate.samples
+            }
+            
+            logger.info(f"Décalage estimé: {drift_seconds:.3f}s en {direction} "
+                        f"({estimate.samples} échantillon(s), dispersion {estimate.jitter:.3f}s)")
+            
+            self.update_frequency(estimate)
+            
+            time_config = self.config['time']
+            if drift_seconds < time_config['min_correction_seconds']:
+                logger.info("Décalage négligeable - pas de correction")
+                self.publish_sync_result('skipped', f'Décalage négligeable ({drift_seconds:.3f}s)', details)
+                return
+            
+            # Petit écart: rattrapage progressif, l'heure ne saute pas
+            if drift_seconds < time_config['step_threshold_seconds']:
+                try:
+                    self.discipline.slew(offset)
+                    duration = self.discipline.slew_duration(offset)
+                    self.rtc_pending = True
+                    message = f'Correction progressive ({drift_seconds:.3f}s en {direction}, ~{duration / 60:.0f} min)'
+                    logger.info(message)
+                    self.publish_sync_result('success', message, dict(details, method='slew'))
+                    return
+                except OSError as e:
+                    logger.warning(f"adjtimex indisponible ({e}), saut de l'heure")
+            
+            # Grand écart (ou slew impossible): saut de l'heure
+            if self.perform_time_sync(offset):
                 message = f'Synchronisé ({drift_seconds:.1f}s en {direction})'
                 logger.info(f"Synchronisation réussie - {message}")
-                self.publish_sync_result('success', message)
-                
-                # Redémarrer les services affectés
-                self.restart_affected_services()
+                self.publish_sync_result('success', message, dict(details, method='step'))
                 
                 # Forcer une republication immédiate de l'heure
-                time.sleep(0.5)  # Petite pause pour laisser le système se stabiliser
                 self.publish_periodic_time()
             else:
                 logger.error("Échec synchronisation")
@@ -209,51 +203,32 @@ class TimeSyncCollector:
             logger.error(f"Erreur synchronisation: {e}")
             self.publish_sync_result('error', str(e))
     
-    def perform_time_sync(self, timestamp):
-        """Effectue la synchronisation système - Version simple sans NTP"""
+    def update_frequency(self, estimate):
+        """Corrige l'erreur de fréquence estimée (moins de corrections ensuite)"""
+        discipline = self.discipline
+        if estimate.freq_ppm is None or discipline.base_freq_ppm is None:
+            return
+        
+        limit = self.config['time']['max_frequency_ppm']
+        target = discipline.base_freq_ppm + max(-limit, min(limit, estimate.freq_ppm))
+        if abs(target - discipline.freq_ppm) < 0.5:
+            return
+        
         try:
-            new_datetime = datetime.fromtimestamp(timestamp)
-            datetime_str = new_datetime.strftime('%Y-%m-%d %H:%M:%S')
-            
-            logger.info(f"Changement de l'heure système vers: {datetime_str}")
-            
-            # Simple changement d'heure avec date
-            result = subprocess.run(
-                ['date', '-s', datetime_str], 
-                check=True, 
-                capture_output=True, 
-                text=True
-            )
+            discipline.set_frequency(target)
+            logger.info(f"Fréquence horloge corrigée: {estimate.freq_ppm:+.2f} ppm estimés")
+        except OSError as e:
+            logger.warning(f"Correction de fréquence impossible: {e}")
+    
+    def perform_time_sync(self, offset):
+        """Saute l'heure système de `offset` secondes - Version simple sans NTP"""
+        try:
+            new_datetime = datetime.fromtimestamp(time.time() + offset)
+            logger.info(f"Changement de l'heure système vers: {new_datetime.strftime('%Y-%m-%d %H:%M:%S.%f')}")
             
-            if result.returncode != 0:
-                logger.error(f"Erreur commande date: {result.stderr}")
-                return False
+            self.discipline.step(offset)
             
-            # Mettre à jour le RTC si présent
-            rtc_updated = False
-            if os.path.exists('/dev/rtc') or os.path.exists('/dev/rtc0') or os.path.exists('/dev/rtc1'):
-                logger.info("Mise à jour du module RTC...")
-                try:
-                    # Essayer rtc1 d'abord (DS3231)
-                    if os.path.exists('/dev/rtc1'):
-                        subprocess.run(
-                            ['hwclock', '--systohc', '--rtc=/dev/rtc1'], 
-                            check=True,
-                            capture_output=True
-                        )
-                        rtc_updated = True
-                        logger.info("RTC1 (DS3231) mis à jour")
-                    else:
-                        # Sinon utiliser le RTC par défaut
-                        subprocess.run(
-                            ['hwclock', '--systohc'], 
-                            check=True,
-                            capture_output=True
-                        )
-                        rtc_updated = True
-                        logger.info("RTC mis à jour")
-                except subprocess.CalledProcessError as e:
-                    logger.warning(f"Impossible de mettre à jour le RTC: {e}")
+            rtc_updated = self.update_rtc()
             
             logger.info(f"Heure système synchronisée avec succès")
             if rtc_updated:
@@ -261,14 +236,42 @@ class TimeSyncCollector:
             
             return True
             
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Erreur commande système: {e}")
-            return False
         except Exception as e:
             logger.error(f"Erreur synchronisation: {e}")
             return False
     
-    def publish_sync_result(self, status, message):
+    def update_rtc(self):
+        """Recopie l'heure système dans le module RTC s'il est présent"""
+        import subprocess
+        
+        self.rtc_pending = False
+        if not (os.path.exists('/dev/rtc') or os.path.exists('/dev/rtc0') or os.path.exists('/dev/rtc1')):
+            return False
+        
+        logger.info("Mise à jour du module RTC...")
+        try:
+            # Essayer rtc1 d'abord (DS3231)
+            if os.path.exists('/dev/rtc1'):
+                subprocess.run(
+                    ['hwclock', '--systohc', '--rtc=/dev/rtc1'], 
+                    check=True,
+                    capture_output=True
+                )
+                logger.info("RTC1 (DS3231) mis à jour")
+            else:
+                # Sinon utiliser le RTC par défaut
+                subprocess.run(
+                    ['hwclock', '--systohc'], 
+                    check=True,
+                    capture_output=True
+                )
+                logger.info("RTC mis à jour")
+            return True
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning(f"Impossible de mettre à jour le RTC: {e}")
+            return False
+    
+    def publish_sync_result(self, status, message, details=None):
         """Publier le résultat de synchronisation"""
         try:
             result = {
@@ -276,6 +279,8 @@ class TimeSyncCollector:
                 'message': message,
                 'timestamp': time.time()
             }
+            if details:
+                result.update(details)
             
             self.client.publish(self.topics['sync_result'], json.dumps(result))
             logger.debug(f"Résultat de sync publié: {status} - {message}")
@@ -300,7 +305,8 @@ class TimeSyncCollector:
                 'iso_time': datetime.fromtimestamp(current_time).isoformat(),
                 'uptime_seconds': self.get_uptime_seconds(),
                 'source': time_source,
-                'timezone': time.tzname[0]
+                'timezone': time.tzname[0],
+                'drift': dict(self.estimator.get_stats(), **self.discipline.get_stats())
             }
             
             self.client.publish(self.topics['time_publish'], json.dumps(time_data))
@@ -339,6 +345,10 @@ class TimeSyncCollector:
                 time.sleep(publish_interval)
                 self.publish_periodic_time()
                 
+                # RTC recopié une fois la correction progressive écoulée
+                if self.rtc_pending and abs(self.discipline.remaining_slew()) < 0.001:
+                    self.update_rtc()
+                
         except KeyboardInterrupt:
             logger.info("Arrêt demandé par l'utilisateur")
         except Exception as e:
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Estimation de dérive et discipline de l'horloge système MaxLink
+Les commandes set_time des ESP32 sont des échantillons d'écart entre leur
+heure et celle du Pi. L'estimateur rejette les échantillons aberrants et
+calcule l'écart courant et l'erreur de fréquence de l'horloge locale; la
+discipline applique les petites corrections par ralentissement/accélération
+progressive (adjtimex) et ne saute l'heure que pour les grands écarts.
+"""
+
+import os
+import time
+import ctypes
+import ctypes.util
+import statistics
+from collections import deque
+
+# adjtimex(2): modes utilisés
+ADJ_FREQUENCY = 0x0002
+ADJ_OFFSET_SINGLESHOT = 0x8001   # correction ponctuelle (sémantique adjtime, 500 ppm)
+ADJ_OFFSET_SS_READ = 0xa001      # lecture de la correction restante
+
+# Fréquence noyau: ppm en virgule fixe 16.16
+FREQUENCY_SCALE = 65536
+
+# Le noyau rattrape une correction ponctuelle à 500 µs par seconde
+SLEW_RATE = 0.0005
+
+class Timeval(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_usec', ctypes.c_long)]
+
+class Timex(ctypes.Structure):
+    """struct timex de <sys/timex.h>"""
+    _fields_ = [
+        ('modes', ctypes.c_uint),
+        ('offset', ctypes.c_long),
+        ('freq', ctypes.c_long),
+        ('maxerror', ctypes.c_long),
+        ('esterror', ctypes.c_long),
+        ('status', ctypes.c_int),
+        ('constant', ctypes.c_long),
+        ('precision', ctypes.c_long),
+        ('tolerance', ctypes.c_long),
+        ('time', Timeval),
+        ('tick', ctypes.c_long),
+        ('ppsfreq', ctypes.c_long),
+        ('jitter', ctypes.c_long),
+        ('shift', ctypes.c_int),
+        ('stabil', ctypes.c_long),
+        ('jitcnt', ctypes.c_long),
+        ('calcnt', ctypes.c_long),
+        ('errcnt', ctypes.c_long),
+        ('stbcnt', ctypes.c_long),
+        ('tai', ctypes.c_int),
+        ('_reserved', ctypes.c_int * 11)
+    ]
+
+# ===============================================================================
+# ESTIMATION
+# ===============================================================================
+
+class DriftEstimate:
+    """Résultat de l'estimateur
+
+    offset:   correction restant à appliquer maintenant (s, positif: avancer)
+    freq_ppm: erreur de fréquence de l'horloge non corrigée (None: trop tôt)
+    jitter:   dispersion des échantillons retenus (s)
+    """
+
+    __slots__ = ('offset', 'freq_ppm', 'jitter', 'samples', 'span')
+
+    def __init__(self, offset, freq_ppm, jitter, samples, span):
+        self.offset = offset
+        self.freq_ppm = freq_ppm
+        self.jitter = jitter
+        self.samples = samples
+        self.span = span
+
+class DriftEstimator:
+    """Fenêtre glissante d'échantillons d'écart, rejet des aberrants, régression
+
+    Les écarts sont mémorisés dans le repère de l'horloge « non corrigée »
+    (corrections déjà appliquées par la discipline ajoutées): les slews et
+    sauts de l'heure ne faussent donc ni la médiane ni la pente.
+    """
+
+    def __init__(self, discipline, window=32, max_age=6 * 3600, min_samples=3,
+                 outlier_threshold=1.0, frequency_min_span=1800):
+        self.discipline = discipline
+        self.samples = deque(maxlen=window)
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self.outlier_threshold = outlier_threshold
+        self.frequency_min_span = frequency_min_span
+
+        # Aberrants consécutifs cohérents entre eux: l'horloge de référence a
+        # réellement changé (ESP resynchronisé), la fenêtre est réinitialisée
+        self.suspects = []
+
+        self.accepted = 0
+        self.rejected = 0
+        self.resets = 0
+
+    def _prune(self, now):
+        while self.samples and now - self.samples[0][0] > self.max_age:
+            self.samples.popleft()
+
+    def _fit(self, now):
+        """Écart prédit à `now` et pente (s/s) par moindres carrés"""
+        points = list(self.samples)
+        offsets = [offset for _, offset in points]
+        span = points[-1][0] - points[0][0] if len(points) > 1 else 0.0
+        if len(points) < self.min_samples or span < self.frequency_min_span:
+            return statistics.median(offsets), None, span
+
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_o = sum(offsets) / len(offsets)
+        variance = sum((t - mean_t) ** 2 for t, _ in points)
+        slope = sum((t - mean_t) * (o - mean_o) for t, o in points) / variance
+        return mean_o + slope * (now - mean_t), slope, span
+
+    def _residuals(self, now):
+        predicted, slope, _ = self._fit(now)
+        slope = slope or 0.0
+        return [offset - (predicted + slope * (t - now)) for t, offset in self.samples]
+
+    def add_sample(self, remote_timestamp, now=None, wall=None):
+        """Ajoute un échantillon; retourne False s'il est rejeté comme aberrant"""
+        now = time.monotonic() if now is None else now
+        wall = time.time() if wall is None else wall
+        offset = remote_timestamp - wall + self.discipline.applied(now)
+        self._prune(now)
+
+        if len(self.samples) >= self.min_samples:
+            predicted, slope, _ = self._fit(now)
+            residuals = self._residuals(now)
+            spread = 1.4826 * statistics.median(abs(r) for r in residuals)
+            limit = max(self.outlier_threshold, 4 * spread)
+            if abs(offset - predicted) > limit:
+                self.rejected += 1
+                self.suspects.append((now, offset))
+                if self._suspects_agree(limit):
+                    self.samples.clear()
+                    self.samples.extend(self.suspects)
+                    self.suspects = []
+                    self.resets += 1
+                    return True
+                return False
+
+        self.suspects = []
+        self.samples.append((now, offset))
+        self.accepted += 1
+        return True
+
+    def _suspects_agree(self, limit):
+        if len(self.suspects) < self.min_samples:
+            return False
+        offsets = [offset for _, offset in self.suspects[-self.min_samples:]]
+        self.suspects = self.suspects[-self.min_samples:]
+        return max(offsets) - min(offsets) <= limit
+
+    def estimate(self, now=None):
+        """Écart à corriger maintenant et erreur de fréquence (None sans échantillon)"""
+        now = time.monotonic() if now is None else now
+        if not self.samples:
+            return None
+        predicted, slope, span = self._fit(now)
+        residuals = self._residuals(now)
+        jitter = statistics.median(abs(r) for r in residuals) if len(residuals) > 1 else 0.0
+        freq_ppm = slope * 1e6 if slope is not None else None
+        return DriftEstimate(
+            predicted - self.discipline.applied(now), freq_ppm, jitter, len(self.samples), span
+        )
+
+    def get_stats(self):
+        return {
+            'samples': len(self.samples),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'resets': self.resets
+        }
+
+# ===============================================================================
+# DISCIPLINE DE L'HORLOGE
+# ===============================================================================
+
+class ClockDiscipline:
+    """Applique les corrections (slew, saut, fréquence) et en tient le compte
+
+    applied(t) est la correction totale introduite par ce processus à
+    l'instant monotone t: sauts, part déjà écoulée des slews, et intégrale
+    de l'écart de fréquence appliqué par rapport à la fréquence initiale.
+    """
+
+    def __init__(self):
+        self.libc = None
+        path = ctypes.util.find_library('c')
+        if path:
+            try:
+                self.libc = ctypes.CDLL(path, use_errno=True)
+                self.libc.adjtimex.argtypes = [ctypes.POINTER(Timex)]
+            except (OSError, AttributeError):
+                self.libc = None
+
+        self.steps_total = 0.0
+        self.slews_total = 0.0
+        self.freq_integral = 0.0
+
+        self.base_freq_ppm = self.read_frequency()
+        self.freq_ppm = self.base_freq_ppm
+        self.freq_since = time.monotonic()
+
+        self.steps = 0
+        self.slews = 0
+
+    # Appels système ---------------------------------------------------------
+
+    def _adjtimex(self, modes, offset=0, freq=0):
+        if self.libc is None:
+            raise OSError("adjtimex indisponible")
+        timex = Timex(modes=modes, offset=offset, freq=freq)
+        if self.libc.adjtimex(ctypes.byref(timex)) < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return timex
+
+    def read_frequency(self):
+        try:
+            return self._adjtimex(0).freq / FREQUENCY_SCALE
+        except OSError:
+            return None
+
+    def remaining_slew(self):
+        """Correction ponctuelle restant à écouler (s)"""
+        try:
+            return self._adjtimex(ADJ_OFFSET_SS_READ).offset / 1e6
+        except OSError:
+            return 0.0
+
+    # Compte des corrections -------------------------------------------------
+
+    def applied(self, now=None):
+        now = time.monotonic() if now is None else now
+        freq_part = 0.0
+        if self.freq_ppm is not None and self.base_freq_ppm is not None:
+            freq_part = (self.freq_ppm - self.base_freq_ppm) * 1e-6 * (now - self.freq_since)
+        return (self.steps_total + self.slews_total - self.remaining_slew()
+                + self.freq_integral + freq_part)
+
+    # Corrections -------------------------------------------------------------
+
+    def slew(self, offset):
+        """Correction progressive; remplace la correction en cours"""
+        remaining = self.remaining_slew()
+        self._adjtimex(ADJ_OFFSET_SINGLESHOT, offset=int(round(offset * 1e6)))
+        self.slews_total += offset - remaining
+        self.slews += 1
+
+    def step(self, offset):
+        """Saut de l'heure (précision microseconde, contrairement à date -s)"""
+        remaining = self.remaining_slew()
+        if remaining:
+            # Annule le slew en cours: il est inclus dans le saut
+            self._adjtimex(ADJ_OFFSET_SINGLESHOT, offset=0)
+            self.slews_total -= remaining
+        time.clock_settime(time.CLOCK_REALTIME, time.clock_gettime(time.CLOCK_REALTIME) + offset)
+        self.steps_total += offset
+        self.steps += 1
+
+    def set_frequency(self, freq_ppm):
+        """Fréquence noyau absolue (ppm); l'ancienne est intégrée au compte"""
+        now = time.monotonic()
+        if self.freq_ppm is not None and self.base_freq_ppm is not None:
+            self.freq_integral += (self.freq_ppm - self.base_freq_ppm) * 1e-6 * (now - self.freq_since)
+        self._adjtimex(ADJ_FREQUENCY, freq=int(round(freq_ppm * FREQUENCY_SCALE)))
+        self.freq_ppm = freq_ppm
+        self.freq_since = now
+
+    def slew_duration(self, offset):
+        """Durée nécessaire pour écouler une correction (s)"""
+        return abs(offset) / SLEW_RATE
+
+    def get_stats(self):
+        return {
+            'steps': self.steps,
+            'slews': self.slews,
+            'remaining_slew': round(self.remaining_slew(), 6),
+            'frequency_ppm': round(self.freq_ppm, 3) if self.freq_ppm is not None else None,
+            'available': self.libc is not None and self.base_freq_ppm is not None
+        }
@@ -33,7 +33,7 @@ except ImportError:
 # IMPORTANT: Ajouter le chemin du core au PYTHONPATH
 sys.path.insert(0, '/opt/maxlink/widgets/_core')
 try:
-    from collector_base import BaseCollector
+    from collector_base import BaseCollector, config_changed
 except ImportError:
     logger.error("Impossible d'importer BaseCollector depuis /opt/maxlink/widgets/_core")
     sys.exit(1)
@@ -43,8 +43,8 @@ class WiFiStatsCollector(BaseCollector):
         """Initialise le collecteur"""
         super().__init__(config_file, 'wifistats')
         
-        # Intervalle de mise à jour défini directement dans le collector
-        self.update_interval = 1  # 1 seconde pour voir les connexions/déconnexions rapidement
+        # 1 seconde par défaut pour voir les connexions/déconnexions rapidement
+        self.update_interval = self._read_interval(self.config)
         
         # Interface WiFi (généralement wlan0)
         self.interface = "wlan0"
@@ -54,6 +54,24 @@ class WiFiStatsCollector(BaseCollector):
         
         logger.info(f"Intervalle de mise à jour: {self.update_interval}s")
     
+    def _read_interval(self, config):
+        """Intervalle de la section collector.update_intervals"""
+        return config.get('collector', {}).get('update_intervals', {}).get('default', 1)
+    
+    def validate_config(self, config):
+        """Refuse un intervalle nul ou non numérique"""
+        super().validate_config(config)
+        interval = self._read_interval(config)
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise ValueError(f"intervalle invalide: {interval}")
+    
+    def apply_config(self, config, changes):
+        """Applique le nouvel intervalle sans redémarrage"""
+        if config_changed(changes, 'collector.update_intervals'):
+            self.update_interval = self._read_interval(config)
+            logger.info(f"Intervalle de mise à jour: {self.update_interval}s")
+        return []
+    
     def on_mqtt_connected(self):
         """Appelé quand la connexion MQTT est établie"""
         logger.info("Connecté au broker MQTT - début de la collecte des stats WiFi")
@@ -14,6 +14,89 @@ function isValidPath($path) {
     return strpos(realpath($path), realpath($GLOBALS['archivesPath'])) === 0;
 }
 
+function getFileEtag($filePath) {
+    // Empreinte SHA-256 maintenue par le collecteur testpersist pour les semaines closes
+    $sidecarPath = $filePath . '.sha256';
+    
+    if (is_file($sidecarPath) && filemtime($sidecarPath) >= filemtime($filePath)) {
+        $content = file_get_contents($sidecarPath, false, null, 0, 64);
+        if ($content !== false && preg_match('/^[a-f0-9]{64}$/', $content)) {
+            return ['etag' => '"' . $content . '"', 'immutable' => true];
+        }
+    }
+    
+    // Pas d'empreinte fiable: calcul à la volée, sans mise en cache longue
+    return ['etag' => '"' . hash_file('sha256', $filePath) . '"', 'immutable' => false];
+}
+
+function etagMatches($header, $etag) {
+    if ($header === null) {
+        return false;
+    }
+    
+    if (trim($header) === '*') {
+        return true;
+    }
+    
+    foreach (explode(',', $header) as $candidate) {
+        if (trim($candidate) === $etag) {
+            return true;
+        }
+    }
+    
+    return false;
+}
+
+function parseRange($header, $fileSize) {
+    // Une seule plage supportée: bytes=debut-fin, bytes=debut-, bytes=-suffixe
+    if (!preg_match('/^bytes=(\d*)-(\d*)$/', trim($header), $matches)) {
+        return null;
+    }
+    
+    if ($matches[1] === '' && $matches[2] === '') {
+        return null;
+    }
+    
+    if ($matches[1] === '') {
+        $suffix = intval($matches[2]);
+        if ($suffix === 0) {
+            return false;
+        }
+        $start = max($fileSize - $suffix, 0);
+        $end = $fileSize - 1;
+    } else {
+        $start = intval($matches[1]);
+        $end = ($matches[2] === '') ? $fileSize - 1 : min(intval($matches[2]), $fileSize - 1);
+    }
+    
+    if ($start >= $fileSize || $start > $end) {
+        return false;
+    }
+    
+    return [$start, $end];
+}
+
+function sendFileRange($filePath, $start, $length) {
+    $handle = fopen($filePath, 'rb');
+    if ($handle === false) {
+        return;
+    }
+    
+    fseek($handle, $start);
+    
+    while ($length > 0 && !feof($handle) && !connection_aborted()) {
+        $chunk = fread($handle, min(65536, $length));
+        if ($chunk === false || $chunk === '') {
+            break;
+        }
+        echo $chunk;
+        flush();
+        $length -= strlen($chunk);
+    }
+    
+    fclose($handle);
+}
+
 function formatFileSize($bytes) {
     $units = ['B', 'KB', 'MB', 'GB'];
     $bytes = max($bytes, 0);
@@ -51,14 +134,59 @@ try {
         }
         
         $fileSize = filesize($filePath);
+        $etagInfo = getFileEtag($filePath);
+        $etag = $etagInfo['etag'];
+        
+        header('Accept-Ranges: bytes');
+        header('ETag: ' . $etag);
+        header('Last-Modified: ' . gmdate('D, d M Y H:i:s', filemtime($filePath)) . ' GMT');
+        
+        if ($etagInfo['immutable']) {
+            // Semaine close: contenu figé, cacheable indéfiniment
+            header('Cache-Control: public, max-age=31536000, immutable');
+        } else {
+            header('Cache-Control: no-cache, must-revalidate');
+        }
+        
+        // Fichier déjà téléchargé: ne pas le renvoyer
+        if (etagMatches($_SERVER['HTTP_IF_NONE_MATCH'] ?? null, $etag)) {
+            http_response_code(304);
+            exit;
+        }
+        
+        $start = 0;
+        $end = $fileSize - 1;
+        $rangeHeader = $_SERVER['HTTP_RANGE'] ?? null;
+        $ifRange = $_SERVER['HTTP_IF_RANGE'] ?? null;
+        
+        // If-Range: la reprise n'est valide que si le fichier n'a pas changé
+        if ($rangeHeader !== null && ($ifRange === null || trim($ifRange) === $etag)) {
+            $range = parseRange($rangeHeader, $fileSize);
+            
+            if ($range === false) {
+                http_response_code(416);
+                header('Content-Range: bytes */' . $fileSize);
+                exit;
+            }
+            
+            if ($range !== null) {
+                list($start, $end) = $range;
+                http_response_code(206);
+                header('Content-Range: bytes ' . $start . '-' . $end . '/' . $fileSize);
+            }
+        }
+        
+        $length = ($fileSize > 0) ? $end - $start + 1 : 0;
         
         header('Content-Type: text/csv');
         header('Content-Disposition: attachment; filename="' . $filename . '"');
-        header('Content-Length: ' . $fileSize);
-        header('Cache-Control: no-cache, must-revalidate');
-        header('Expires: 0');
+        header('Content-Length: ' . $length);
+        
+        if ($_SERVER['REQUEST_METHOD'] === 'HEAD') {
+            exit;
+        }
         
-        readfile($filePath);
+        sendFileRange($filePath, $start, $length);
         exit;
     }
     
@@ -103,6 +231,7 @@ try {
                 'filename' => $filename,
                 'size' => $fileSize,
                 'sizeFormatted' => formatFileSize($fileSize),
+                'etag' => getFileEtag($filePath)['etag'],
                 'downloadUrl' => 'download-archive.php?file=' . urlencode($filename) . '&year=' . $year
             ];
         }
@@ -2,13 +2,38 @@ class MaxLinkDownloader {
     constructor() {
         this.downloadDelay = 500;
         this.baseUrl = window.location.origin;
+        this.storageKey = 'maxlink-downloaded-etags';
     }
     
-    downloadSingleFile(filename, year) {
-        const url = `${this.baseUrl}/download-archive.php?file=${encodeURIComponent(filename)}&year=${year}`;
+    getDownloadedEtags() {
+        try {
+            return JSON.parse(localStorage.getItem(this.storageKey)) || {};
+        } catch (error) {
+            return {};
+        }
+    }
+    
+    markAsDownloaded(filename, etag) {
+        if (!etag) {
+            return;
+        }
         
+        try {
+            const etags = this.getDownloadedEtags();
+            etags[filename] = etag;
+            localStorage.setItem(this.storageKey, JSON.stringify(etags));
+        } catch (error) {
+            console.warn('Impossible de mémoriser le téléchargement:', error);
+        }
+    }
+    
+    getFileUrl(filename, year) {
+        return `${this.baseUrl}/download-archive.php?file=${encodeURIComponent(filename)}&year=${year}`;
+    }
+    
+    saveLink(href, filename) {
         const link = document.createElement('a');
-        link.href = url;
+        link.href = href;
         link.download = filename;
         link.style.display = 'none';
         
@@ -17,6 +42,26 @@ class MaxLinkDownloader {
         document.body.removeChild(link);
     }
     
+    downloadSingleFile(filename, year) {
+        this.saveLink(this.getFileUrl(filename, year), filename);
+    }
+    
+    async fetchFileEtag(filename, year) {
+        // HEAD: vérifie que le fichier est disponible et lit son ETag sans
+        // transférer le contenu
+        const response = await fetch(this.getFileUrl(filename, year), { method: 'HEAD', cache: 'no-store' });
+        
+        if (!response.ok) {
+            throw new Error(`Erreur HTTP: ${response.status}`);
+        }
+        
+        return response.headers.get('ETag');
+    }
+    
+    delay(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+    
     async downloadWeekFiles(week, year) {
         try {
             const response = await fetch(`${this.baseUrl}/download-archive.php?week=${week}&year=${year}`);
@@ -32,13 +77,52 @@ class MaxLinkDownloader {
                 return;
             }
             
+            // Téléchargement déjà lancé sur ce poste (même ETag): le navigateur
+            // ne signale pas la fin d'un téléchargement natif, on propose donc
+            // de le relancer plutôt que de l'ignorer d'office
+            const downloaded = this.getDownloadedEtags();
+            const alreadyDownloaded = data.files.filter(file => file.etag && downloaded[file.filename] === file.etag);
+            let pendingFiles = data.files;
+            
+            if (alreadyDownloaded.length > 0) {
+                const again = confirm(
+                    `Téléchargement déjà lancé sur ce poste pour ${alreadyDownloaded.length} fichier(s) de la semaine ${week}/${year}.\n` +
+                    `Les télécharger à nouveau (si le téléchargement précédent a été interrompu ou annulé) ?`
+                );
+                if (!again) {
+                    pendingFiles = data.files.filter(file => !alreadyDownloaded.includes(file));
+                }
+            }
+            
+            if (pendingFiles.length === 0) {
+                return data;
+            }
+            
             this.showDownloadNotification(data);
             
-            for (let i = 0; i < data.files.length; i++) {
-                const file = data.files[i];
-                setTimeout(() => {
+            const failed = [];
+            for (let i = 0; i < pendingFiles.length; i++) {
+                const file = pendingFiles[i];
+                if (i > 0) {
+                    await this.delay(this.downloadDelay);
+                }
+                
+                try {
+                    const etag = await this.fetchFileEtag(file.filename, year);
+                    // Téléchargement natif du navigateur: reprise d'un transfert
+                    // interrompu par Range/If-Range, sans copie en mémoire
                     this.downloadSingleFile(file.filename, year);
-                }, i * this.downloadDelay);
+                    // Mémorise le lancement (et non la réception) avec l'ETag confirmé
+                    // par le serveur: l'entrée ne fait que proposer de relancer
+                    this.markAsDownloaded(file.filename, etag || file.etag);
+                } catch (error) {
+                    console.error(`Échec du téléchargement de ${file.filename}:`, error);
+                    failed.push(file.filename);
+                }
+            }
+            
+            if (failed.length > 0) {
+                alert(`Échec du téléchargement de ${failed.length} fichier(s):\n${failed.join('\n')}`);
             }
             
             return data;